@@ -71,6 +71,35 @@ async def graceful_shutdown():  # sourcery skip: use-named-expression
         # 停止所有异步任务
         await async_task_manager.stop_and_wait_all_tasks()
 
+        # 写入尚未落库的消息
+        from src.common.message_write_buffer import message_write_buffer
+
+        await message_write_buffer.flush_async()
+        logger.info(f"消息已写入，写缓冲区状态: {message_write_buffer.get_stats()}")
+
+        # 写入尚未落库的模型使用记录
+        from src.llm_models.utils import llm_usage_recorder
+
+        await llm_usage_recorder.flush_async()
+        logger.info(f"模型使用记录已写入，记录器状态: {llm_usage_recorder.get_stats()}")
+
+        # 等待数据库线程中的操作完成
+        from src.common.database.db_executor import db_executor, format_db_stats
+
+        logger.info(f"数据库统计: {format_db_stats()}")
+        db_executor.shutdown()
+
+        # 输出LLM请求调度统计
+        from src.llm_models.scheduler import format_scheduler_stats
+
+        logger.info(f"LLM请求调度状态: {format_scheduler_stats()}")
+
+        # 关闭API客户端的长连接
+        from src.llm_models.model_client.base_client import client_registry
+
+        logger.info(f"API连接池状态: {client_registry.get_connection_stats()}")
+        await client_registry.aclose_all()
+
         # 获取所有剩余任务，排除当前任务
         remaining_tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
 
@@ -0,0 +1,263 @@
+"""
+消息表存储结构对比：逐条保存聊天信息/发送者信息（规范化之前） vs 通过引用共享（规范化之后）
+
+在临时目录中生成相同的模拟消息，分别按两种结构写入SQLite，输出数据库大小与常用查询的耗时。
+只依赖标准库，可在未安装项目依赖的环境中运行：
+
+    python scripts/message_storage_benchmark.py --messages 200000 --chats 200 --users 5000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+MESSAGE_COLUMNS = """
+    id INTEGER PRIMARY KEY, message_id TEXT NOT NULL, time REAL NOT NULL, chat_id TEXT NOT NULL,
+    reply_to TEXT, interest_value REAL, key_words TEXT, key_words_lite TEXT, is_mentioned INTEGER, is_at INTEGER,
+    reply_probability_boost REAL, processed_plain_text TEXT, display_message TEXT, priority_mode TEXT,
+    priority_info TEXT, additional_config TEXT, is_emoji INTEGER, is_picid INTEGER, is_command INTEGER,
+    is_notify INTEGER, selected_expressions TEXT
+"""
+
+LEGACY_INFO_COLUMNS = [
+    "chat_info_stream_id",
+    "chat_info_platform",
+    "chat_info_user_platform",
+    "chat_info_user_id",
+    "chat_info_user_nickname",
+    "chat_info_user_cardname",
+    "chat_info_group_platform",
+    "chat_info_group_id",
+    "chat_info_group_name",
+    "chat_info_create_time",
+    "chat_info_last_active_time",
+    "user_platform",
+    "user_nickname",
+    "user_cardname",
+]
+
+BASE_COLUMNS = [
+    "message_id",
+    "time",
+    "chat_id",
+    "reply_to",
+    "interest_value",
+    "key_words",
+    "key_words_lite",
+    "is_mentioned",
+    "is_at",
+    "reply_probability_boost",
+    "processed_plain_text",
+    "display_message",
+    "priority_mode",
+    "priority_info",
+    "additional_config",
+    "is_emoji",
+    "is_picid",
+    "is_command",
+    "is_notify",
+    "selected_expressions",
+    "user_id",
+]
+
+
+def generate_messages(count: int, chats: int, users: int, seed: int):
+    """生成模拟消息：每个聊天有固定的群信息，发送者的群名片偶尔变化"""
+    rng = random.Random(seed)
+    chat_list = [
+        {
+            "stream_id": f"{rng.getrandbits(128):032x}",
+            "group_id": str(100000000 + i),
+            "group_name": f"测试群聊{i}号-一起来聊天吧",
+            "create_time": 1.7e9 + i,
+        }
+        for i in range(chats)
+    ]
+    user_list = [
+        {"user_id": str(200000000 + i), "nickname": f"用户昵称{i}(｡･ω･｡)", "cardname": f"群名片{i}"}
+        for i in range(users)
+    ]
+    now = 1.75e9
+    for i in range(count):
+        chat = rng.choice(chat_list)
+        user = rng.choice(user_list)
+        cardname = user["cardname"] if rng.random() > 0.05 else f"{user['cardname']}-改"
+        text = "这是一条模拟消息，" * rng.randint(1, 6)
+        yield {
+            "message_id": str(1000000000 + i),
+            "time": now + i * 0.5,
+            "chat_id": chat["stream_id"],
+            "reply_to": None,
+            "interest_value": rng.random(),
+            "key_words": "[]",
+            "key_words_lite": "[]",
+            "is_mentioned": 0,
+            "is_at": 0,
+            "reply_probability_boost": 0.0,
+            "processed_plain_text": text,
+            "display_message": "",
+            "priority_mode": "",
+            "priority_info": "{}",
+            "additional_config": None,
+            "is_emoji": 0,
+            "is_picid": 0,
+            "is_command": 0,
+            "is_notify": 0,
+            "selected_expressions": None,
+            "user_id": user["user_id"],
+            "chat_info_stream_id": chat["stream_id"],
+            "chat_info_platform": "qq",
+            "chat_info_user_platform": "qq",
+            "chat_info_user_id": user["user_id"],
+            "chat_info_user_nickname": user["nickname"],
+            "chat_info_user_cardname": cardname,
+            "chat_info_group_platform": "qq",
+            "chat_info_group_id": chat["group_id"],
+            "chat_info_group_name": chat["group_name"],
+            "chat_info_create_time": chat["create_time"],
+            "chat_info_last_active_time": now + i * 0.5,
+            "user_platform": "qq",
+            "user_nickname": user["nickname"],
+            "user_cardname": cardname,
+        }
+
+
+def build_legacy(path: str, messages):
+    conn = sqlite3.connect(path)
+    info_columns = ", ".join(f"{c} {'REAL' if c.endswith('_time') else 'TEXT'}" for c in LEGACY_INFO_COLUMNS)
+    conn.execute(f"CREATE TABLE messages ({MESSAGE_COLUMNS}, user_id TEXT, {info_columns})")
+    columns = BASE_COLUMNS + LEGACY_INFO_COLUMNS
+    conn.executemany(
+        f"INSERT INTO messages ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        ([m[c] for c in columns] for m in messages),
+    )
+    conn.execute("CREATE INDEX messages_chat_id_time ON messages (chat_id, time)")
+    conn.commit()
+    return conn
+
+
+CHAT_INFO_COLUMNS = [
+    "chat_info_stream_id",
+    "chat_info_platform",
+    "chat_info_group_platform",
+    "chat_info_group_id",
+    "chat_info_group_name",
+    "chat_info_create_time",
+]
+
+
+def build_normalized(path: str, messages):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        f"CREATE TABLE messages ({MESSAGE_COLUMNS}, user_id TEXT, chat_info_ref INTEGER, chat_user_info_ref INTEGER,"
+        " user_info_ref INTEGER)"
+    )
+    conn.execute(
+        "CREATE TABLE message_chat_info (id INTEGER PRIMARY KEY, info_hash TEXT UNIQUE, stream_id TEXT, platform TEXT,"
+        " group_platform TEXT, group_id TEXT, group_name TEXT, create_time REAL)"
+    )
+    conn.execute(
+        "CREATE TABLE message_user_info (id INTEGER PRIMARY KEY, info_hash TEXT UNIQUE, platform TEXT, user_id TEXT,"
+        " user_nickname TEXT, user_cardname TEXT)"
+    )
+    chat_refs, user_refs = {}, {}
+
+    def user_ref(user_key):
+        if user_key not in user_refs:
+            user_refs[user_key] = conn.execute(
+                "INSERT INTO message_user_info VALUES (NULL, ?, ?, ?, ?, ?)", (str(hash(user_key)), *user_key)
+            ).lastrowid
+        return user_refs[user_key]
+
+    def rows():
+        for m in messages:
+            chat_key = tuple(m[c] for c in CHAT_INFO_COLUMNS)
+            if chat_key not in chat_refs:
+                chat_refs[chat_key] = conn.execute(
+                    "INSERT INTO message_chat_info VALUES (NULL, ?, ?, ?, ?, ?, ?, ?)", (str(hash(chat_key)), *chat_key)
+                ).lastrowid
+            chat_user_key = (
+                m["chat_info_user_platform"],
+                m["chat_info_user_id"],
+                m["chat_info_user_nickname"],
+                m["chat_info_user_cardname"],
+            )
+            user_key = (m["user_platform"], m["user_id"], m["user_nickname"], m["user_cardname"])
+            yield [m[c] for c in BASE_COLUMNS] + [chat_refs[chat_key], user_ref(chat_user_key), user_ref(user_key)]
+
+    columns = BASE_COLUMNS + ["chat_info_ref", "chat_user_info_ref", "user_info_ref"]
+    conn.executemany(
+        f"INSERT INTO messages ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", list(rows())
+    )
+    conn.execute("CREATE INDEX messages_chat_id_time ON messages (chat_id, time)")
+    conn.commit()
+    return conn
+
+
+LEGACY_QUERY = "SELECT * FROM messages WHERE chat_id = ? AND time < ? ORDER BY time DESC LIMIT ?"
+
+NORMALIZED_QUERY = (
+    "SELECT m.*, c.stream_id AS chat_info_stream_id, c.platform AS chat_info_platform,"
+    " cu.platform AS chat_info_user_platform, cu.user_id AS chat_info_user_id,"
+    " cu.user_nickname AS chat_info_user_nickname, cu.user_cardname AS chat_info_user_cardname,"
+    " c.group_platform AS chat_info_group_platform, c.group_id AS chat_info_group_id,"
+    " c.group_name AS chat_info_group_name, c.create_time AS chat_info_create_time,"
+    " m.time AS chat_info_last_active_time, u.platform AS user_platform, u.user_nickname, u.user_cardname"
+    " FROM messages m LEFT JOIN message_chat_info c ON c.id = m.chat_info_ref"
+    " LEFT JOIN message_user_info cu ON cu.id = m.chat_user_info_ref"
+    " LEFT JOIN message_user_info u ON u.id = m.user_info_ref"
+    " WHERE m.chat_id = ? AND m.time < ? ORDER BY m.time DESC LIMIT ?"
+)
+
+
+def time_query(conn, sql: str, chat_ids, end_time: float, limit: int, rounds: int) -> float:
+    """返回查询的中位耗时（单位：毫秒）"""
+    samples = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        cursor = conn.execute(sql, (chat_ids[i % len(chat_ids)], end_time, limit))
+        # 与find_messages一致：将每行转换为字典
+        columns = [d[0] for d in cursor.description]
+        _ = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000, help="模拟消息数")
+    parser.add_argument("--chats", type=int, default=200, help="聊天数")
+    parser.add_argument("--users", type=int, default=5000, help="发送者数")
+    parser.add_argument("--limit", type=int, default=30, help="每次查询的消息数")
+    parser.add_argument("--rounds", type=int, default=500, help="查询次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, builder, sql in (
+            ("规范化之前", build_legacy, LEGACY_QUERY),
+            ("规范化之后", build_normalized, NORMALIZED_QUERY),
+        ):
+            path = os.path.join(tmp, f"{name}.db")
+            start = time.perf_counter()
+            conn = builder(path, generate_messages(args.messages, args.chats, args.users, args.seed))
+            build_time = time.perf_counter() - start
+            conn.execute("VACUUM")
+            chat_ids = [row[0] for row in conn.execute("SELECT DISTINCT chat_id FROM messages")]
+            end_time = conn.execute("SELECT MAX(time) FROM messages").fetchone()[0] + 1
+            query_ms = time_query(conn, sql, chat_ids, end_time, args.limit, args.rounds)
+            conn.close()
+            results[name] = (os.path.getsize(path), build_time, query_ms)
+
+        print(f"{args.messages} 条消息, {args.chats} 个聊天, {args.users} 个发送者, 每次查询最近 {args.limit} 条")
+        for name, (size, build_time, query_ms) in results.items():
+            print(f"{name}: 数据库 {size / 1024 / 1024:.1f}MB, 写入 {build_time:.1f}s, 查询中位耗时 {query_ms:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -937,7 +937,7 @@ class EmojiManager:
             else:
                 logger.info("[VLM分析] 生成新的详细描述")
                 if image_format in ["gif", "GIF"]:
-                    image_base64 = get_image_manager().transform_gif(image_base64)  # type: ignore
+                    image_base64 = await asyncio.to_thread(get_image_manager().transform_gif, image_base64)  # type: ignore
                     if not image_base64:
                         raise RuntimeError("GIF表情包转换失败")
                     prompt = "这是一个动态图表情包，每一张图代表了动态图的某一帧，黑色背景代表透明，描述一下表情包表达的情感和内容，描述细节，从互联网梗,meme的角度去分析"
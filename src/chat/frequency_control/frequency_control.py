@@ -1,6 +1,6 @@
 import time
 from typing import Optional, Dict, List
-from src.plugin_system.apis import message_api
+from src.common.message_repository import find_message_rows
 from src.chat.message_receive.chat_stream import ChatStream, get_chat_manager
 from src.common.logger import get_logger
 from src.config.config import global_config
@@ -74,6 +74,15 @@ class FrequencyControl:
             self._hourly_baseline['messages'][hour] = 0.0
             self._hourly_baseline['users'][hour] = 0.0
 
+    def _get_message_rows(self, start_time: float, end_time: float) -> list:
+        """获取时间范围内（不包含边界）除麦麦自身与命令以外的消息，只查询统计用到的时间与发送者字段"""
+        return find_message_rows(
+            {"chat_id": self.chat_stream.stream_id, "time": {"$gt": start_time, "$lt": end_time}},
+            ["time", "user_id"],
+            filter_bot=True,
+            filter_command=True,
+        )
+
     def _update_historical_baseline(self):
         """
         更新基于历史数据的基准值
@@ -90,13 +99,7 @@ class FrequencyControl:
             week_ago = current_time - (self._historical_days * 24 * 3600)
             
             # 获取最近一周的消息数据
-            historical_messages = message_api.get_messages_by_time_in_chat(
-                chat_id=self.chat_stream.stream_id,
-                start_time=week_ago,
-                end_time=current_time,
-                filter_mai=True,
-                filter_command=True
-            )
+            historical_messages = self._get_message_rows(week_ago, current_time)
             
             if historical_messages and len(historical_messages) >= 50:
                 # 按小时统计消息数和用户数
@@ -111,8 +114,8 @@ class FrequencyControl:
                     hourly_stats[msg_hour]['messages'].append(msg)
                     
                     # 统计用户数
-                    if msg.user_info and msg.user_info.user_id:
-                        hourly_stats[msg_hour]['users'].add(msg.user_info.user_id)
+                    if msg.user_id:
+                        hourly_stats[msg_hour]['users'].add(msg.user_id)
                 
                 # 计算每个小时的平均值（基于一周的数据）
                 for hour in range(24):
@@ -219,20 +222,14 @@ class FrequencyControl:
         
         try:
             # 获取最近10分钟的数据（发言频率更敏感）
-            recent_messages = message_api.get_messages_by_time_in_chat(
-                chat_id=self.chat_stream.stream_id,
-                start_time=current_time - 600,  # 10分钟前
-                end_time=current_time,
-                filter_mai=True,
-                filter_command=True
-            )
+            recent_messages = self._get_message_rows(current_time - 600, current_time)
             
             # 计算消息数量和用户数量
             message_count = len(recent_messages)
             user_ids = set()
             for msg in recent_messages:
-                if msg.user_info and msg.user_info.user_id:
-                    user_ids.add(msg.user_info.user_id)
+                if msg.user_id:
+                    user_ids.add(msg.user_id)
             user_count = len(user_ids)
             
             # 获取当前小时的基准值
@@ -324,20 +321,14 @@ class FrequencyControl:
             
         try:
             # 获取最近10分钟的数据（与发言频率保持一致）
-            recent_messages = message_api.get_messages_by_time_in_chat(
-                chat_id=self.chat_stream.stream_id,
-                start_time=current_time - 600,  # 10分钟前
-                end_time=current_time,
-                filter_mai=True,
-                filter_command=True
-            )
+            recent_messages = self._get_message_rows(current_time - 600, current_time)
             
             # 计算消息数量和用户数量
             message_count = len(recent_messages)
             user_ids = set()
             for msg in recent_messages:
-                if msg.user_info and msg.user_info.user_id:
-                    user_ids.add(msg.user_info.user_id)
+                if msg.user_id:
+                    user_ids.add(msg.user_id)
             user_count = len(user_ids)
             
             # 获取当前小时的基准值
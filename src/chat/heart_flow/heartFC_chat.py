@@ -28,7 +28,7 @@ from src.mais4u.mai_think import mai_thinking_manager
 from src.mais4u.s4u_config import s4u_config
 from src.chat.utils.chat_message_builder import (
     build_readable_messages_with_id,
-    get_raw_msg_before_timestamp_with_chat,
+    get_raw_msg_before_timestamp_with_chat_async,
 )
 
 if TYPE_CHECKING:
@@ -228,7 +228,7 @@ class HeartFChatting:
         if platform is None:
             platform = getattr(self.chat_stream, "platform", "unknown")
 
-        person = Person(platform=platform, user_id=action_message.user_info.user_id)
+        person = await Person.load_async(platform=platform, user_id=action_message.user_info.user_id)
         person_name = person.person_name
         action_prompt_display = f"你对{person_name}进行了回复：{reply_text}"
 
@@ -332,7 +332,7 @@ class HeartFChatting:
                 # 执行planner
                 is_group_chat, chat_target_info, _ = self.action_planner.get_necessary_info()
 
-                message_list_before_now = get_raw_msg_before_timestamp_with_chat(
+                message_list_before_now = await get_raw_msg_before_timestamp_with_chat_async(
                     chat_id=self.stream_id,
                     timestamp=time.time(),
                     limit=int(global_config.chat.max_context_size * 0.6),
@@ -3,8 +3,9 @@ import json
 import os
 import math
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -44,6 +45,21 @@ EMBEDDING_DATA_DIR = os.path.join(ROOT_PATH, "data", "embedding")
 EMBEDDING_DATA_DIR_STR = str(EMBEDDING_DATA_DIR).replace("\\", "/")
 TOTAL_EMBEDDING_TIMES = 3  # 统计嵌入次数
 
+_embedding_loop: Optional[asyncio.AbstractEventLoop] = None
+_embedding_loop_lock = threading.Lock()
+
+
+def _get_embedding_loop() -> asyncio.AbstractEventLoop:
+    """获取嵌入请求专用的后台事件循环（在常驻线程中运行，使各线程的嵌入请求能够复用同一个HTTP连接池）"""
+    global _embedding_loop
+    with _embedding_loop_lock:
+        if _embedding_loop is None or _embedding_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="embedding-loop", daemon=True).start()
+            _embedding_loop = loop
+        return _embedding_loop
+
+
 # 嵌入模型测试字符串，测试模型一致性，来自开发群的聊天记录
 # 这些字符串的嵌入结果应该是固定的，不能随时间变化
 EMBEDDING_TEST_STRINGS = [
@@ -117,11 +133,7 @@ class EmbeddingStore:
         self.idx2hash = None
 
     def _get_embedding(self, s: str) -> List[float]:
-        """获取字符串的嵌入向量，使用完全同步的方式避免事件循环问题"""
-        # 创建新的事件循环并在完成后立即关闭
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
+        """获取字符串的嵌入向量，在后台事件循环中执行请求并同步等待结果，避免事件循环问题"""
         try:
             # 创建新的LLMRequest实例
             from src.llm_models.utils_model import LLMRequest
@@ -129,8 +141,8 @@ class EmbeddingStore:
             
             llm = LLMRequest(model_set=model_config.model_task_config.embedding, request_type="embedding")
             
-            # 使用新的事件循环运行异步方法
-            embedding, _ = loop.run_until_complete(llm.get_embedding(s))
+            # 在后台事件循环中运行异步方法（复用长连接，而不是每次新建事件循环与连接）
+            embedding, _ = asyncio.run_coroutine_threadsafe(llm.get_embedding(s), _get_embedding_loop()).result()
             
             if embedding and len(embedding) > 0:
                 return embedding
@@ -141,12 +153,6 @@ class EmbeddingStore:
         except Exception as e:
             logger.error(f"获取嵌入时发生异常: {s}, 错误: {e}")
             return []
-        finally:
-            # 确保事件循环被正确关闭
-            try:
-                loop.close()
-            except Exception:
-                pass
 
     def _get_embeddings_batch_threaded(self, strs: List[str], chunk_size: int = 10, max_workers: int = 10, progress_callback=None) -> List[Tuple[str, List[float]]]:
         """使用多线程批量获取嵌入向量
@@ -187,13 +193,10 @@ class EmbeddingStore:
                 
                 for i, s in enumerate(chunk_strs):
                     try:
-                        # 在线程中创建独立的事件循环
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        try:
-                            embedding = loop.run_until_complete(llm.get_embedding(s))
-                        finally:
-                            loop.close()
+                        # 提交到后台事件循环执行，各线程共享同一个HTTP连接池
+                        embedding = asyncio.run_coroutine_threadsafe(
+                            llm.get_embedding(s), _get_embedding_loop()
+                        ).result()
                             
                         if embedding and len(embedding) > 0:
                             chunk_results.append((start_idx + i, s, embedding[0]))  # embedding[0] 是实际的向量
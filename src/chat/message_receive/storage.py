@@ -4,6 +4,9 @@ import traceback
 from typing import Union
 
 from src.common.database.database_model import Messages, Images
+from src.common.database.db_executor import db_executor
+from src.common.message_write_buffer import message_write_buffer
+from src.common.message_window import recent_message_window
 from src.common.logger import get_logger
 from .chat_stream import ChatStream
 from .message import MessageSending, MessageRecv
@@ -43,7 +46,11 @@ class MessageStorage:
             # print(processed_plain_text)
 
             if processed_plain_text:
-                processed_plain_text = MessageStorage.replace_image_descriptions(processed_plain_text)
+                if "[图片：" in processed_plain_text:
+                    # 需要逐个查询图片描述，在数据库读线程中执行
+                    processed_plain_text = await db_executor.run_read(
+                        MessageStorage.replace_image_descriptions, processed_plain_text
+                    )
                 filtered_processed_plain_text = re.sub(pattern, "", processed_plain_text, flags=re.DOTALL)
             else:
                 filtered_processed_plain_text = ""
@@ -97,45 +104,49 @@ class MessageStorage:
             # 安全地获取 user_info, 如果为 None 则视为空字典 (以防万一)
             user_info_from_chat = chat_info_dict.get("user_info") or {}
 
-            Messages.create(
-                message_id=msg_id,
-                time=float(message.message_info.time),  # type: ignore
-                chat_id=chat_stream.stream_id,
-                # Flattened chat_info
-                reply_to=reply_to,
-                is_mentioned=is_mentioned,
-                is_at=is_at,
-                reply_probability_boost=reply_probability_boost,
-                chat_info_stream_id=chat_info_dict.get("stream_id"),
-                chat_info_platform=chat_info_dict.get("platform"),
-                chat_info_user_platform=user_info_from_chat.get("platform"),
-                chat_info_user_id=user_info_from_chat.get("user_id"),
-                chat_info_user_nickname=user_info_from_chat.get("user_nickname"),
-                chat_info_user_cardname=user_info_from_chat.get("user_cardname"),
-                chat_info_group_platform=group_info_from_chat.get("platform"),
-                chat_info_group_id=group_info_from_chat.get("group_id"),
-                chat_info_group_name=group_info_from_chat.get("group_name"),
-                chat_info_create_time=float(chat_info_dict.get("create_time", 0.0)),
-                chat_info_last_active_time=float(chat_info_dict.get("last_active_time", 0.0)),
-                # Flattened user_info (message sender)
-                user_platform=user_info_dict.get("platform"),
-                user_id=user_info_dict.get("user_id"),
-                user_nickname=user_info_dict.get("user_nickname"),
-                user_cardname=user_info_dict.get("user_cardname"),
-                # Text content
-                processed_plain_text=filtered_processed_plain_text,
-                display_message=filtered_display_message,
-                interest_value=interest_value,
-                priority_mode=priority_mode,
-                priority_info=priority_info,
-                is_emoji=is_emoji,
-                is_picid=is_picid,
-                is_notify=is_notify,
-                is_command=is_command,
-                key_words=key_words,
-                key_words_lite=key_words_lite,
-                selected_expressions=selected_expressions,
+            # 写入缓冲区后立即返回，由后台任务批量落库；同时加入聊天的最近消息窗口
+            row = message_write_buffer.add(
+                dict(
+                    message_id=msg_id,
+                    time=float(message.message_info.time),  # type: ignore
+                    chat_id=chat_stream.stream_id,
+                    # Flattened chat_info
+                    reply_to=reply_to,
+                    is_mentioned=is_mentioned,
+                    is_at=is_at,
+                    reply_probability_boost=reply_probability_boost,
+                    chat_info_stream_id=chat_info_dict.get("stream_id"),
+                    chat_info_platform=chat_info_dict.get("platform"),
+                    chat_info_user_platform=user_info_from_chat.get("platform"),
+                    chat_info_user_id=user_info_from_chat.get("user_id"),
+                    chat_info_user_nickname=user_info_from_chat.get("user_nickname"),
+                    chat_info_user_cardname=user_info_from_chat.get("user_cardname"),
+                    chat_info_group_platform=group_info_from_chat.get("platform"),
+                    chat_info_group_id=group_info_from_chat.get("group_id"),
+                    chat_info_group_name=group_info_from_chat.get("group_name"),
+                    chat_info_create_time=float(chat_info_dict.get("create_time", 0.0)),
+                    chat_info_last_active_time=float(chat_info_dict.get("last_active_time", 0.0)),
+                    # Flattened user_info (message sender)
+                    user_platform=user_info_dict.get("platform"),
+                    user_id=user_info_dict.get("user_id"),
+                    user_nickname=user_info_dict.get("user_nickname"),
+                    user_cardname=user_info_dict.get("user_cardname"),
+                    # Text content
+                    processed_plain_text=filtered_processed_plain_text,
+                    display_message=filtered_display_message,
+                    interest_value=interest_value,
+                    priority_mode=priority_mode,
+                    priority_info=priority_info,
+                    is_emoji=is_emoji,
+                    is_picid=is_picid,
+                    is_notify=is_notify,
+                    is_command=is_command,
+                    key_words=key_words,
+                    key_words_lite=key_words_lite,
+                    selected_expressions=selected_expressions,
+                )
             )
+            recent_message_window.add(row)
         except Exception:
             logger.exception("存储消息失败")
             logger.error(f"消息：{message}")
@@ -157,18 +168,30 @@ class MessageStorage:
             if not qq_message_id:
                 logger.info("消息不存在message_id，无法更新")
                 return
-            if matched_message := (
-                Messages.select().where((Messages.message_id == mmc_message_id)).order_by(Messages.time.desc()).first()
-            ):
-                # 更新找到的消息记录
-                Messages.update(message_id=qq_message_id).where(Messages.id == matched_message.id).execute()  # type: ignore
-                logger.debug(f"更新消息ID成功: {matched_message.message_id} -> {qq_message_id}")
+            if message_write_buffer.contains_message_id(mmc_message_id):
+                # 消息尚在写缓冲区中，先落库再更新
+                await message_write_buffer.flush_async()
+            if await db_executor.run_write(MessageStorage._update_message_id, mmc_message_id, qq_message_id):
+                recent_message_window.update_message_id(mmc_message_id, qq_message_id)
+                logger.debug(f"更新消息ID成功: {mmc_message_id} -> {qq_message_id}")
             else:
                 logger.debug("未找到匹配的消息")
 
         except Exception as e:
             logger.error(f"更新消息ID失败: {e}")
 
+    @staticmethod
+    def _update_message_id(old_message_id: str, new_message_id: str) -> bool:
+        """将最新一条匹配消息的message_id更新为新值，返回是否找到匹配的消息"""
+        matched_message = (
+            Messages.select().where((Messages.message_id == old_message_id)).order_by(Messages.time.desc()).first()
+        )
+        if not matched_message:
+            return False
+        # 更新找到的消息记录
+        Messages.update(message_id=new_message_id).where(Messages.id == matched_message.id).execute()  # type: ignore
+        return True
+
     @staticmethod
     def replace_image_descriptions(text: str) -> str:
         """将[图片：描述]替换为[picid:image_id]"""
@@ -10,15 +10,17 @@ from datetime import datetime
 from json_repair import repair_json
 
 from src.llm_models.utils_model import LLMRequest
+from src.llm_models.utils import estimate_text_tokens
 from src.config.config import global_config, model_config
 from src.common.logger import get_logger
 from src.common.data_models.info_data_model import ActionPlannerInfo
 from src.chat.utils.prompt_builder import Prompt, global_prompt_manager
+from src.chat.utils.prompt_budget import PromptBudget
 from src.chat.utils.chat_message_builder import (
     build_readable_actions,
     get_actions_by_timestamp_with_chat,
     build_readable_messages_with_id,
-    get_raw_msg_before_timestamp_with_chat,
+    get_raw_msg_before_timestamp_with_chat_async,
 )
 from src.chat.utils.utils import get_chat_type_and_target_info
 from src.chat.planner_actions.action_manager import ActionManager
@@ -36,16 +38,11 @@ install(extra_lines=3)
 
 
 def init_prompt():
+    # 模板按“稳定前缀 + 动态后缀”组织：名字、规则、动作说明等不随消息变化的内容在前，
+    # 时间、聊天内容等每次请求都会变化的内容在后，便于命中服务商的提示词前缀缓存
     Prompt(
         """
-{time_block}
 {name_block}
-{chat_context_description}，以下是具体的聊天内容
-**聊天内容**
-{chat_content_block}
-
-**动作记录**
-{actions_before_now_block}
 
 **回复标准**
 请你根据聊天内容和用户的最新消息选择合适回复或者沉默:
@@ -72,6 +69,15 @@ def init_prompt():
     "target_message_id":"想要回复的消息id",
     "reason":"回复的原因"
 }}
+
+{chat_context_description}，以下是具体的聊天内容
+{time_block}
+**聊天内容**
+{chat_content_block}
+
+**动作记录**
+{actions_before_now_block}
+
 你必须从上面列出的可用action中选择一个，并说明触发action的消息id（不是消息原文）和选择该action的原因。消息id格式:m+数字
 请根据动作示例，以严格的 JSON 格式输出，且仅包含 JSON 内容：
 """,
@@ -80,16 +86,8 @@ def init_prompt():
 
     Prompt(
         """
-{time_block}
 {name_block}
 
-{chat_context_description}
-**聊天内容**
-{chat_content_block}
-
-**动作记录**
-{actions_before_now_block}
-
 **回复标准**
 请你选择合适的消息进行回复:
 1.你可以选择呼叫了你的名字，但是你没有做出回应的消息进行回复
@@ -100,6 +98,14 @@ def init_prompt():
 6.最好不要选择图片和表情包作为回复对象
 7.{moderation_prompt}
 
+{chat_context_description}
+{time_block}
+**聊天内容**
+{chat_content_block}
+
+**动作记录**
+{actions_before_now_block}
+
 请你从新消息中选出一条需要回复的消息并输出其id,输出格式如下：
 {{
     "action": "reply",
@@ -129,16 +135,11 @@ def init_prompt():
         """
 {name_block}
 
-{chat_context_description}，{time_block}，现在请你根据以下聊天内容，选择一个或多个合适的action。如果没有合适的action，请选择no_action。,
-{chat_content_block}
-
 **要求**
 1.action必须符合使用条件，如果符合条件，就选择
 2.如果聊天内容不适合使用action，即使符合条件，也不要使用
 3.{moderation_prompt}
 4.请注意如果相同的内容已经被执行，请不要重复执行
-这是你最近执行过的动作:
-{actions_before_now_block}
 
 **可用的action**
 
@@ -150,6 +151,12 @@ no_action：不选择任何动作
 
 {action_options_text}
 
+{chat_context_description}，{time_block}，现在请你根据以下聊天内容，选择一个或多个合适的action。如果没有合适的action，请选择no_action。
+{chat_content_block}
+
+这是你最近执行过的动作:
+{actions_before_now_block}
+
 请选择，并说明触发action的消息id和选择该action的原因。消息id格式:m+数字
 请根据动作示例，以严格的 JSON 格式输出，且仅包含 JSON 内容：
 """,
@@ -334,6 +341,19 @@ class ActionPlanner:
             name_block = f"你的名字是{bot_name}{bot_nickname}，请注意哪些是你自己的发言。"
 
             planner_prompt_template = await global_prompt_manager.get_prompt_async("sub_planner_prompt")
+            fitted = (
+                PromptBudget(
+                    model_config.model_task_config.planner_small.prompt_token_budget,
+                    reserved_tokens=estimate_text_tokens(planner_prompt_template),
+                    log_prefix=self.log_prefix,
+                )
+                .add("动作选项", action_options_block, truncatable=False)
+                .add("聊天记录", chat_content_block, priority=0, keep="tail")
+                .add("历史动作", actions_before_now_block, priority=1, max_share=0.2, keep="tail")
+                .fit()
+            )
+            chat_content_block = fitted["聊天记录"]
+            actions_before_now_block = fitted["历史动作"]
             prompt = planner_prompt_template.format(
                 time_block=time_block,
                 chat_context_description=chat_context_description,
@@ -490,7 +510,7 @@ class ActionPlanner:
         prompt: str = ""
         message_id_list: list[Tuple[str, "DatabaseMessages"]] = []
 
-        message_list_before_now = get_raw_msg_before_timestamp_with_chat(
+        message_list_before_now = await get_raw_msg_before_timestamp_with_chat_async(
             chat_id=self.chat_id,
             timestamp=time.time(),
             limit=int(global_config.chat.max_context_size * 0.6),
@@ -774,10 +794,29 @@ class ActionPlanner:
                 actions=actions_before_now,
             )
 
-            if actions_before_now_block:
-                actions_before_now_block = f"你刚刚选择并执行过的action是：\n{actions_before_now_block}"
-            else:
-                actions_before_now_block = ""
+            # 控制聊天记录与历史动作的大小，使提示词长度稳定在任务预算以内
+            template_name = "planner_prompt" if mode == ChatMode.FOCUS else "planner_reply_prompt"
+            planner_prompt_template = await global_prompt_manager.get_prompt_async(template_name)
+            fitted = (
+                PromptBudget(
+                    model_config.model_task_config.planner.prompt_token_budget,
+                    reserved_tokens=estimate_text_tokens(planner_prompt_template),
+                    log_prefix=self.log_prefix,
+                )
+                .add("兴趣", interest, truncatable=False)
+                .add("聊天记录", chat_content_block, priority=0, keep="tail")
+                .add(
+                    "历史动作",
+                    actions_before_now_block,
+                    priority=1,
+                    max_share=0.2,
+                    keep="tail",
+                    header="你刚刚选择并执行过的action是：\n",
+                )
+                .fit()
+            )
+            chat_content_block = fitted["聊天记录"]
+            actions_before_now_block = fitted["历史动作"]
 
             chat_context_description = "你现在正在一个群聊中"
             chat_target_name = None
@@ -828,7 +867,6 @@ class ActionPlanner:
             name_block = f"你的名字是{bot_name}{bot_nickname}，请注意哪些是你自己的发言。"
 
             if mode == ChatMode.FOCUS:
-                planner_prompt_template = await global_prompt_manager.get_prompt_async("planner_prompt")
                 prompt = planner_prompt_template.format(
                     time_block=time_block,
                     chat_context_description=chat_context_description,
@@ -840,7 +878,6 @@ class ActionPlanner:
                     interest=interest,
                 )
             else:
-                planner_prompt_template = await global_prompt_manager.get_prompt_async("planner_reply_prompt")
                 prompt = planner_prompt_template.format(
                     time_block=time_block,
                     chat_context_description=chat_context_description,
@@ -13,15 +13,17 @@ from src.common.data_models.info_data_model import ActionPlannerInfo
 from src.common.data_models.llm_data_model import LLMGenerationDataModel
 from src.config.config import global_config, model_config
 from src.llm_models.utils_model import LLMRequest
+from src.llm_models.utils import estimate_text_tokens
 from src.chat.message_receive.message import UserInfo, Seg, MessageRecv, MessageSending
 from src.chat.message_receive.chat_stream import ChatStream
 from src.chat.message_receive.uni_message_sender import HeartFCSender
 from src.chat.utils.timer_calculator import Timer  # <--- Import Timer
 from src.chat.utils.utils import get_chat_type_and_target_info
 from src.chat.utils.prompt_builder import Prompt, global_prompt_manager
+from src.chat.utils.prompt_budget import PromptBudget
 from src.chat.utils.chat_message_builder import (
     build_readable_messages,
-    get_raw_msg_before_timestamp_with_chat,
+    get_raw_msg_before_timestamp_with_chat_async,
     replace_user_references,
 )
 from src.chat.express.expression_selector import expression_selector
@@ -36,6 +38,8 @@ logger = get_logger("replyer")
 
 
 def init_prompt():
+    # 模板按“稳定前缀 + 动态后缀”组织：人设、表达风格、规则等不随消息变化的内容在前，
+    # 聊天记录、时间、回复目标等每次请求都会变化的内容在后，便于命中服务商的提示词前缀缓存
     Prompt("你正在qq群里聊天，下面是群里在聊的内容：", "chat_target_group1")
     Prompt("你正在和{sender_name}聊天，这是你们之前聊的内容：", "chat_target_private1")
     Prompt("在群里聊天", "chat_target_group2")
@@ -43,25 +47,26 @@ def init_prompt():
 
     Prompt(
         """
+{identity}
+你需要使用合适的语法和句法，参考聊天内容，组织一条日常且口语化的回复。请你修改你想表达的原句，符合你的表达风格和语言习惯
+{reply_style}
+你可以完全重组回复，保留最基本的表达含义就好，但重组后保持语意通顺。
+{moderation_prompt}
+不要输出多余内容(包括前后缀，冒号和引号，括号，表情包，emoji,at或 @等 )，只输出一条回复就好。
+
 {expression_habits_block}
 {relation_info_block}
 
 {chat_target}
 {time_block}
 {chat_info}
-{identity}
 
 你现在的心情是：{mood_state}
 你正在{chat_target_2},{reply_target_block}
 你想要对上述的发言进行回复，回复的具体内容（原句）是：{raw_reply}
 原因是：{reason}
 现在请你将这条具体内容改写成一条适合在群聊中发送的回复消息。
-你需要使用合适的语法和句法，参考聊天内容，组织一条日常且口语化的回复。请你修改你想表达的原句，符合你的表达风格和语言习惯
-{reply_style}
-你可以完全重组回复，保留最基本的表达含义就好，但重组后保持语意通顺。
 {keywords_reaction_prompt}
-{moderation_prompt}
-不要输出多余内容(包括前后缀，冒号和引号，括号，表情包，emoji,at或 @等 )，只输出一条回复就好。
 现在，你说：
 """,
         "default_expressor_prompt",
@@ -70,9 +75,13 @@ def init_prompt():
     # s4u 风格的 prompt 模板
     Prompt(
         """{identity}
+{reply_style}
+注意不要复读你说过的话
+请注意不要输出多余内容(包括前后缀，冒号和引号，at或 @等 )。只输出回复内容。
+{moderation_prompt}
+
 你正在群聊中聊天，你想要回复 {sender_name} 的发言。同时，也有其他用户会参与聊天，你可以参考他们的回复内容，但是你现在想回复{sender_name}的发言。
 
-{time_block}
 {background_dialogue_prompt}
 {core_dialogue_prompt}
 
@@ -80,13 +89,10 @@ def init_prompt():
 {knowledge_prompt}{memory_block}{relation_info_block}
 {extra_info_block}
 
+{time_block}
 {reply_target_block}
 你的心情：{mood_state}
-{reply_style}
-注意不要复读你说过的话
 {keywords_reaction_prompt}
-请注意不要输出多余内容(包括前后缀，冒号和引号，at或 @等 )。只输出回复内容。
-{moderation_prompt}
 不要输出多余内容(包括前后缀，冒号和引号，括号()，表情包，emoji,at或 @等 )。只输出一条回复就好
 现在，你说：""",
         "replyer_prompt",
@@ -94,7 +100,10 @@ def init_prompt():
 
     Prompt(
         """{identity}
-{time_block}
+{reply_style}
+请注意不要输出多余内容(包括前后缀，冒号和引号，at或 @等 )。只输出回复内容。
+{moderation_prompt}
+
 你现在正在一个QQ群里聊天，以下是正在进行的聊天内容：
 {background_dialogue_prompt}
 
@@ -102,14 +111,12 @@ def init_prompt():
 {knowledge_prompt}{memory_block}{relation_info_block}
 {extra_info_block}
 
+{time_block}
 你现在想补充说明你刚刚自己的发言内容：{target}，原因是{reason}
 请你根据聊天内容，组织一条新回复。注意，{target} 是刚刚你自己的发言，你要在这基础上进一步发言，请按照你自己的角度来继续进行回复。
 注意保持上下文的连贯性。
 你现在的心情是：{mood_state}
-{reply_style}
 {keywords_reaction_prompt}
-请注意不要输出多余内容(包括前后缀，冒号和引号，at或 @等 )。只输出回复内容。
-{moderation_prompt}
 不要输出多余内容(包括前后缀，冒号和引号，括号()，表情包，emoji,at或 @等 )。只输出一条回复就好
 现在，你说：
 """,
@@ -304,7 +311,7 @@ class DefaultReplyer:
             return ""
 
         # 获取用户ID
-        person = Person(person_name=sender)
+        person = await Person.load_async(person_name=sender)
         if not is_person_known(person_name=sender):
             logger.warning(f"未找到用户 {sender} 的ID，跳过信息提取")
             return f"你完全不认识{sender}，不理解ta的相关信息。"
@@ -522,7 +529,7 @@ class DefaultReplyer:
             target_user_id: 目标用户ID（当前对话对象）
 
         Returns:
-            Tuple[str, str]: (核心对话prompt, 背景对话prompt)
+            Tuple[str, str]: (核心对话记录, 背景对话记录)，标题由调用方在控制token预算后添加
         """
         core_dialogue_list: List[DatabaseMessages] = []
         bot_id = str(global_config.bot.qq_account)
@@ -543,13 +550,12 @@ class DefaultReplyer:
         all_dialogue_prompt = ""
         if message_list_before_now:
             latest_25_msgs = message_list_before_now[-int(global_config.chat.max_context_size) :]
-            all_dialogue_prompt_str = build_readable_messages(
+            all_dialogue_prompt = build_readable_messages(
                 latest_25_msgs,
                 replace_bot_name=True,
                 timestamp_mode="normal_no_YMD",
                 truncate=True,
             )
-            all_dialogue_prompt = f"所有用户的发言：\n{all_dialogue_prompt_str}"
 
         # 构建核心对话 prompt
         core_dialogue_prompt = ""
@@ -569,7 +575,7 @@ class DefaultReplyer:
                     -int(global_config.chat.max_context_size * 0.6) :
                 ]  # 限制消息数量
 
-                core_dialogue_prompt_str = build_readable_messages(
+                core_dialogue_prompt = build_readable_messages(
                     core_dialogue_list,
                     replace_bot_name=True,
                     timestamp_mode="normal_no_YMD",
@@ -577,11 +583,6 @@ class DefaultReplyer:
                     truncate=True,
                     show_actions=True,
                 )
-                core_dialogue_prompt = f"""--------------------------------
-这是你和{sender}的对话，你们正在交流中：
-{core_dialogue_prompt_str}
---------------------------------
-"""
 
         return core_dialogue_prompt, all_dialogue_prompt
 
@@ -715,7 +716,7 @@ class DefaultReplyer:
 
         if reply_message:
             user_id = reply_message.user_info.user_id
-            person = Person(platform=platform, user_id=user_id)
+            person = await Person.load_async(platform=platform, user_id=user_id)
             person_name = person.person_name or user_id
             sender = person_name
             target = reply_message.processed_plain_text
@@ -728,13 +729,13 @@ class DefaultReplyer:
         target = replace_user_references(target, chat_stream.platform, replace_bot_name=True)
         target = re.sub(r"\\[picid:[^\\]]+\\]", "[图片]", target)
 
-        message_list_before_now_long = get_raw_msg_before_timestamp_with_chat(
+        message_list_before_now_long = await get_raw_msg_before_timestamp_with_chat_async(
             chat_id=chat_id,
             timestamp=time.time(),
             limit=global_config.chat.max_context_size * 1,
         )
 
-        message_list_before_short = get_raw_msg_before_timestamp_with_chat(
+        message_list_before_short = await get_raw_msg_before_timestamp_with_chat_async(
             chat_id=chat_id,
             timestamp=time.time(),
             limit=int(global_config.chat.max_context_size * 0.33),
@@ -833,9 +834,47 @@ class DefaultReplyer:
             message_list_before_now_long, user_id, sender
         )
 
-        if global_config.bot.qq_account == user_id and platform == global_config.bot.platform:
-            return await global_prompt_manager.format_prompt(
-                "replyer_self_prompt",
+        is_self_reply = global_config.bot.qq_account == user_id and platform == global_config.bot.platform
+        template_name = "replyer_self_prompt" if is_self_reply else "replyer_prompt"
+        template = await global_prompt_manager.get_prompt_async(template_name)
+
+        # 按优先级与最大占比控制各信息块的大小，使提示词长度稳定在任务预算以内
+        budget = PromptBudget(
+            model_config.model_task_config.replyer.prompt_token_budget,
+            reserved_tokens=estimate_text_tokens(template),
+        )
+        budget.add("身份", personality_prompt, truncatable=False)
+        budget.add("回复目标", reply_target_block if not is_self_reply else target, truncatable=False)
+        budget.add("动作", actions_info, truncatable=False)
+        budget.add("关键词反应", keywords_reaction_prompt, truncatable=False)
+        budget.add(
+            "核心对话",
+            core_dialogue_prompt,
+            priority=0,
+            max_share=0.4,
+            keep="tail",
+            header=f"--------------------------------\n这是你和{sender}的对话，你们正在交流中：\n",
+            footer="\n--------------------------------\n",
+        )
+        budget.add("工具", tool_info, priority=1, max_share=0.15)
+        budget.add("额外信息", extra_info_block, priority=1, max_share=0.15)
+        budget.add("关系", relation_info, priority=2, max_share=0.1)
+        budget.add("记忆", memory_block, priority=2, max_share=0.15)
+        budget.add("知识", prompt_info, priority=3, max_share=0.15)
+        budget.add("表达习惯", expression_habits_block, priority=3, max_share=0.1)
+        budget.add("背景对话", background_dialogue_prompt, priority=4, max_share=0.3, keep="tail", header="所有用户的发言：\n")
+        fitted = budget.fit()
+        core_dialogue_prompt = fitted["核心对话"]
+        tool_info = fitted["工具"]
+        extra_info_block = fitted["额外信息"]
+        relation_info = fitted["关系"]
+        memory_block = fitted["记忆"]
+        prompt_info = fitted["知识"]
+        expression_habits_block = fitted["表达习惯"]
+        background_dialogue_prompt = fitted["背景对话"]
+
+        if is_self_reply:
+            return template.format(
                 expression_habits_block=expression_habits_block,
                 tool_info_block=tool_info,
                 knowledge_prompt=prompt_info,
@@ -854,8 +893,7 @@ class DefaultReplyer:
                 moderation_prompt=moderation_prompt_block,
             ), selected_expressions
         else:
-            return await global_prompt_manager.format_prompt(
-                "replyer_prompt",
+            return template.format(
                 expression_habits_block=expression_habits_block,
                 tool_info_block=tool_info,
                 knowledge_prompt=prompt_info,
@@ -896,7 +934,7 @@ class DefaultReplyer:
         else:
             mood_prompt = ""
 
-        message_list_before_now_half = get_raw_msg_before_timestamp_with_chat(
+        message_list_before_now_half = await get_raw_msg_before_timestamp_with_chat_async(
             chat_id=chat_id,
             timestamp=time.time(),
             limit=min(int(global_config.chat.max_context_size * 0.33), 15),
@@ -7,7 +7,7 @@ from rich.traceback import install
 
 from src.config.config import global_config
 from src.common.logger import get_logger
-from src.common.message_repository import find_messages, count_messages
+from src.common.message_repository import find_messages, find_messages_async, count_messages
 from src.common.data_models.database_data_model import DatabaseMessages, DatabaseActionRecords
 from src.common.data_models.message_data_model import MessageAndActionModel
 from src.common.database.database_model import ActionRecords
@@ -95,16 +95,29 @@ def replace_user_references(
     return content
 
 
-def get_raw_msg_by_timestamp(timestamp_start: float, timestamp_end: float, limit: int = 0, limit_mode: str = "latest"):
+def get_raw_msg_by_timestamp(
+    timestamp_start: float,
+    timestamp_end: float,
+    limit: int = 0,
+    limit_mode: str = "latest",
+    include_archive: bool = False,
+):
     """
     获取从指定时间戳到指定时间戳的消息，按时间升序排序，返回消息列表
     limit: 限制返回的消息数量，0为不限制
     limit_mode: 当 limit > 0 时生效。 'earliest' 表示获取最早的记录， 'latest' 表示获取最新的记录。默认为 'latest'。
+    include_archive: 是否同时查询已归档的消息
     """
     filter_query = {"time": {"$gt": timestamp_start, "$lt": timestamp_end}}
     # 只有当 limit 为 0 时才应用外部 sort
     sort_order = [("time", 1)] if limit == 0 else None
-    return find_messages(message_filter=filter_query, sort=sort_order, limit=limit, limit_mode=limit_mode)
+    return find_messages(
+        message_filter=filter_query,
+        sort=sort_order,
+        limit=limit,
+        limit_mode=limit_mode,
+        include_archive=include_archive,
+    )
 
 
 def get_raw_msg_by_timestamp_with_chat(
@@ -115,10 +128,12 @@ def get_raw_msg_by_timestamp_with_chat(
     limit_mode: str = "latest",
     filter_bot=False,
     filter_command=False,
+    include_archive: bool = False,
 ) -> List[DatabaseMessages]:
     """获取在特定聊天从指定时间戳到指定时间戳的消息，按时间升序排序，返回消息列表
     limit: 限制返回的消息数量，0为不限制
     limit_mode: 当 limit > 0 时生效。 'earliest' 表示获取最早的记录， 'latest' 表示获取最新的记录。默认为 'latest'。
+    include_archive: 是否同时查询已归档的消息
     """
     filter_query = {"chat_id": chat_id, "time": {"$gt": timestamp_start, "$lt": timestamp_end}}
     # 只有当 limit 为 0 时才应用外部 sort
@@ -131,6 +146,7 @@ def get_raw_msg_by_timestamp_with_chat(
         limit_mode=limit_mode,
         filter_bot=filter_bot,
         filter_command=filter_command,
+        include_archive=include_archive,
     )
 
 
@@ -294,6 +310,15 @@ def get_raw_msg_before_timestamp_with_chat(chat_id: str, timestamp: float, limit
     return find_messages(message_filter=filter_query, sort=sort_order, limit=limit)
 
 
+async def get_raw_msg_before_timestamp_with_chat_async(
+    chat_id: str, timestamp: float, limit: int = 0
+) -> List[DatabaseMessages]:
+    """get_raw_msg_before_timestamp_with_chat 的异步版本，在数据库读线程中查询"""
+    filter_query = {"chat_id": chat_id, "time": {"$lt": timestamp}}
+    sort_order = [("time", 1)]
+    return await find_messages_async(message_filter=filter_query, sort=sort_order, limit=limit)
+
+
 def get_raw_msg_before_timestamp_with_users(
     timestamp: float, person_ids: list, limit: int = 0
 ) -> List[DatabaseMessages]:
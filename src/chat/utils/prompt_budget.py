@@ -0,0 +1,187 @@
+from dataclasses import dataclass
+from typing import Dict, List, Literal
+
+from src.common.logger import get_logger
+from src.llm_models.utils import estimate_text_tokens
+
+logger = get_logger("prompt_budget")
+
+TRUNCATION_MARK = "……"
+"""截断处的省略标记"""
+
+
+@dataclass
+class PromptSection:
+    """提示词中的一个信息块"""
+
+    name: str
+    """信息块名称（用于日志）"""
+
+    content: str
+    """信息块内容"""
+
+    priority: int = 0
+    """优先级，数值越小越重要；超出预算时从优先级最低的信息块开始裁剪"""
+
+    max_share: float = 1.0
+    """信息块最多占用总预算的比例（0-1）"""
+
+    keep: Literal["head", "tail"] = "head"
+    """裁剪时保留的部分：head保留开头（适用于按相关度排序的检索结果），tail保留结尾（适用于按时间排序的聊天记录）"""
+
+    truncatable: bool = True
+    """是否允许裁剪（身份、回复目标等必要信息不允许裁剪，只计入用量）"""
+
+    header: str = ""
+    """内容前的固定标题（不参与裁剪，内容为空时一并省略）"""
+
+    footer: str = ""
+    """内容后的固定结尾（不参与裁剪，内容为空时一并省略）"""
+
+    original_tokens: int = 0
+    """裁剪前的token数"""
+
+    tokens: int = 0
+    """当前的token数"""
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: Literal["head", "tail"] = "head") -> str:
+    """
+    按token数裁剪文本，优先按行裁剪，保证保留下来的行完整
+    :param text: 文本
+    :param max_tokens: 最大token数
+    :param keep: 保留开头（head）或结尾（tail）
+    :return: 裁剪后的文本（发生裁剪时在裁剪处添加省略标记）
+    """
+    if max_tokens <= 0:
+        return ""
+    if estimate_text_tokens(text) <= max_tokens:
+        return text
+
+    mark_tokens = estimate_text_tokens(TRUNCATION_MARK)
+    remaining = max_tokens - mark_tokens
+    lines = text.split("\n")
+    if keep == "tail":
+        lines.reverse()
+
+    kept: List[str] = []
+    for line in lines:
+        line_tokens = estimate_text_tokens(line) + 1
+        if line_tokens > remaining:
+            break
+        kept.append(line)
+        remaining -= line_tokens
+
+    if not kept and lines:
+        # 单行就超出预算时按字符裁剪
+        line = lines[0]
+        while line and estimate_text_tokens(line) > remaining:
+            line = line[: len(line) * 3 // 4] if keep == "head" else line[max(1, len(line) // 4) :]
+        kept.append(line)
+
+    if keep == "tail":
+        kept.reverse()
+        return TRUNCATION_MARK + "\n".join(kept)
+    return "\n".join(kept) + TRUNCATION_MARK
+
+
+class PromptBudget:
+    """
+    提示词token预算
+
+    为各信息块设置优先级与最大占比：先将每个信息块限制在其最大占比内，总量仍超出预算时，从优先级最低的信息块开始裁剪
+    """
+
+    def __init__(self, total_tokens: int, reserved_tokens: int = 0, log_prefix: str = ""):
+        """
+        :param total_tokens: 总预算（小于等于0表示不限制，只统计用量）
+        :param reserved_tokens: 预留给模板固定文本的token数
+        :param log_prefix: 日志前缀
+        """
+        self.total_tokens = total_tokens
+        self.reserved_tokens = reserved_tokens
+        self.log_prefix = log_prefix
+        self._sections: Dict[str, PromptSection] = {}
+
+    def add(
+        self,
+        name: str,
+        content: str,
+        priority: int = 0,
+        max_share: float = 1.0,
+        keep: Literal["head", "tail"] = "head",
+        truncatable: bool = True,
+        header: str = "",
+        footer: str = "",
+    ) -> "PromptBudget":
+        """添加一个信息块"""
+        section = PromptSection(
+            name=name,
+            content=content or "",
+            priority=priority,
+            max_share=max_share,
+            keep=keep,
+            truncatable=truncatable,
+            header=header,
+            footer=footer,
+        )
+        section.tokens = section.original_tokens = self._count(section)
+        self._sections[name] = section
+        return self
+
+    @staticmethod
+    def _count(section: PromptSection) -> int:
+        if not section.content:
+            return 0
+        return estimate_text_tokens(section.header + section.content + section.footer)
+
+    def _shrink(self, section: PromptSection, max_tokens: int):
+        wrapper_tokens = estimate_text_tokens(section.header + section.footer)
+        section.content = truncate_to_tokens(section.content, max_tokens - wrapper_tokens, section.keep)
+        section.tokens = self._count(section)
+
+    def fit(self) -> Dict[str, str]:
+        """
+        按预算裁剪所有信息块并记录各信息块的token数
+        :return: 信息块名称 -> 裁剪后的内容
+        """
+        if self.total_tokens > 0:
+            for section in self._sections.values():
+                limit = int(self.total_tokens * section.max_share)
+                if section.truncatable and section.max_share < 1.0 and section.tokens > limit:
+                    self._shrink(section, limit)
+
+            overflow = self.used_tokens - self.total_tokens
+            for section in sorted(self._sections.values(), key=lambda s: s.priority, reverse=True):
+                if overflow <= 0:
+                    break
+                if not section.truncatable or section.tokens == 0:
+                    continue
+                before = section.tokens
+                self._shrink(section, before - overflow)
+                overflow -= before - section.tokens
+
+        self._log_usage()
+        return {
+            name: section.header + section.content + section.footer if section.content else ""
+            for name, section in self._sections.items()
+        }
+
+    @property
+    def used_tokens(self) -> int:
+        """当前所有信息块与预留部分的token总数"""
+        return self.reserved_tokens + sum(section.tokens for section in self._sections.values())
+
+    def _log_usage(self):
+        parts = []
+        for section in self._sections.values():
+            if not section.original_tokens:
+                continue
+            if section.tokens < section.original_tokens:
+                parts.append(f"{section.name} {section.tokens}(原{section.original_tokens})")
+            else:
+                parts.append(f"{section.name} {section.tokens}")
+        budget_str = f"/{self.total_tokens}" if self.total_tokens > 0 else ""
+        logger.info(
+            f"{self.log_prefix}提示词用量: {self.used_tokens}{budget_str} tokens; 模板 {self.reserved_tokens}, {', '.join(parts)}"
+        )
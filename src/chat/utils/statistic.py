@@ -1,13 +1,16 @@
 import asyncio
-import concurrent.futures
 
 from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Any, Dict, Tuple, List
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, Tuple, List
 
 from src.common.logger import get_logger
-from src.common.database.database import db
+from src.common.database.database import analytics_db, db
 from src.common.database.database_model import OnlineTime, LLMUsage, Messages
+from src.common.database.db_executor import db_executor
+from src.common.database.message_info import get_message_field, join_message_info
+from src.common.message_archive import message_archive
 from src.manager.async_task_manager import AsyncTask
 from src.manager.local_store_manager import local_storage
 
@@ -32,6 +35,7 @@ TOTAL_TOK_BY_TYPE = "tokens_by_type"
 TOTAL_TOK_BY_USER = "tokens_by_user"
 TOTAL_TOK_BY_MODEL = "tokens_by_model"
 TOTAL_TOK_BY_MODULE = "tokens_by_module"
+CACHED_TOK_BY_TYPE = "cached_tokens_by_type"
 COST_BY_TYPE = "costs_by_type"
 COST_BY_USER = "costs_by_user"
 COST_BY_MODEL = "costs_by_model"
@@ -53,6 +57,19 @@ TOTAL_MSG_CNT = "total_messages"
 MSG_CNT_BY_CHAT = "messages_by_chat"
 
 
+_MESSAGE_STAT_FIELDS = ("time", "user_id", "user_nickname", "chat_info_group_id", "chat_info_group_name")
+"""消息统计用到的字段（只查询这些列，不读取消息正文）"""
+
+
+def _iter_messages_since(start_timestamp: float) -> Iterator[Any]:
+    """遍历指定时间之后的消息（包括已归档的消息），消息字段按属性访问"""
+    for row in message_archive.find_rows(start_timestamp):
+        yield SimpleNamespace(**row)
+    columns = [get_message_field(name).alias(name) for name in _MESSAGE_STAT_FIELDS]  # type: ignore
+    query = join_message_info(Messages.select(*columns)).where(Messages.time >= start_timestamp)
+    yield from query.bind(analytics_db).namedtuples()  # type: ignore
+
+
 class OnlineTimeRecordTask(AsyncTask):
     """在线时间记录任务"""
 
@@ -202,26 +219,17 @@ class StatisticOutputTask(AsyncTask):
         try:
             now = datetime.now()
 
-            # 使用线程池并行执行耗时操作
-            loop = asyncio.get_event_loop()
-
-            # 在线程池中并行执行数据收集和之前的HTML生成（如果存在）
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                logger.info("正在收集统计数据...")
-
-                # 数据收集任务
-                collect_task = loop.run_in_executor(executor, self._collect_all_statistics, now)
-
-                # 等待数据收集完成
-                stats = await collect_task
-                logger.info("统计数据收集完成")
+            # 统计查询使用只读的分析连接，在数据库执行器的分析线程中执行，不占用聊天路径的数据库线程与连接
+            logger.info("正在收集统计数据...")
+            stats = await db_executor.run_analytics(self._collect_all_statistics, now)
+            logger.info("统计数据收集完成")
 
-                # 并行执行控制台输出和HTML报告生成
-                console_task = loop.run_in_executor(executor, self._statistic_console_output, stats, now)
-                html_task = loop.run_in_executor(executor, self._generate_html_report, stats, now)
-
-                # 等待两个输出任务完成
-                await asyncio.gather(console_task, html_task)
+            # 并行执行控制台输出和HTML报告生成（HTML报告需要查询图表数据，同样在分析线程中执行）
+            loop = asyncio.get_event_loop()
+            await asyncio.gather(
+                loop.run_in_executor(None, self._statistic_console_output, stats, now),
+                db_executor.run_analytics(self._generate_html_report, stats, now),
+            )
 
             logger.info("统计数据输出完成")
         except Exception as e:
@@ -232,40 +240,8 @@ class StatisticOutputTask(AsyncTask):
         备选方案：完全异步后台运行统计输出
         使用此方法可以让统计任务完全非阻塞
         """
-
-        async def _async_collect_and_output():
-            try:
-                import concurrent.futures
-
-                now = datetime.now()
-                loop = asyncio.get_event_loop()
-
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    logger.info("正在后台收集统计数据...")
-
-                    # 创建后台任务，不等待完成
-                    collect_task = asyncio.create_task(
-                        loop.run_in_executor(executor, self._collect_all_statistics, now)  # type: ignore
-                    )
-
-                    stats = await collect_task
-                    logger.info("统计数据收集完成")
-
-                    # 创建并发的输出任务
-                    output_tasks = [
-                        asyncio.create_task(loop.run_in_executor(executor, self._statistic_console_output, stats, now)),  # type: ignore
-                        asyncio.create_task(loop.run_in_executor(executor, self._generate_html_report, stats, now)),  # type: ignore
-                    ]
-
-                    # 等待所有输出任务完成
-                    await asyncio.gather(*output_tasks)
-
-                logger.info("统计数据后台输出完成")
-            except Exception as e:
-                logger.exception(f"后台统计数据输出过程中发生异常：{e}")
-
         # 创建后台任务，立即返回
-        asyncio.create_task(_async_collect_and_output())
+        asyncio.create_task(self.run())
 
     # -- 以下为统计数据收集方法 --
 
@@ -301,6 +277,7 @@ class StatisticOutputTask(AsyncTask):
                 TOTAL_TOK_BY_USER: defaultdict(int),
                 TOTAL_TOK_BY_MODEL: defaultdict(int),
                 TOTAL_TOK_BY_MODULE: defaultdict(int),
+                CACHED_TOK_BY_TYPE: defaultdict(int),
                 TOTAL_COST: 0.0,
                 COST_BY_TYPE: defaultdict(float),
                 COST_BY_USER: defaultdict(float),
@@ -325,7 +302,7 @@ class StatisticOutputTask(AsyncTask):
         # 以最早的时间戳为起始时间获取记录
         # Assuming LLMUsage.timestamp is a DateTimeField
         query_start_time = collect_period[-1][1]
-        for record in LLMUsage.select().where(LLMUsage.timestamp >= query_start_time):  # type: ignore
+        for record in LLMUsage.select().where(LLMUsage.timestamp >= query_start_time).bind(analytics_db):  # type: ignore
             record_timestamp = record.timestamp  # This is already a datetime object
             for idx, (_, period_start) in enumerate(collect_period):
                 if record_timestamp >= period_start:
@@ -363,6 +340,9 @@ class StatisticOutputTask(AsyncTask):
                         stats[period_key][TOTAL_TOK_BY_MODEL][model_name] += total_tokens
                         stats[period_key][TOTAL_TOK_BY_MODULE][module_name] += total_tokens
 
+                        # 命中服务商提示词缓存的输入token（缓存命中率 = 缓存命中token / 输入token）
+                        stats[period_key][CACHED_TOK_BY_TYPE][request_type] += record.cached_tokens or 0
+
                         cost = record.cost or 0.0
                         stats[period_key][TOTAL_COST] += cost
                         stats[period_key][COST_BY_TYPE][request_type] += cost
@@ -427,7 +407,7 @@ class StatisticOutputTask(AsyncTask):
 
         query_start_time = collect_period[-1][1]
         # Assuming OnlineTime.end_timestamp is a DateTimeField
-        for record in OnlineTime.select().where(OnlineTime.end_timestamp >= query_start_time):  # type: ignore
+        for record in OnlineTime.select().where(OnlineTime.end_timestamp >= query_start_time).bind(analytics_db):  # type: ignore
             # record.end_timestamp and record.start_timestamp are datetime objects
             record_end_timestamp = record.end_timestamp
             record_start_timestamp = record.start_timestamp
@@ -467,7 +447,7 @@ class StatisticOutputTask(AsyncTask):
         }
 
         query_start_timestamp = collect_period[-1][1].timestamp()  # Messages.time is a DoubleField (timestamp)
-        for message in Messages.select().where(Messages.time >= query_start_timestamp):  # type: ignore
+        for message in _iter_messages_since(query_start_timestamp):
             message_time_ts = message.time  # This is a float timestamp
 
             chat_id = None
@@ -644,6 +624,15 @@ class StatisticOutputTask(AsyncTask):
         output.append("")
         return "\n".join(output)
 
+    @staticmethod
+    def _format_cache_hit_ratio(stats: Dict[str, Any], req_type: str) -> str:
+        """
+        格式化请求类型的提示词缓存命中率（旧统计数据中没有缓存命中记录时按0处理）
+        """
+        in_tokens = stats[IN_TOK_BY_TYPE][req_type]
+        cached_tokens = stats.get(CACHED_TOK_BY_TYPE, {}).get(req_type, 0)
+        return f"{cached_tokens / in_tokens:.1%}" if in_tokens else "-"
+
     def _format_chat_stat(self, stats: Dict[str, Any]) -> str:
         """
         格式化聊天统计数据
@@ -739,12 +728,13 @@ class StatisticOutputTask(AsyncTask):
                     f"<td>{stat_data[IN_TOK_BY_TYPE][req_type]}</td>"
                     f"<td>{stat_data[OUT_TOK_BY_TYPE][req_type]}</td>"
                     f"<td>{stat_data[TOTAL_TOK_BY_TYPE][req_type]}</td>"
+                    f"<td>{self._format_cache_hit_ratio(stat_data, req_type)}</td>"
                     f"<td>{stat_data[COST_BY_TYPE][req_type]:.2f} ¥</td>"
                     f"<td>{stat_data[AVG_TIME_COST_BY_TYPE][req_type]:.1f} 秒</td>"
                     f"<td>{stat_data[STD_TIME_COST_BY_TYPE][req_type]:.1f} 秒</td>"
                     f"</tr>"
                     for req_type, count in sorted(stat_data[REQ_CNT_BY_TYPE].items())
-                ] if stat_data[REQ_CNT_BY_TYPE] else ["<tr><td colspan='8' style='text-align: center; color: #999;'>暂无数据</td></tr>"]
+                ] if stat_data[REQ_CNT_BY_TYPE] else ["<tr><td colspan='9' style='text-align: center; color: #999;'>暂无数据</td></tr>"]
             )
             # 按模块分类统计
             module_rows = "\n".join(
@@ -803,7 +793,7 @@ class StatisticOutputTask(AsyncTask):
                 <h2>按请求类型分类统计</h2>
                 <table>
                     <thead>
-                        <tr><th>请求类型</th><th>调用次数</th><th>输入Token</th><th>输出Token</th><th>Token总量</th><th>累计花费</th><th>平均耗时(秒)</th><th>标准差(秒)</th></tr>
+                        <tr><th>请求类型</th><th>调用次数</th><th>输入Token</th><th>输出Token</th><th>Token总量</th><th>缓存命中率</th><th>累计花费</th><th>平均耗时(秒)</th><th>标准差(秒)</th></tr>
                     </thead>
                     <tbody>
                     {type_rows}
@@ -1212,7 +1202,7 @@ class StatisticOutputTask(AsyncTask):
 
         # 查询LLM使用记录
         query_start_time = start_time
-        for record in LLMUsage.select().where(LLMUsage.timestamp >= query_start_time):  # type: ignore
+        for record in LLMUsage.select().where(LLMUsage.timestamp >= query_start_time).bind(analytics_db):  # type: ignore
             record_time = record.timestamp
 
             # 找到对应的时间间隔索引
@@ -1239,7 +1229,7 @@ class StatisticOutputTask(AsyncTask):
 
         # 查询消息记录
         query_start_timestamp = start_time.timestamp()
-        for message in Messages.select().where(Messages.time >= query_start_timestamp):  # type: ignore
+        for message in _iter_messages_since(query_start_timestamp):
             message_time_ts = message.time
 
             # 找到对应的时间间隔索引
@@ -1566,38 +1556,8 @@ class AsyncStatisticOutputTask(AsyncTask):
 
     async def run(self):
         """完全异步执行统计任务"""
-
-        async def _async_collect_and_output():
-            try:
-                now = datetime.now()
-                loop = asyncio.get_event_loop()
-
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    logger.info("正在后台收集统计数据...")
-
-                    # 数据收集任务
-                    collect_task = asyncio.create_task(
-                        loop.run_in_executor(executor, self._collect_all_statistics, now)  # type: ignore
-                    )
-
-                    stats = await collect_task
-                    logger.info("统计数据收集完成")
-
-                    # 创建并发的输出任务
-                    output_tasks = [
-                        asyncio.create_task(loop.run_in_executor(executor, self._statistic_console_output, stats, now)),  # type: ignore
-                        asyncio.create_task(loop.run_in_executor(executor, self._generate_html_report, stats, now)),  # type: ignore
-                    ]
-
-                    # 等待所有输出任务完成
-                    await asyncio.gather(*output_tasks)
-
-                logger.info("统计数据后台输出完成")
-            except Exception as e:
-                logger.exception(f"后台统计数据输出过程中发生异常：{e}")
-
         # 创建后台任务，立即返回
-        asyncio.create_task(_async_collect_and_output())
+        asyncio.create_task(StatisticOutputTask.run(self))  # type: ignore
 
     # 复用 StatisticOutputTask 的所有方法
     def _collect_all_statistics(self, now: datetime):
@@ -1629,6 +1589,10 @@ class AsyncStatisticOutputTask(AsyncTask):
     def _format_model_classified_stat(stats: Dict[str, Any]) -> str:
         return StatisticOutputTask._format_model_classified_stat(stats)
 
+    @staticmethod
+    def _format_cache_hit_ratio(stats: Dict[str, Any], req_type: str) -> str:
+        return StatisticOutputTask._format_cache_hit_ratio(stats, req_type)
+
     def _format_chat_stat(self, stats: Dict[str, Any]) -> str:
         return StatisticOutputTask._format_chat_stat(self, stats)  # type: ignore
 
@@ -11,7 +11,7 @@ from typing import Optional, Tuple, List, TYPE_CHECKING
 
 from src.common.logger import get_logger
 from src.common.data_models.database_data_model import DatabaseMessages
-from src.common.message_repository import find_messages, count_messages
+from src.common.message_repository import find_messages, find_message_rows
 from src.config.config import global_config, model_config
 from src.chat.message_receive.message import MessageRecv
 from src.chat.message_receive.chat_stream import get_chat_manager
@@ -549,17 +549,13 @@ def count_messages_between(start_time: float, end_time: float, stream_id: str) -
         logger.error("stream_id 不能为空")
         return 0, 0
 
-    # 使用message_repository中的count_messages和find_messages函数
-
     # 构建查询条件
     filter_query = {"chat_id": stream_id, "time": {"$gt": start_time, "$lte": end_time}}
 
     try:
-        # 先获取消息数量
-        count = count_messages(filter_query)
-
-        # 获取消息内容计算总长度
-        messages = find_messages(message_filter=filter_query)
+        # 一次查询同时得到消息数量与文本长度，只读取文本字段
+        messages = find_message_rows(filter_query, ["processed_plain_text"])
+        count = len(messages)
         total_length = sum(len(msg.processed_plain_text or "") for msg in messages)
 
         return count, total_length
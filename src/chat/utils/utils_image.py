@@ -1,3 +1,4 @@
+import asyncio
 import base64
 import os
 import time
@@ -138,7 +139,7 @@ class ImageManager:
 
             # 第一步：VLM视觉分析 - 生成详细描述
             if image_format in ["gif", "GIF"]:
-                image_base64_processed = self.transform_gif(image_base64)
+                image_base64_processed = await asyncio.to_thread(self.transform_gif, image_base64)  # 多帧GIF处理耗时，避免阻塞事件循环
                 if image_base64_processed is None:
                     logger.warning("GIF转换失败，无法获取描述")
                     return "[表情包(GIF处理失败)]"
@@ -1,4 +1,7 @@
 import os
+import threading
+import time
+
 from pymongo import MongoClient
 from peewee import SqliteDatabase
 from pymongo.database import Database
@@ -68,8 +71,44 @@ _DB_FILE = os.path.join(_DB_DIR, "MaiBot.db")
 # 确保数据库目录存在
 os.makedirs(_DB_DIR, exist_ok=True)
 
+
+class TimedSqliteDatabase(SqliteDatabase):
+    """
+    记录SQL执行耗时的SQLite数据库
+
+    按执行线程区分统计：在主线程（事件循环所在线程）执行的SQL会阻塞所有聊天，用于衡量数据库访问对事件循环的阻塞时间
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timing_lock = threading.Lock()
+        self._timings: dict[str, list[float]] = {"loop": [0, 0.0, 0.0], "worker": [0, 0.0, 0.0]}
+        """执行位置 -> [执行次数, 累计耗时, 最长耗时]"""
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute_sql(sql, params, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            where = "loop" if threading.current_thread() is threading.main_thread() else "worker"
+            with self._timing_lock:
+                timing = self._timings[where]
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = max(timing[2], elapsed)
+
+    def get_timing_stats(self) -> dict[str, dict[str, float]]:
+        """获取SQL执行耗时统计（loop为在事件循环线程中执行的部分，worker为在工作线程中执行的部分）"""
+        with self._timing_lock:
+            return {
+                where: {"queries": count, "total_time": total, "max_time": max_time}
+                for where, (count, total, max_time) in self._timings.items()
+            }
+
+
 # 全局 Peewee SQLite 数据库访问点
-db = SqliteDatabase(
+db = TimedSqliteDatabase(
     _DB_FILE,
     pragmas={
         "journal_mode": "wal",  # WAL模式提高并发性能
@@ -80,3 +119,15 @@ db = SqliteDatabase(
         "busy_timeout": 1000,  # 1秒超时而不是3秒
     },
 )
+
+# 分析与统计报表专用的只读数据库访问点
+# 与db使用各自的连接（不共享连接、耗时统计与缓存），只在db_executor的分析线程中使用，长时间的统计扫描不会占用聊天路径的连接；
+# query_only保证该连接不会写入，WAL模式下读取与消息写入互不阻塞
+analytics_db = SqliteDatabase(
+    _DB_FILE,
+    pragmas={
+        "query_only": 1,
+        "cache_size": -16 * 1000,  # 16MB缓存
+        "busy_timeout": 5000,
+    },
+)
@@ -1,6 +1,8 @@
 from peewee import Model, DoubleField, IntegerField, BooleanField, TextField, FloatField, DateTimeField
+from typing import Callable, Optional
 from .database import db
 import datetime
+import time
 from src.common.logger import get_logger
 
 logger = get_logger("database_model")
@@ -87,6 +89,7 @@ class LLMUsage(BaseModel):
     prompt_tokens = IntegerField()
     completion_tokens = IntegerField()
     total_tokens = IntegerField()
+    cached_tokens = IntegerField(default=0)  # 命中服务商提示词缓存的token数（包含在prompt_tokens中）
     cost = DoubleField()
     time_cost = DoubleField(null=True)
     status = TextField()
@@ -139,24 +142,16 @@ class Messages(BaseModel):
     is_mentioned = BooleanField(null=True)
     is_at = BooleanField(null=True)
     reply_probability_boost = DoubleField(null=True)
-    # 从 chat_info 扁平化而来的字段
-    chat_info_stream_id = TextField()
-    chat_info_platform = TextField()
-    chat_info_user_platform = TextField()
-    chat_info_user_id = TextField()
-    chat_info_user_nickname = TextField()
-    chat_info_user_cardname = TextField(null=True)
-    chat_info_group_platform = TextField(null=True)  # 群聊信息可能不存在
-    chat_info_group_id = TextField(null=True)
-    chat_info_group_name = TextField(null=True)
-    chat_info_create_time = DoubleField()
-    chat_info_last_active_time = DoubleField()
-
-    # 从顶层 user_info 扁平化而来的字段 (消息发送者信息)
-    user_platform = TextField(null=True)
-    user_id = TextField(null=True)
-    user_nickname = TextField(null=True)
-    user_cardname = TextField(null=True)
+
+    # 聊天信息与发送者信息分别保存在 MessageChatInfo 与 MessageUserInfo 中，多条消息共享同一行
+    # 查询时通过 message_info.select_messages_with_info 连接，得到与原来相同的 chat_info_* 与 user_* 字段
+    chat_info_ref = IntegerField(null=True)  # 对应的 MessageChatInfo id
+    chat_user_info_ref = IntegerField(null=True)  # 聊天流中记录的用户信息（chat_info_user_*）对应的 MessageUserInfo id
+    user_info_ref = IntegerField(null=True)  # 发送者信息（user_*）对应的 MessageUserInfo id
+
+    user_id = TextField(null=True)  # 发送者 ID（保留在消息表中，用于按发送者筛选）
+
+    chat_info_last_active_time = DoubleField(default=0.0)  # 写入消息时聊天的最后活跃时间（逐条不同，保留在消息表中）
 
     processed_plain_text = TextField(null=True)  # 处理后的纯文本消息
     display_message = TextField(null=True)  # 显示的消息
@@ -175,6 +170,44 @@ class Messages(BaseModel):
     class Meta:
         # database = db # 继承自 BaseModel
         table_name = "messages"
+        # 按聊天/用户筛选并按时间排序的查询使用复合索引，避免SQLite对匹配行再次排序
+        indexes = (
+            (("chat_id", "time"), False),
+            (("user_id", "time"), False),
+        )
+
+
+class MessageChatInfo(BaseModel):
+    """
+    消息所属聊天的信息（取代 Messages 中逐条重复的 chat_info_* 字段，相同的信息只保存一行）
+    群聊中聊天流记录的用户随发言者变化，单独保存在 MessageUserInfo 中，避免每条消息产生一行新的聊天信息
+    """
+
+    info_hash = TextField(unique=True)  # 各字段取值的哈希，用于去重
+    stream_id = TextField(index=True)
+    platform = TextField()
+    group_platform = TextField(null=True)
+    group_id = TextField(null=True)
+    group_name = TextField(null=True)
+    create_time = DoubleField(default=0.0)
+
+    class Meta:
+        table_name = "message_chat_info"
+
+
+class MessageUserInfo(BaseModel):
+    """
+    消息发送者与聊天流用户的信息（取代 Messages 中逐条重复的 user_* 与 chat_info_user_* 字段，相同的信息只保存一行）
+    """
+
+    info_hash = TextField(unique=True)  # 各字段取值的哈希，用于去重
+    platform = TextField(null=True)
+    user_id = TextField(null=True)
+    user_nickname = TextField(null=True)
+    user_cardname = TextField(null=True)
+
+    class Meta:
+        table_name = "message_user_info"
 
 
 class ActionRecords(BaseModel):
@@ -199,6 +232,7 @@ class ActionRecords(BaseModel):
     class Meta:
         # database = db # 继承自 BaseModel
         table_name = "action_records"
+        indexes = ((("chat_id", "time"), False),)
 
 
 class Images(BaseModel):
@@ -208,7 +242,7 @@ class Images(BaseModel):
 
     image_id = TextField(default="")  # 图片唯一ID
     emoji_hash = TextField(index=True)  # 图像的哈希值
-    description = TextField(null=True)  # 图像的描述
+    description = TextField(null=True, index=True)  # 图像的描述
     path = TextField(unique=True)  # 图像文件的路径
     # base64 = TextField()  # 图片的base64编码
     count = IntegerField(default=1)  # 图片被引用的次数
@@ -347,6 +381,171 @@ class GraphEdges(BaseModel):
         table_name = "graph_edges"
 
 
+class LLMResponseCache(BaseModel):
+    """
+    用于缓存确定性任务的LLM响应结果的模型。
+    """
+
+    model_identifier = TextField()  # 模型标识符
+    prompt_hash = TextField(index=True)  # 规范化后的请求指纹
+    request_type = TextField(index=True)  # 请求类型
+    content = TextField()  # 响应内容
+    reasoning_content = TextField(null=True)  # 推理内容
+    tool_calls = TextField(null=True)  # 工具调用（JSON格式）
+    prompt_tokens = IntegerField(default=0)  # 原始请求的提示token数
+    completion_tokens = IntegerField(default=0)  # 原始请求的完成token数
+    hit_count = IntegerField(default=0)  # 命中次数
+    created_time = FloatField()  # 创建时间戳
+    expire_time = FloatField(index=True)  # 过期时间戳
+
+    class Meta:
+        table_name = "llm_response_cache"
+        indexes = ((("model_identifier", "prompt_hash"), True),)
+
+
+class SchemaMigrations(BaseModel):
+    """
+    用于记录已执行的数据库结构迁移的模型。
+    """
+
+    version = IntegerField(unique=True)  # 迁移版本号
+    description = TextField()  # 迁移说明
+    applied_time = DoubleField()  # 执行时间戳
+
+    class Meta:
+        table_name = "schema_migrations"
+
+
+def _migrate_time_ordered_indexes():
+    """为已有数据库补建按时间排序查询所需的索引（新建的表已由模型定义创建，索引名与peewee生成的一致）"""
+    for table_name, sql in (
+        ("messages", "CREATE INDEX IF NOT EXISTS messages_chat_id_time ON messages (chat_id, time)"),
+        ("messages", "CREATE INDEX IF NOT EXISTS messages_user_id_time ON messages (user_id, time)"),
+        ("action_records", "CREATE INDEX IF NOT EXISTS action_records_chat_id_time ON action_records (chat_id, time)"),
+        ("images", "CREATE INDEX IF NOT EXISTS images_description ON images (description)"),
+        ("images", "CREATE INDEX IF NOT EXISTS images_emoji_hash ON images (emoji_hash)"),
+        ("llm_usage", "CREATE INDEX IF NOT EXISTS llm_usage_timestamp ON llm_usage (timestamp)"),
+    ):
+        # 尚不存在的表稍后按模型定义创建，会带上这些索引
+        if db.table_exists(table_name):
+            db.execute_sql(sql)
+    # 更新统计信息，让查询规划器选用新索引
+    db.execute_sql("ANALYZE")
+
+
+def _database_used_bytes() -> int:
+    """数据库中已使用页面的总字节数（不含可由VACUUM回收的空闲页）"""
+    page_size = db.execute_sql("PRAGMA page_size").fetchone()[0]
+    page_count = db.execute_sql("PRAGMA page_count").fetchone()[0]
+    freelist_count = db.execute_sql("PRAGMA freelist_count").fetchone()[0]
+    return (page_count - freelist_count) * page_size
+
+
+def _migrate_add_message_info_refs():
+    """
+    消息信息规范化（第一步）：创建聊天信息表与用户信息表，并为消息表添加可为空的引用字段，不改动已有数据
+    已有消息的引用由 MessageInfoBackfillTask 在后台分批补全，补全之前读取时回退到消息表中的旧字段
+    """
+    db.create_tables([MessageChatInfo, MessageUserInfo], safe=True)
+    if not db.table_exists("messages"):
+        return
+    existing_columns = {row[1] for row in db.execute_sql("PRAGMA table_info('messages')").fetchall()}
+    for column in ("chat_info_ref", "chat_user_info_ref", "user_info_ref"):
+        if column not in existing_columns:
+            db.execute_sql(f"ALTER TABLE messages ADD COLUMN {column} INTEGER NULL")
+
+
+def _migrate_drop_legacy_message_info() -> Optional[bool]:
+    """
+    消息信息规范化（第二步）：所有消息的引用补全后，按新结构重建消息表以删除旧的兼容字段
+    （一次性复制，避免逐列 DROP COLUMN 反复重写整张表）
+    Returns:
+        Optional[bool]: 仍有消息的引用尚未补全时返回False，推迟到之后的启动时执行
+    """
+    from .message_info import MESSAGE_INFO_REF_FIELDS, MESSAGE_INFO_VIEW, get_legacy_message_columns
+
+    if not db.table_exists("messages") or not get_legacy_message_columns():
+        return None
+    if db.execute_sql("SELECT 1 FROM messages WHERE chat_info_ref IS NULL LIMIT 1").fetchone():
+        logger.info("已有消息的聊天信息与发送者信息尚未在后台补全，暂不删除消息表中的旧字段")
+        return False
+
+    existing_columns = {row[1] for row in db.execute_sql("PRAGMA table_info('messages')").fetchall()}
+    used_bytes_before = _database_used_bytes()
+    logger.info("正在删除消息表中已由聊天信息表与用户信息表取代的旧字段...")
+    # 先删除旧索引（重命名后的表仍占用索引名）与引用消息表的视图
+    db.execute_sql(f"DROP VIEW IF EXISTS {MESSAGE_INFO_VIEW}")
+    for (index_name,) in db.execute_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'messages' AND sql IS NOT NULL"
+    ).fetchall():
+        db.execute_sql(f'DROP INDEX "{index_name}"')
+    db.execute_sql("ALTER TABLE messages RENAME TO messages_legacy")
+    Messages.create_table()
+    copy_columns = [
+        field.column_name
+        for field in Messages._meta.sorted_fields  # type: ignore
+        if field.column_name in existing_columns or field.column_name in MESSAGE_INFO_REF_FIELDS
+    ]
+    db.execute_sql(
+        f"INSERT INTO messages ({', '.join(copy_columns)}) SELECT {', '.join(copy_columns)} FROM messages_legacy"
+    )
+    db.execute_sql("DROP TABLE messages_legacy")
+    logger.info(
+        f"消息表旧字段删除完成，数据占用 {used_bytes_before / 1024 / 1024:.1f}MB -> "
+        f"{_database_used_bytes() / 1024 / 1024:.1f}MB（释放的空间可通过 VACUUM 归还给文件系统）"
+    )
+
+
+# 数据库结构迁移列表：(版本号, 说明, 迁移函数)
+# 新增迁移时追加到末尾并递增版本号，已发布的迁移不要修改；每个迁移在独立事务中执行，成功后记录到schema_migrations表
+# 迁移在按模型补齐字段之前执行（迁移可以读取即将删除的旧字段），需自行创建所需的表与字段，并能处理表尚不存在的情况
+# 迁移函数返回False表示前置条件尚未满足（例如后台补全数据尚未完成），本次启动不再执行该迁移及之后的迁移
+SCHEMA_MIGRATIONS: list[tuple[int, str, Callable[[], Optional[bool]]]] = [
+    (1, "添加按时间排序查询的复合索引", _migrate_time_ordered_indexes),
+    (2, "添加消息的聊天信息与发送者信息引用", _migrate_add_message_info_refs),
+    (3, "删除消息表中已由信息表取代的旧字段", _migrate_drop_legacy_message_info),
+]
+
+
+def apply_schema_migrations(fresh_database: bool = False) -> bool:
+    """
+    按版本号顺序执行尚未执行的数据库结构迁移，并记录当前结构版本
+    Args:
+        fresh_database: 是否为新建的数据库（新数据库直接按模型定义建表，所有迁移记为已执行）
+    Returns:
+        bool: 是否没有迁移失败（推迟执行的迁移不算失败）
+    """
+    SchemaMigrations.create_table(safe=True)
+    applied_versions = {row.version for row in SchemaMigrations.select(SchemaMigrations.version)}
+    for version, description, migrate in SCHEMA_MIGRATIONS:
+        if version in applied_versions:
+            continue
+        if fresh_database:
+            SchemaMigrations.create(version=version, description=description, applied_time=time.time())
+            applied_versions.add(version)
+            continue
+        logger.info(f"正在执行数据库迁移 v{version}: {description}")
+        try:
+            with db.atomic():
+                if migrate() is False:
+                    logger.info(f"数据库迁移 v{version} 推迟到之后的启动时执行")
+                    break
+                SchemaMigrations.create(version=version, description=description, applied_time=time.time())
+        except Exception as e:
+            # 后续迁移可能依赖本次迁移，失败后停止执行，下次启动时重试
+            logger.exception(f"数据库迁移 v{version} 失败: {e}")
+            # 事务已回滚，迁移中缓存的信息行id可能不存在
+            from .message_info import message_info_resolver
+
+            message_info_resolver.clear_cache()
+            return False
+        applied_versions.add(version)
+        logger.info(f"数据库迁移 v{version} 完成")
+
+    logger.debug(f"数据库结构版本: v{max(applied_versions, default=0)}")
+    return True
+
+
 def create_tables():
     """
     创建所有在模型中定义的数据库表。
@@ -358,6 +557,8 @@ def create_tables():
                 LLMUsage,
                 Emoji,
                 Messages,
+                MessageChatInfo,
+                MessageUserInfo,
                 Images,
                 ImageDescriptions,
                 OnlineTime,
@@ -366,6 +567,8 @@ def create_tables():
                 GraphNodes,  # 添加图节点表
                 GraphEdges,  # 添加图边表
                 ActionRecords,  # 添加 ActionRecords 到初始化列表
+                LLMResponseCache,
+                SchemaMigrations,
             ]
         )
 
@@ -385,6 +588,8 @@ def initialize_database(sync_constraints=False):
         LLMUsage,
         Emoji,
         Messages,
+        MessageChatInfo,
+        MessageUserInfo,
         Images,
         ImageDescriptions,
         OnlineTime,
@@ -393,10 +598,21 @@ def initialize_database(sync_constraints=False):
         GraphNodes,
         GraphEdges,
         ActionRecords,  # 添加 ActionRecords 到初始化列表
+        LLMResponseCache,
+        SchemaMigrations,
     ]
 
     try:
         with db:  # 管理 table_exists 检查的连接
+            # 先执行尚未执行的结构迁移（迁移需要在多余字段被删除之前读取旧数据）
+            if not apply_schema_migrations(fresh_database=not db.table_exists(Messages)):
+                logger.warning("数据库迁移失败，将按当前的表结构继续运行，迁移会在下次启动时重试")
+
+            # 消息表中的旧兼容字段尚未删除时加入模型（写入时同时填写，且不会被下面当作多余字段删除）
+            from .message_info import register_legacy_message_columns
+
+            register_legacy_message_columns()
+
             for model in models:
                 table_name = model._meta.table_name
                 if not db.table_exists(model):
@@ -456,13 +672,23 @@ def initialize_database(sync_constraints=False):
                         logger.info(f"字段 '{field_name}' 删除成功")
                     except Exception as e:
                         logger.error(f"删除字段 '{field_name}' 失败: {e}")
-                        
+
+            # 重建消息兼容视图
+            from .message_info import create_message_info_view
+
+            create_message_info_view()
+
         # 如果启用了约束同步，执行约束检查和修复
         if sync_constraints:
             logger.debug("开始同步数据库字段约束...")
             sync_field_constraints()
             logger.debug("数据库字段约束同步完成")
-            
+
+        # 消息全文索引与删除触发器（在约束同步之后创建：重建消息表时表上的触发器会被一起删除）
+        from .message_search import create_message_search_index
+
+        create_message_search_index()
+
     except Exception as e:
         logger.exception(f"检查表或字段是否存在时出错: {e}")
         # 如果检查失败（例如数据库不可用），则退出
@@ -482,6 +708,8 @@ def sync_field_constraints():
         LLMUsage,
         Emoji,
         Messages,
+        MessageChatInfo,
+        MessageUserInfo,
         Images,
         ImageDescriptions,
         OnlineTime,
@@ -490,6 +718,7 @@ def sync_field_constraints():
         GraphNodes,
         GraphEdges,
         ActionRecords,
+        LLMResponseCache,
     ]
 
     try:
@@ -660,6 +889,8 @@ def check_field_constraints():
         LLMUsage,
         Emoji,
         Messages,
+        MessageChatInfo,
+        MessageUserInfo,
         Images,
         ImageDescriptions,
         OnlineTime,
@@ -668,6 +899,7 @@ def check_field_constraints():
         GraphNodes,
         GraphEdges,
         ActionRecords,
+        LLMResponseCache,
     ]
     
     inconsistencies = {}
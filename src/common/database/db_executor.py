@@ -0,0 +1,201 @@
+import asyncio
+import functools
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, TypeVar
+
+from src.common.logger import get_logger
+from src.manager.async_task_manager import AsyncTask
+from .database import db
+
+logger = get_logger("db_executor")
+
+T = TypeVar("T")
+
+DB_READ_WORKERS = 2
+"""读查询线程数（WAL模式下读查询可以与写入并行）"""
+
+DB_SLOW_CALL_THRESHOLD = 0.5
+"""慢数据库调用的阈值（单位：秒）"""
+
+LOOP_LAG_CHECK_INTERVAL = 0.5
+"""事件循环延迟的采样间隔（单位：秒）"""
+
+DB_STATS_INTERVAL = 300
+"""数据库与事件循环延迟统计的输出间隔（单位：秒）"""
+
+
+@dataclass
+class DatabaseCallStats:
+    """一类数据库调用的统计"""
+
+    calls: int = 0
+    """调用次数"""
+
+    total_time: float = 0.0
+    """累计执行时间（单位：秒）"""
+
+    max_time: float = 0.0
+    """最长执行时间（单位：秒）"""
+
+    total_queue_time: float = 0.0
+    """累计排队时间（单位：秒）"""
+
+    slow_calls: int = 0
+    """慢调用次数"""
+
+
+class DatabaseExecutor:
+    """
+    数据库执行器
+
+    在专用线程中执行数据库操作并提供可等待的接口，避免慢查询或WAL检查点阻塞事件循环：
+    写操作由单个写线程串行执行（SQLite同一时间只允许一个写事务，串行化可避免锁竞争），读操作由小线程池并行执行；
+    peewee按线程维护连接，每个工作线程复用自己的连接
+    """
+
+    def __init__(self, read_workers: int = DB_READ_WORKERS):
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._read_executor = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-reader")
+        self._analytics_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-analytics")
+        self._closed: bool = False
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, DatabaseCallStats] = {
+            "read": DatabaseCallStats(),
+            "write": DatabaseCallStats(),
+            "analytics": DatabaseCallStats(),
+        }
+
+    def _call(self, kind: str, submitted_at: float, func: Callable[..., T], *args, **kwargs) -> T:
+        """在工作线程中执行数据库操作并记录耗时"""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                stats = self._stats[kind]
+                stats.calls += 1
+                stats.total_time += elapsed
+                stats.max_time = max(stats.max_time, elapsed)
+                stats.total_queue_time += start - submitted_at
+                if elapsed >= DB_SLOW_CALL_THRESHOLD:
+                    stats.slow_calls += 1
+            # 统计报表本来就是长时间的扫描，不输出慢调用警告
+            if elapsed >= DB_SLOW_CALL_THRESHOLD and kind != "analytics":
+                logger.warning(f"慢数据库{kind}操作 {getattr(func, '__name__', func)} 耗时 {elapsed:.2f} 秒")
+
+    async def _run(self, kind: str, executor: ThreadPoolExecutor, func: Callable[..., T], *args, **kwargs) -> T:
+        if self._closed:
+            # 关闭后（例如优雅关闭期间仍在收尾的任务）直接在当前线程执行
+            return func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._call, kind, time.perf_counter(), func, *args, **kwargs)
+        return await loop.run_in_executor(executor, call)
+
+    async def run_read(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        在读线程池中执行只读的数据库操作
+        :param func: 执行数据库操作的同步函数
+        :return: 函数的返回值
+        """
+        return await self._run("read", self._read_executor, func, *args, **kwargs)
+
+    async def run_write(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        在写线程中执行会修改数据库的操作（同一时间只执行一个，按提交顺序执行）
+        :param func: 执行数据库操作的同步函数
+        :return: 函数的返回值
+        """
+        return await self._run("write", self._write_executor, func, *args, **kwargs)
+
+    async def run_analytics(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        在分析线程中执行统计、报表等长时间的只读扫描（函数中的查询应绑定到analytics_db），
+        不占用聊天路径使用的读写线程与连接
+        :param func: 执行数据库操作的同步函数
+        :return: 函数的返回值
+        """
+        return await self._run("analytics", self._analytics_executor, func, *args, **kwargs)
+
+    def shutdown(self):
+        """等待已提交的操作完成并关闭工作线程（之后的调用在调用方线程中执行）"""
+        if self._closed:
+            return
+        self._closed = True
+        # 未开始的统计报表不再执行，不必等待
+        self._analytics_executor.shutdown(wait=False, cancel_futures=True)
+        self._read_executor.shutdown(wait=True)
+        self._write_executor.shutdown(wait=True)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """获取读写与分析操作的调用统计"""
+        with self._stats_lock:
+            return {
+                kind: {
+                    "calls": stats.calls,
+                    "avg_time": stats.total_time / stats.calls if stats.calls else 0.0,
+                    "max_time": stats.max_time,
+                    "avg_queue_time": stats.total_queue_time / stats.calls if stats.calls else 0.0,
+                    "slow_calls": stats.slow_calls,
+                }
+                for kind, stats in self._stats.items()
+            }
+
+
+db_executor = DatabaseExecutor()
+"""全局数据库执行器"""
+
+
+class EventLoopLagMonitor(AsyncTask):
+    """
+    事件循环延迟监控任务
+
+    按固定间隔休眠并测量实际唤醒时间与预期的差值（即事件循环被同步代码阻塞的时间），
+    定期与SQL耗时统计一同输出，用于比较数据库访问迁移到工作线程前后事件循环的阻塞情况
+    """
+
+    def __init__(self):
+        super().__init__(task_name="Event Loop Lag Monitor")
+        self.samples: int = 0
+        self.total_lag: float = 0.0
+        self.max_lag: float = 0.0
+        self._last_report: float = time.monotonic()
+
+    async def run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(LOOP_LAG_CHECK_INTERVAL)
+            lag = max(0.0, time.monotonic() - start - LOOP_LAG_CHECK_INTERVAL)
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            if time.monotonic() - self._last_report >= DB_STATS_INTERVAL:
+                self._report()
+
+    def _report(self):
+        self._last_report = time.monotonic()
+        avg_lag = self.total_lag / self.samples if self.samples else 0.0
+        logger.info(f"事件循环延迟: 平均 {avg_lag * 1000:.1f}ms, 最长 {self.max_lag * 1000:.1f}ms")
+        logger.info(f"数据库统计: {format_db_stats()}")
+        self.samples, self.total_lag, self.max_lag = 0, 0.0, 0.0
+
+
+def format_db_stats(executor: Optional[DatabaseExecutor] = None) -> str:
+    """将SQL耗时与执行器统计格式化为单行文本"""
+    executor = executor or db_executor
+    parts = []
+    for where, timing in db.get_timing_stats().items():
+        parts.append(
+            f"{where}线程SQL {int(timing['queries'])} 条 "
+            f"累计 {timing['total_time']:.2f}s 最长 {timing['max_time'] * 1000:.0f}ms"
+        )
+    for kind, stats in executor.get_stats().items():
+        parts.append(
+            f"{kind}操作 {int(stats['calls'])} 次 平均 {stats['avg_time'] * 1000:.1f}ms "
+            f"排队 {stats['avg_queue_time'] * 1000:.1f}ms 慢调用 {int(stats['slow_calls'])}"
+        )
+    return "; ".join(parts)
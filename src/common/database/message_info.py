@@ -0,0 +1,312 @@
+import hashlib
+import json
+import threading
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from peewee import JOIN, ColumnBase, Field, ModelSelect, fn
+
+from src.common.logger import get_logger
+from src.manager.async_task_manager import AsyncTask
+from .database import db
+from .database_model import Messages, MessageChatInfo, MessageUserInfo
+from .db_executor import db_executor
+
+logger = get_logger("message_info")
+
+MESSAGE_INFO_CACHE_SIZE = 4096
+"""聊天信息与发送者信息的id缓存数量"""
+
+MESSAGE_INFO_BACKFILL_BATCH_SIZE = 1000
+"""为已有消息补全引用时每批处理的消息数（每批单独占用一次写线程）"""
+
+MESSAGE_CHAT_INFO_FIELDS: Dict[str, str] = {
+    "chat_info_stream_id": "stream_id",
+    "chat_info_platform": "platform",
+    "chat_info_group_platform": "group_platform",
+    "chat_info_group_id": "group_id",
+    "chat_info_group_name": "group_name",
+    "chat_info_create_time": "create_time",
+}
+"""消息的兼容字段名 -> MessageChatInfo的字段名"""
+
+MESSAGE_CHAT_USER_INFO_FIELDS: Dict[str, str] = {
+    "chat_info_user_platform": "platform",
+    "chat_info_user_id": "user_id",
+    "chat_info_user_nickname": "user_nickname",
+    "chat_info_user_cardname": "user_cardname",
+}
+"""消息的兼容字段名 -> 聊天流用户对应的MessageUserInfo的字段名"""
+
+MESSAGE_USER_INFO_FIELDS: Dict[str, str] = {
+    "user_platform": "platform",
+    "user_nickname": "user_nickname",
+    "user_cardname": "user_cardname",
+}
+"""消息的兼容字段名 -> 发送者对应的MessageUserInfo的字段名（user_id仍保存在Messages中，用于按发送者筛选）"""
+
+ChatUserInfo = MessageUserInfo.alias("chat_user_info")
+"""聊天流用户信息（连接查询时MessageUserInfo的别名）"""
+
+MESSAGE_INFO_FIELDS: Dict[str, Field] = {
+    **{name: getattr(MessageChatInfo, column) for name, column in MESSAGE_CHAT_INFO_FIELDS.items()},
+    **{name: getattr(ChatUserInfo, column) for name, column in MESSAGE_CHAT_USER_INFO_FIELDS.items()},
+    **{name: getattr(MessageUserInfo, column) for name, column in MESSAGE_USER_INFO_FIELDS.items()},
+}
+"""由聊天信息/用户信息提供的兼容字段"""
+
+MESSAGE_INFO_REF_FIELDS = ("chat_info_ref", "chat_user_info_ref", "user_info_ref")
+"""Messages中引用聊天信息/用户信息的字段（不属于兼容字段）"""
+
+MESSAGE_INFO_VIEW = "messages_with_info"
+"""兼容视图名：与规范化之前的messages表字段相同，供直接使用SQL的外部工具查询"""
+
+_legacy_fallbacks: Dict[str, ColumnBase] = {}
+"""
+消息表中尚未删除的旧兼容字段 -> 读取表达式（优先取信息表中的值，引用尚未补全时回退到旧字段）
+由 register_legacy_message_columns 在启动时填写，旧字段被迁移删除后为空
+"""
+
+
+def get_legacy_message_columns() -> Dict[str, bool]:
+    """
+    获取消息表中仍存在的规范化之前的兼容字段
+    :return: 字段名 -> 是否为NOT NULL
+    """
+    return {
+        row[1]: bool(row[3])
+        for row in db.execute_sql("PRAGMA table_info('messages')").fetchall()
+        if row[1] in MESSAGE_INFO_FIELDS
+    }
+
+
+def register_legacy_message_columns():
+    """
+    消息表中仍有规范化之前的兼容字段时（已有消息的引用尚未补全，旧字段尚未删除），将这些字段加入Messages模型：
+    写入时同时填写旧字段（部分旧字段为NOT NULL），读取时引用尚未补全的消息回退到旧字段
+    """
+    for name, notnull in get_legacy_message_columns().items():
+        info_field = MESSAGE_INFO_FIELDS[name]
+        # 聊天流用户信息字段是MessageUserInfo字段的别名，按原字段的类型创建旧字段
+        legacy_field = getattr(info_field, "field", info_field).__class__(null=not notnull)
+        Messages._meta.add_field(name, legacy_field)  # type: ignore
+        _legacy_fallbacks[name] = fn.COALESCE(info_field, legacy_field)
+    if _legacy_fallbacks:
+        logger.info("消息表中仍有规范化之前的字段，已有消息的聊天信息与发送者信息将在后台补全")
+
+
+def get_message_field(name: str) -> Optional[ColumnBase]:
+    """
+    获取消息字段（包括由聊天信息/发送者信息提供的兼容字段），用于构建查询条件与排序
+    :param name: 字段名（与DatabaseMessages的扁平字段名相同）
+    :return: peewee字段或表达式，不存在时为None
+    """
+    if name in MESSAGE_INFO_FIELDS:
+        return _legacy_fallbacks.get(name, MESSAGE_INFO_FIELDS[name])
+    return get_message_value_field(name)
+
+
+def get_message_value_field(name: str) -> Optional[Field]:
+    """
+    获取消息字段本身，用于按字段类型转换取值（兼容字段的读取表达式不能用于类型转换）
+    :param name: 字段名（与DatabaseMessages的扁平字段名相同）
+    :return: peewee字段，不存在时为None
+    """
+    if name in MESSAGE_INFO_FIELDS:
+        return MESSAGE_INFO_FIELDS[name]
+    if name in Messages._meta.fields and name not in MESSAGE_INFO_REF_FIELDS:  # type: ignore
+        return getattr(Messages, name)
+    return None
+
+
+def _message_table_fields() -> list:
+    """Messages中按原样读取的字段（不含引用字段与旧兼容字段）"""
+    return [
+        field
+        for name, field in Messages._meta.fields.items()  # type: ignore
+        if name not in MESSAGE_INFO_REF_FIELDS and name not in MESSAGE_INFO_FIELDS
+    ]
+
+
+def join_message_info(query: ModelSelect) -> ModelSelect:
+    """为Messages查询连接聊天信息、聊天流用户信息与发送者信息"""
+    return (
+        query.join(MessageChatInfo, JOIN.LEFT_OUTER, on=(Messages.chat_info_ref == MessageChatInfo.id))
+        .switch(Messages)
+        .join(ChatUserInfo, JOIN.LEFT_OUTER, on=(Messages.chat_user_info_ref == ChatUserInfo.id))
+        .switch(Messages)
+        .join(MessageUserInfo, JOIN.LEFT_OUTER, on=(Messages.user_info_ref == MessageUserInfo.id))
+        .switch(Messages)
+    )
+
+
+def select_messages_with_info() -> ModelSelect:
+    """
+    查询消息及其聊天信息与发送者信息，结果列与规范化之前的messages表相同
+    （配合.dicts()可直接构造DatabaseMessages，配合.namedtuples()可按属性访问）
+    """
+    columns = _message_table_fields()
+    columns += [get_message_field(name).alias(name) for name in MESSAGE_INFO_FIELDS]  # type: ignore
+    return join_message_info(Messages.select(*columns))
+
+
+def create_message_info_view():
+    """重建兼容视图（视图的列在创建时确定，每次启动时重建以包含新增的字段）"""
+    message_columns = ", ".join(f"m.{field.column_name}" for field in _message_table_fields())
+
+    def _info_column(table: str, column: str, name: str) -> str:
+        # 旧字段删除之前，引用尚未补全的消息回退到旧字段
+        if name in _legacy_fallbacks:
+            return f"COALESCE({table}.{column}, m.{name}) AS {name}"
+        return f"{table}.{column} AS {name}"
+
+    info_columns = ", ".join(
+        [_info_column("c", column, name) for name, column in MESSAGE_CHAT_INFO_FIELDS.items()]
+        + [_info_column("cu", column, name) for name, column in MESSAGE_CHAT_USER_INFO_FIELDS.items()]
+        + [_info_column("u", column, name) for name, column in MESSAGE_USER_INFO_FIELDS.items()]
+    )
+    db.execute_sql(f"DROP VIEW IF EXISTS {MESSAGE_INFO_VIEW}")
+    db.execute_sql(
+        f"CREATE VIEW {MESSAGE_INFO_VIEW} AS SELECT {message_columns}, {info_columns} FROM messages m "
+        f"LEFT JOIN message_chat_info c ON c.id = m.chat_info_ref "
+        f"LEFT JOIN message_user_info cu ON cu.id = m.chat_user_info_ref "
+        f"LEFT JOIN message_user_info u ON u.id = m.user_info_ref"
+    )
+
+
+def _info_hash(values: Tuple[Any, ...]) -> str:
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class MessageInfoResolver:
+    """
+    消息信息解析器
+
+    将消息行中的聊天信息、聊天流用户信息与发送者信息转换为对应信息行的id（不存在时创建），并缓存最近使用的id；
+    只应在数据库写线程（或迁移）中使用，写入事务回滚时需调用clear_cache
+    """
+
+    def __init__(self, cache_size: int = MESSAGE_INFO_CACHE_SIZE):
+        self._cache_size = cache_size
+        self._chat_cache: "OrderedDict[str, int]" = OrderedDict()
+        self._user_cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, model, cache: "OrderedDict[str, int]", values: Dict[str, Any]) -> int:
+        info_hash = _info_hash(tuple(values.values()))
+        with self._lock:
+            if info_hash in cache:
+                cache.move_to_end(info_hash)
+                return cache[info_hash]
+        record = model.get_or_none(model.info_hash == info_hash)
+        info_id = record.id if record else model.insert(info_hash=info_hash, **values).execute()
+        with self._lock:
+            cache[info_hash] = info_id
+            if len(cache) > self._cache_size:
+                cache.popitem(last=False)
+        return info_id
+
+    def _get_user_info_id(self, platform: Any, user_id: Any, user_nickname: Any, user_cardname: Any) -> int:
+        values = {"platform": platform, "user_id": user_id, "user_nickname": user_nickname, "user_cardname": user_cardname}
+        return self._get_or_create(MessageUserInfo, self._user_cache, values)
+
+    def resolve_refs(self, row: Dict[str, Any]) -> Tuple[int, int, int]:
+        """
+        获取消息行对应的聊天信息id、聊天流用户信息id与发送者信息id（顺序同MESSAGE_INFO_REF_FIELDS）
+        :param row: 包含兼容字段的消息行
+        """
+        chat_values = {column: row.get(name) for name, column in MESSAGE_CHAT_INFO_FIELDS.items()}
+        chat_values["create_time"] = float(chat_values["create_time"] or 0.0)
+        return (
+            self._get_or_create(MessageChatInfo, self._chat_cache, chat_values),
+            self._get_user_info_id(
+                row.get("chat_info_user_platform"),
+                row.get("chat_info_user_id"),
+                row.get("chat_info_user_nickname"),
+                row.get("chat_info_user_cardname"),
+            ),
+            self._get_user_info_id(
+                row.get("user_platform"), row.get("user_id"), row.get("user_nickname"), row.get("user_cardname")
+            ),
+        )
+
+    def to_storage_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """将包含兼容字段的消息行转换为Messages表的行（旧兼容字段尚未删除时同时保留这些字段）"""
+        storage_row = {
+            name: value for name, value in row.items() if name not in MESSAGE_INFO_FIELDS or name in _legacy_fallbacks
+        }
+        storage_row.update(zip(MESSAGE_INFO_REF_FIELDS, self.resolve_refs(row)))
+        return storage_row
+
+    def clear_cache(self):
+        """清空id缓存（写入事务回滚后缓存中的id可能不存在）"""
+        with self._lock:
+            self._chat_cache.clear()
+            self._user_cache.clear()
+
+
+message_info_resolver = MessageInfoResolver()
+"""全局消息信息解析器"""
+
+
+def backfill_batch(after_id: int, batch_size: int = MESSAGE_INFO_BACKFILL_BATCH_SIZE) -> Tuple[int, int]:
+    """
+    为一批规范化之前写入的消息解析并写入引用（同步，应在数据库写线程中执行）
+    新写入的消息已同时带有引用，只需处理引用为空的已有消息
+    Args:
+        after_id: 只处理id大于该值的消息
+        batch_size: 每批处理的消息数
+    Returns:
+        Tuple[int, int]: (本批补全的消息数, 本批最后一条消息的id)，补全数为0表示已全部补全
+    """
+    columns = [*_legacy_fallbacks, "user_id"]
+    try:
+        with db.atomic():
+            rows = db.execute_sql(
+                f"SELECT id, {', '.join(columns)} FROM messages "
+                f"WHERE id > ? AND chat_info_ref IS NULL ORDER BY id LIMIT ?",
+                (after_id, batch_size),
+            ).fetchall()
+            updates = [(*message_info_resolver.resolve_refs(dict(zip(columns, row[1:]))), row[0]) for row in rows]
+            db.cursor().executemany(
+                f"UPDATE messages SET {', '.join(f'{name} = ?' for name in MESSAGE_INFO_REF_FIELDS)} WHERE id = ?",
+                updates,
+            )
+    except Exception:
+        # 事务回滚后新建的信息行也被撤销，缓存的id不再有效
+        message_info_resolver.clear_cache()
+        raise
+    return len(rows), rows[-1][0] if rows else after_id
+
+
+async def backfill_async() -> int:
+    """
+    为所有规范化之前写入的消息补全引用，每批在数据库写线程中执行，批次之间消息写入可以继续进行
+    Returns:
+        int: 本次补全的消息数
+    """
+    backfilled, after_id = 0, 0
+    while True:
+        count, after_id = await db_executor.run_write(backfill_batch, after_id)
+        if not count:
+            return backfilled
+        backfilled += count
+        if backfilled % (MESSAGE_INFO_BACKFILL_BATCH_SIZE * 100) == 0:
+            logger.info(f"正在补全已有消息的聊天信息与发送者信息，已处理 {backfilled} 条")
+
+
+class MessageInfoBackfillTask(AsyncTask):
+    """为规范化之前写入的消息补全聊天信息与发送者信息的引用（启动后执行一次，旧字段已删除时直接结束）"""
+
+    def __init__(self):
+        super().__init__(task_name="Message Info Backfill Task", wait_before_start=10)
+
+    async def run(self):
+        if not _legacy_fallbacks:
+            return
+        try:
+            backfilled = await backfill_async()
+            logger.info(f"已为 {backfilled} 条已有消息补全聊天信息与发送者信息，消息表中的旧字段将在下次启动时删除")
+        except Exception as e:
+            logger.error(f"补全已有消息的聊天信息与发送者信息失败: {e}")
@@ -0,0 +1,204 @@
+import re
+import sqlite3
+
+from typing import Iterable, List, Optional, Tuple
+
+import jieba
+
+from peewee import chunked
+
+from src.common.logger import get_logger
+from src.manager.async_task_manager import AsyncTask
+from .database import db
+from .db_executor import db_executor
+
+logger = get_logger("message_search")
+
+MESSAGE_SEARCH_TABLE = "messages_fts"
+"""消息全文索引表（FTS5虚拟表，rowid与messages.id相同）"""
+
+MESSAGE_SEARCH_TABLE_ARGS = (
+    "tokens, content='', contentless_delete=1, tokenize='unicode61'"
+    if sqlite3.sqlite_version_info >= (3, 43, 0)
+    else "tokens, tokenize='unicode61'"
+)
+"""全文索引表的定义：只保存索引不保存分词结果（contentless_delete需要SQLite 3.43以上，更早的版本保存分词结果以支持按rowid删除）"""
+
+MESSAGE_SEARCH_BACKFILL_BATCH_SIZE = 1000
+"""为已有消息补建索引时每批处理的消息数（每批单独占用一次写线程）"""
+
+_WORD_PATTERN = re.compile(r"\w")
+
+
+def message_search_tokens(text: Optional[str]) -> str:
+    """
+    将消息文本切分为以空格分隔的词（jieba搜索引擎模式，同时包含长词与其中的短词），供FTS5的unicode61分词器按空格切分
+    """
+    if not text:
+        return ""
+    return " ".join(word for word in jieba.cut_for_search(text) if _WORD_PATTERN.search(word))
+
+
+def create_message_search_index():
+    """
+    创建消息全文索引表与删除触发器（已存在时跳过）：
+    新写入与修改文本的消息由写入流程调用 index_messages / reindex_messages 建立索引，
+    删除（包括归档）的消息由纯SQL触发器同步，其他连接（例如脚本）删除消息时也能保持一致；
+    已有的消息由 backfill_batch 在后台补建索引
+    """
+    existing = db.execute_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", [MESSAGE_SEARCH_TABLE]
+    ).fetchone()
+    if existing and MESSAGE_SEARCH_TABLE_ARGS not in existing[0]:
+        logger.info("消息全文索引表的定义已变化，重建索引表，已有消息将由补建任务重新建立索引")
+        db.execute_sql(f"DROP TABLE {MESSAGE_SEARCH_TABLE}")
+    # 旧版本的插入/更新触发器调用Python分词函数，没有注册该函数的连接写入消息时会失败
+    db.execute_sql(f"DROP TRIGGER IF EXISTS {MESSAGE_SEARCH_TABLE}_insert")
+    db.execute_sql(f"DROP TRIGGER IF EXISTS {MESSAGE_SEARCH_TABLE}_update")
+    db.execute_sql(f"CREATE VIRTUAL TABLE IF NOT EXISTS {MESSAGE_SEARCH_TABLE} USING fts5({MESSAGE_SEARCH_TABLE_ARGS})")
+    db.execute_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {MESSAGE_SEARCH_TABLE}_delete AFTER DELETE ON messages BEGIN "
+        f"DELETE FROM {MESSAGE_SEARCH_TABLE} WHERE rowid = old.id; END"
+    )
+
+
+def index_messages(rows: Iterable[Tuple[int, Optional[str]]]):
+    """
+    为新写入的消息建立全文索引（同步，应与写入消息在同一事务中执行）
+    Args:
+        rows: (消息id, processed_plain_text)
+    """
+    params = [(message_id, message_search_tokens(text)) for message_id, text in rows]
+    if params:
+        db.cursor().executemany(f"INSERT INTO {MESSAGE_SEARCH_TABLE} (rowid, tokens) VALUES (?, ?)", params)
+
+
+def index_messages_after(last_id: int):
+    """为id大于last_id的消息（写入前的最大id之后新写入的消息）建立全文索引"""
+    index_messages(db.execute_sql("SELECT id, processed_plain_text FROM messages WHERE id > ?", [last_id]).fetchall())
+
+
+def get_max_message_id() -> int:
+    """获取当前最大的消息id（没有消息时为0）"""
+    return db.execute_sql("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+
+def reindex_messages(message_ids: Iterable[int]):
+    """
+    按当前文本重建消息的全文索引（消息文本被修改后调用，同步，应与修改在同一事务中执行）
+    尚未补建索引的旧消息（id小于索引中最小rowid）不在此建立索引，留给补建任务，以免补建进度被跳过
+    """
+    message_ids = list(message_ids)
+    oldest = _get_oldest_indexed_id() if message_ids else None
+    if oldest is None:
+        return
+    for batch in chunked(message_ids, MESSAGE_SEARCH_BACKFILL_BATCH_SIZE):
+        placeholders = ", ".join("?" * len(batch))
+        db.execute_sql(f"DELETE FROM {MESSAGE_SEARCH_TABLE} WHERE rowid IN ({placeholders})", batch)
+        index_messages(
+            db.execute_sql(
+                f"SELECT id, processed_plain_text FROM messages WHERE id IN ({placeholders}) AND id >= ?",
+                [*batch, oldest],
+            ).fetchall()
+        )
+
+
+def _get_oldest_indexed_id() -> Optional[int]:
+    """获取索引中最小的rowid（索引为空时为None）"""
+    oldest = db.execute_sql(f"SELECT rowid FROM {MESSAGE_SEARCH_TABLE} ORDER BY rowid LIMIT 1").fetchone()
+    return oldest[0] if oldest else None
+
+
+def backfill_batch(batch_size: int = MESSAGE_SEARCH_BACKFILL_BATCH_SIZE) -> int:
+    """
+    为尚未建立索引的已有消息补建一批索引（同步，应在数据库写线程中执行）
+    补建从新到旧进行，写入流程只索引更新的消息，因此索引始终包含id不小于索引中最小rowid的所有消息，不需要另外记录进度
+    Returns:
+        int: 本批补建的消息数（0表示已全部建立索引）
+    """
+    oldest = _get_oldest_indexed_id()
+    where, params = ("WHERE id < ?", [oldest]) if oldest is not None else ("", [])
+    with db.atomic():
+        rows = db.execute_sql(
+            f"SELECT id, processed_plain_text FROM messages {where} ORDER BY id DESC LIMIT ?", [*params, batch_size]
+        ).fetchall()
+        index_messages(rows)
+    return len(rows)
+
+
+async def backfill_async() -> int:
+    """
+    为所有已有消息补建索引，每批在数据库写线程中执行，批次之间消息写入可以继续进行
+    Returns:
+        int: 本次补建的消息数
+    """
+    indexed = 0
+    while indexed_batch := await db_executor.run_write(backfill_batch):
+        indexed += indexed_batch
+        if indexed % (MESSAGE_SEARCH_BACKFILL_BATCH_SIZE * 100) == 0:
+            logger.info(f"正在为已有消息补建全文索引，已处理 {indexed} 条")
+    return indexed
+
+
+class MessageSearchBackfillTask(AsyncTask):
+    """为已有消息补建全文索引的任务（启动后执行一次，已全部建立索引时只需一次查询）"""
+
+    def __init__(self):
+        super().__init__(task_name="Message Search Backfill Task", wait_before_start=30)
+
+    async def run(self):
+        try:
+            if indexed := await backfill_async():
+                logger.info(f"已为 {indexed} 条已有消息建立全文索引")
+        except Exception as e:
+            logger.error(f"补建消息全文索引失败: {e}")
+
+
+def split_search_terms(query: str) -> List[str]:
+    """将搜索文本按jieba精确模式切分为需要同时匹配的词（去重，忽略标点与空白）"""
+    return list(dict.fromkeys(word.strip() for word in jieba.cut(query) if _WORD_PATTERN.search(word)))
+
+
+def build_match_query(terms: List[str]) -> str:
+    """将搜索词转换为FTS5查询表达式：每个词作为一个短语，要求消息包含所有词"""
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_message_ids(
+    match_query: str,
+    chat_id: Optional[str] = None,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    limit: int = 20,
+    order: str = "latest",
+) -> List[int]:
+    """
+    在全文索引中查找匹配的消息id
+    Args:
+        match_query: FTS5查询表达式（见 build_match_query）
+        chat_id: 只查找该聊天的消息
+        start_time: 开始时间戳（包含）
+        end_time: 结束时间戳（包含）
+        limit: 最多返回的数量
+        order: "latest" 按时间从新到旧，"rank" 按相关度（bm25）从高到低
+    Returns:
+        List[int]: 按order排序的消息id
+    """
+    # 与find_messages一致，排除通知消息
+    conditions, params = [f"{MESSAGE_SEARCH_TABLE} MATCH ?", "m.message_id != 'notice'"], [match_query]
+    if chat_id is not None:
+        conditions.append("m.chat_id = ?")
+        params.append(chat_id)
+    if start_time is not None:
+        conditions.append("m.time >= ?")
+        params.append(start_time)
+    if end_time is not None:
+        conditions.append("m.time <= ?")
+        params.append(end_time)
+    order_by = f"{MESSAGE_SEARCH_TABLE}.rank" if order == "rank" else "m.time DESC"
+    cursor = db.execute_sql(
+        f"SELECT m.id FROM {MESSAGE_SEARCH_TABLE} JOIN messages m ON m.id = {MESSAGE_SEARCH_TABLE}.rowid "
+        f"WHERE {' AND '.join(conditions)} ORDER BY {order_by} LIMIT ?",
+        [*params, limit],
+    )
+    return [row[0] for row in cursor.fetchall()]
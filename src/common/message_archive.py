@@ -0,0 +1,205 @@
+import os
+import re
+import time
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from peewee import SqliteDatabase
+
+from src.common.database.database import ROOT_PATH, db
+from src.common.database.database_model import Messages
+from src.common.database.db_executor import db_executor
+from src.common.database.message_info import MESSAGE_INFO_VIEW, get_message_value_field
+from src.common.logger import get_logger
+from src.config.config import global_config
+from src.manager.async_task_manager import AsyncTask
+
+logger = get_logger("message_archive")
+
+MESSAGE_ARCHIVE_DIR = os.path.join(ROOT_PATH, "data", "message_archive")
+"""归档文件目录（每月一个SQLite文件）"""
+
+MESSAGE_ARCHIVE_BATCH_SIZE = 500
+"""每批归档的消息数（每批单独占用一次写线程，避免长时间阻塞消息写入）"""
+
+MESSAGE_ARCHIVE_INTERVAL = 3600
+"""归档任务的执行间隔（单位：秒）"""
+
+_ARCHIVE_SCHEMA = "message_archive"
+"""归档文件附加到主数据库连接时使用的名称"""
+
+_ARCHIVE_FILE_PATTERN = re.compile(r"^messages_(\d{4})-(\d{2})\.db$")
+
+
+def _month_range(timestamp: float) -> Tuple[float, float]:
+    """获取时间戳所在月份的起止时间戳（本地时间，左闭右开）"""
+    start = datetime.fromtimestamp(timestamp).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start.timestamp(), end.timestamp()
+
+
+class MessageArchive:
+    """
+    消息归档
+
+    将早于保留期限的消息按月移出消息表，保存到独立的SQLite文件（data/message_archive/messages_YYYY-MM.db）中，
+    归档文件中的消息行与兼容视图的字段相同（已展开聊天信息与发送者信息），不依赖主数据库即可查询；
+    少量需要历史消息的查询（统计、按时间范围获取消息）通过find_rows读取归档
+    """
+
+    def __init__(self, archive_dir: str = MESSAGE_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self.archived_rows: int = 0
+        """本次运行以来归档的消息数"""
+
+    def _archive_path(self, month_start: float) -> str:
+        return os.path.join(self.archive_dir, f"messages_{datetime.fromtimestamp(month_start):%Y-%m}.db")
+
+    def _archive_files(self, start_time: Optional[float], end_time: Optional[float]) -> List[str]:
+        """获取与时间范围有重叠的归档文件（按月份排序）"""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        paths = []
+        for file_name in sorted(os.listdir(self.archive_dir)):
+            match = _ARCHIVE_FILE_PATTERN.match(file_name)
+            if not match:
+                continue
+            month_start, month_end = _month_range(datetime(int(match[1]), int(match[2]), 1).timestamp())
+            if (start_time is None or start_time < month_end) and (end_time is None or end_time >= month_start):
+                paths.append(os.path.join(self.archive_dir, file_name))
+        return paths
+
+    @staticmethod
+    def _ensure_archive_table() -> List[str]:
+        """在已附加的归档文件中创建（或补齐）消息表，返回需要复制的列"""
+        cursor = db.execute_sql(f"SELECT * FROM {MESSAGE_INFO_VIEW} LIMIT 0")
+        columns = [column[0] for column in cursor.description]
+        existing = {row[1] for row in db.execute_sql(f"PRAGMA {_ARCHIVE_SCHEMA}.table_info('messages')").fetchall()}
+        if not existing:
+            # 不声明类型，按原样保存各列的值
+            db.execute_sql(f"CREATE TABLE {_ARCHIVE_SCHEMA}.messages ({', '.join(columns)})")
+        else:
+            for column in columns:
+                if column not in existing:
+                    db.execute_sql(f"ALTER TABLE {_ARCHIVE_SCHEMA}.messages ADD COLUMN {column}")
+        db.execute_sql(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {_ARCHIVE_SCHEMA}.messages_key ON messages (message_id, chat_id, time)"
+        )
+        db.execute_sql(f"CREATE INDEX IF NOT EXISTS {_ARCHIVE_SCHEMA}.messages_chat_id_time ON messages (chat_id, time)")
+        db.execute_sql(f"CREATE INDEX IF NOT EXISTS {_ARCHIVE_SCHEMA}.messages_time ON messages (time)")
+        return columns
+
+    def archive_batch(self, cutoff: float) -> int:
+        """
+        将最早的一批早于cutoff的消息移入对应月份的归档文件（同步，应在数据库写线程中执行）
+        先提交归档文件中的写入再删除消息表中的行：中途失败时消息最多同时存在于两处，重试时按(message_id, chat_id, time)去重
+        Args:
+            cutoff: 归档该时间戳之前的消息
+        Returns:
+            int: 本批归档的消息数（0表示没有需要归档的消息）
+        """
+        oldest = db.execute_sql("SELECT MIN(time) FROM messages").fetchone()[0]
+        if oldest is None or oldest >= cutoff:
+            return 0
+        month_start, month_end = _month_range(oldest)
+        ids = [
+            row[0]
+            for row in db.execute_sql(
+                "SELECT id FROM messages WHERE time >= ? AND time < ? ORDER BY time LIMIT ?",
+                (month_start, min(month_end, cutoff), MESSAGE_ARCHIVE_BATCH_SIZE),
+            ).fetchall()
+        ]
+        if not ids:
+            return 0
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        # ATTACH不能在事务中执行，且只作用于当前线程的连接
+        db.execute_sql(f"ATTACH DATABASE ? AS {_ARCHIVE_SCHEMA}", (self._archive_path(month_start),))
+        try:
+            column_list = ", ".join(self._ensure_archive_table())
+            placeholders = ", ".join("?" * len(ids))
+            with db.atomic():
+                db.execute_sql(
+                    f"INSERT OR IGNORE INTO {_ARCHIVE_SCHEMA}.messages ({column_list}) "
+                    f"SELECT {column_list} FROM main.{MESSAGE_INFO_VIEW} WHERE id IN ({placeholders})",
+                    ids,
+                )
+        finally:
+            db.execute_sql(f"DETACH DATABASE {_ARCHIVE_SCHEMA}")
+        with db.atomic():
+            Messages.delete().where(Messages.id.in_(ids)).execute()
+        self.archived_rows += len(ids)
+        return len(ids)
+
+    async def archive_async(self, cutoff: float) -> int:
+        """
+        分批归档早于cutoff的所有消息，每批在数据库写线程中执行，批次之间消息写入可以继续进行
+        Returns:
+            int: 本次归档的消息数
+        """
+        archived = 0
+        while archived_batch := await db_executor.run_write(self.archive_batch, cutoff):
+            archived += archived_batch
+        return archived
+
+    def find_rows(
+        self, start_time: Optional[float] = None, end_time: Optional[float] = None, chat_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        从归档文件中读取时间范围内（包含边界）的消息行，按时间升序排列
+        Args:
+            start_time: 开始时间戳（为None时不限制）
+            end_time: 结束时间戳（为None时不限制）
+            chat_id: 只读取该聊天的消息（为None时读取全部）
+        Returns:
+            List[Dict[str, Any]]: 消息行（键为DatabaseMessages的扁平字段名）
+        """
+        conditions, params = [], []
+        if start_time is not None:
+            conditions.append("time >= ?")
+            params.append(start_time)
+        if end_time is not None:
+            conditions.append("time <= ?")
+            params.append(end_time)
+        if chat_id is not None:
+            conditions.append("chat_id = ?")
+            params.append(chat_id)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        rows: List[Dict[str, Any]] = []
+        for path in self._archive_files(start_time, end_time):
+            archive_db = SqliteDatabase(path, pragmas={"query_only": 1})
+            try:
+                cursor = archive_db.execute_sql(f"SELECT * FROM messages{where} ORDER BY time", params)
+                columns = [column[0] for column in cursor.description]
+                for values in cursor.fetchall():
+                    row = {}
+                    for name, value in zip(columns, values):
+                        field = get_message_value_field(name)
+                        row[name] = field.python_value(value) if field is not None else value
+                    rows.append(row)
+            except Exception as e:
+                logger.error(f"读取归档文件 {path} 失败: {e}")
+            finally:
+                archive_db.close()
+        return rows
+
+
+message_archive = MessageArchive()
+"""全局消息归档"""
+
+
+class MessageArchiveTask(AsyncTask):
+    """消息定时归档任务"""
+
+    def __init__(self):
+        super().__init__(task_name="Message Archive Task", wait_before_start=60, run_interval=MESSAGE_ARCHIVE_INTERVAL)
+
+    async def run(self):
+        cutoff = time.time() - global_config.database.message_archive_days * 86400
+        try:
+            if archived := await message_archive.archive_async(cutoff):
+                logger.info(f"已将 {archived} 条早于 {global_config.database.message_archive_days} 天的消息移入归档")
+        except Exception as e:
+            logger.error(f"消息归档失败: {e}")
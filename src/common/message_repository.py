@@ -1,21 +1,370 @@
+import functools
 import traceback
 
-from typing import List, Any, Optional
-from peewee import Model  # 添加 Peewee Model 导入
+from collections import namedtuple
+from typing import List, Any, Optional, Sequence, Tuple, Type
+
+from peewee import ModelSelect
 
 from src.config.config import global_config
 from src.common.data_models.database_data_model import DatabaseMessages
 from src.common.database.database_model import Messages
+from src.common.database.db_executor import db_executor
+from src.common.database.message_info import (
+    MESSAGE_INFO_FIELDS,
+    get_message_field,
+    join_message_info,
+    select_messages_with_info,
+)
+from src.common.database.message_search import build_match_query, search_message_ids, split_search_terms
+from src.common.message_write_buffer import message_write_buffer, message_row_key
+from src.common.message_archive import message_archive
+from src.common.message_window import recent_message_window
 from src.common.logger import get_logger
 
 logger = get_logger(__name__)
 
+_WINDOW_OPERATORS = {"$gt", "$lt", "$gte", "$lte", "$ne", "$in", "$nin"}
+"""最近消息窗口可以在内存中判断的过滤操作符"""
+
+
+def _model_to_instance(row: dict[str, Any]) -> DatabaseMessages:
+    """
+    将查询得到的消息行（包含聊天信息与发送者信息）转换为 DatabaseMessages。
+    """
+    return DatabaseMessages(**row)
+
+
+def _row_matches(row: dict[str, Any], message_filter: dict[str, Any]) -> bool:
+    """
+    判断写缓冲区中的消息行是否满足过滤器（与数据库查询的过滤语义一致）
+    """
+    for key, value in (message_filter or {}).items():
+        if get_message_field(key) is None:
+            continue
+        field_value = row.get(key)
+        if not isinstance(value, dict):
+            if field_value != value:
+                return False
+            continue
+        for op, op_value in value.items():
+            try:
+                if op == "$gt":
+                    matched = field_value > op_value
+                elif op == "$lt":
+                    matched = field_value < op_value
+                elif op == "$gte":
+                    matched = field_value >= op_value
+                elif op == "$lte":
+                    matched = field_value <= op_value
+                elif op == "$ne":
+                    matched = field_value != op_value
+                elif op == "$in":
+                    matched = field_value in op_value
+                elif op == "$nin":
+                    matched = field_value not in op_value
+                else:
+                    continue
+            except TypeError:
+                # 与SQL中NULL的比较结果一致：不满足条件
+                matched = False
+            if not matched:
+                return False
+    return True
+
+
+def _filter_rows(
+    rows: List[dict[str, Any]], message_filter: dict[str, Any], filter_bot=False, filter_command=False
+) -> List[dict[str, Any]]:
+    """
+    按与数据库查询相同的条件筛选不在消息表中的消息行（写缓冲区、归档文件）
+    """
+    return [
+        row
+        for row in rows
+        if row.get("message_id") != "notice"
+        and not (filter_bot and row.get("user_id") == str(global_config.bot.qq_account))
+        and not (filter_command and row.get("is_command"))
+        and _row_matches(row, message_filter)
+    ]
+
+
+def _find_pending_rows(message_filter: dict[str, Any], filter_bot=False, filter_command=False) -> List[dict[str, Any]]:
+    """
+    获取写缓冲区中尚未确认落库、且满足过滤条件的消息行（需在查询数据库之前调用）
+    """
+    chat_id = message_filter.get("chat_id") if message_filter else None
+    rows = message_write_buffer.snapshot(chat_id if isinstance(chat_id, str) else None)
+    return _filter_rows(rows, message_filter, filter_bot, filter_command)
+
+
+def _find_archived_rows(message_filter: dict[str, Any], filter_bot=False, filter_command=False) -> List[dict[str, Any]]:
+    """
+    获取归档文件中满足过滤条件的消息行（按过滤器中的时间范围与chat_id只读取相关月份的归档）
+    """
+    message_filter = message_filter or {}
+    time_filter = message_filter.get("time")
+    start_time = end_time = None
+    if isinstance(time_filter, dict):
+        start_time = time_filter.get("$gte", time_filter.get("$gt"))
+        end_time = time_filter.get("$lte", time_filter.get("$lt"))
+    elif isinstance(time_filter, (int, float)):
+        start_time = end_time = time_filter
+    chat_id = message_filter.get("chat_id")
+    rows = message_archive.find_rows(start_time, end_time, chat_id if isinstance(chat_id, str) else None)
+    return _filter_rows(rows, message_filter, filter_bot, filter_command)
+
+
+def _merge_rows(
+    rows: List[dict[str, Any]],
+    extra_rows: List[dict[str, Any]],
+    sort: Optional[List[tuple[str, int]]],
+    limit: int,
+    limit_mode: str,
+) -> List[dict[str, Any]]:
+    """
+    将写缓冲区（或归档文件）中的消息行合并到数据库查询结果中，按查询条件重新排序与截取
+    """
+    existing_keys = {message_row_key(row) for row in rows}
+    extra = [row for row in extra_rows if message_row_key(row) not in existing_keys]
+    if not extra:
+        return rows
+
+    merged = rows + extra
+    if limit > 0:
+        merged.sort(key=lambda row: row["time"])
+        return merged[:limit] if limit_mode == "earliest" else merged[-limit:]
+    if sort:
+        _sort_by_fields(merged, sort)
+    return merged
+
+
+def _sort_by_fields(rows: List[dict[str, Any]], sort: List[tuple[str, int]]):
+    """
+    按排序条件原地排序：从最后一个条件开始依次稳定排序（与SQLite一致，NULL排在最前）
+    """
+    for field_name, direction in reversed(sort):
+        if direction in (1, -1) and get_message_field(field_name) is not None:
+            rows.sort(
+                key=lambda row, name=field_name: (row.get(name) is not None, row.get(name)),
+                reverse=direction == -1,
+            )
+
+
+@functools.lru_cache(maxsize=64)
+def _message_row_type(fields: Tuple[str, ...]) -> Type[tuple]:
+    """获取只包含指定字段的轻量消息行类型（按字段组合缓存）"""
+    return namedtuple("MessageRow", fields)
+
+
+def _select_messages(
+    fields: Optional[Sequence[str]],
+    message_filter: dict[str, Any],
+    sort: Optional[List[tuple[str, int]]],
+) -> ModelSelect:
+    """
+    构建消息查询的列：未指定fields时查询全部字段；指定时只查询所需字段、排序字段与去重用的字段，
+    且只有用到聊天信息/发送者信息时才连接信息表
+    """
+    if fields is None:
+        return select_messages_with_info()
+    names = list(dict.fromkeys([*fields, *(name for name, _ in sort or []), "message_id", "chat_id", "time"]))
+    columns = [get_message_field(name).alias(name) for name in names if get_message_field(name) is not None]  # type: ignore
+    query = Messages.select(*columns)
+    if any(name in MESSAGE_INFO_FIELDS for name in [*names, *(message_filter or {})]):
+        query = join_message_info(query)
+    return query
+
+
+def _warm_recent_window(chat_id: str):
+    """
+    从数据库加载聊天最近的消息，创建最近消息窗口（已有窗口或正在加载时跳过）
+    """
+    if not recent_message_window.begin_warm(chat_id):
+        return
+    try:
+        # 先取写缓冲区的快照再查询数据库，与find_messages相同
+        pending_rows = message_write_buffer.snapshot(chat_id)
+        query = (
+            select_messages_with_info()
+            .where(Messages.chat_id == chat_id)
+            .order_by(Messages.time.desc())
+            .limit(recent_message_window.window_size)
+        )
+        db_rows = list(query.dicts())
+    except Exception:
+        recent_message_window.abort_warm(chat_id)
+        raise
+    recent_message_window.finish_warm(chat_id, db_rows, pending_rows)
+
+
+def _find_in_recent_window(
+    message_filter: dict[str, Any],
+    sort: Optional[List[tuple[str, int]]],
+    limit: int,
+    limit_mode: str,
+    filter_bot=False,
+    filter_command=False,
+    warm: bool = True,
+) -> Optional[List[dict[str, Any]]]:
+    """
+    尝试由最近消息窗口回答查询：只处理单个聊天、所有条件都能在内存中判断、且结果完全在窗口覆盖范围内的查询
+    Args:
+        warm: 聊天没有窗口时是否从数据库加载（会访问数据库）
+    Returns:
+        满足条件的消息行，无法由窗口回答时为None（需要查询数据库）
+    """
+    chat_id = message_filter.get("chat_id") if message_filter else None
+    if not isinstance(chat_id, str):
+        return None
+    for key, value in message_filter.items():
+        if get_message_field(key) is None:
+            return None
+        if isinstance(value, dict) and not set(value) <= _WINDOW_OPERATORS:
+            return None
+    time_filter = message_filter.get("time", {})
+    if not isinstance(time_filter, dict) or not all(isinstance(v, (int, float)) for v in time_filter.values()):
+        return None
+
+    snapshot = recent_message_window.snapshot(chat_id)
+    if snapshot is None and warm:
+        _warm_recent_window(chat_id)
+        snapshot = recent_message_window.snapshot(chat_id)
+    if snapshot is None:
+        return None
+    rows, covered_since = snapshot
+
+    # 窗口包含所有时间晚于covered_since的消息：下界不早于它时，时间范围内的消息都在窗口中
+    range_covered = ("$gt" in time_filter and time_filter["$gt"] >= covered_since) or (
+        "$gte" in time_filter and time_filter["$gte"] > covered_since
+    )
+    if covered_since == float("-inf"):
+        range_covered = True
 
-def _model_to_instance(model_instance: Model) -> DatabaseMessages:
+    matched = _filter_rows(rows, message_filter, filter_bot, filter_command)
+    if limit > 0:
+        if limit_mode == "earliest":
+            answerable = range_covered
+            matched = matched[:limit]
+        else:
+            # 窗口外的消息都早于窗口中的消息，窗口中已有足够的消息时最新的limit条一定都在窗口中
+            answerable = range_covered or len(matched) >= limit
+            matched = matched[-limit:]
+    else:
+        answerable = range_covered
+        if answerable and sort:
+            _sort_by_fields(matched, sort)
+    if not answerable:
+        if warm:
+            # 不加载窗口的调用之后还会以warm=True再次尝试，只在这里计数
+            recent_message_window.misses += 1
+        return None
+    recent_message_window.hits += 1
+    return matched
+
+
+def _query_message_rows(
+    message_filter: dict[str, Any],
+    sort: Optional[List[tuple[str, int]]] = None,
+    limit: int = 0,
+    limit_mode: str = "latest",
+    filter_bot=False,
+    filter_command=False,
+    include_archive: bool = False,
+    fields: Optional[Sequence[str]] = None,
+) -> List[dict[str, Any]]:
     """
-    将 Peewee 模型实例转换为字典。
+    查询满足条件的消息行（合并最近消息窗口、写缓冲区与归档文件），参数同 find_messages。
+    fields不为None时数据库只查询所需的字段（窗口、缓冲区与归档中的行仍包含全部字段）
     """
-    return DatabaseMessages(**model_instance.__data__)
+    if not include_archive:
+        rows = _find_in_recent_window(message_filter, sort, limit, limit_mode, filter_bot, filter_command)
+        if rows is not None:
+            return rows
+
+    # 先取写缓冲区的快照再查询数据库，保证刚存储的消息不会在两者之间漏掉
+    pending_rows = _find_pending_rows(message_filter, filter_bot, filter_command)
+    query = _select_messages(fields, message_filter, sort)
+
+    # 应用过滤器
+    if message_filter:
+        conditions = []
+        for key, value in message_filter.items():
+            field = get_message_field(key)
+            if field is not None:
+                if isinstance(value, dict):
+                    # 处理 MongoDB 风格的操作符
+                    for op, op_value in value.items():
+                        if op == "$gt":
+                            conditions.append(field > op_value)
+                        elif op == "$lt":
+                            conditions.append(field < op_value)
+                        elif op == "$gte":
+                            conditions.append(field >= op_value)
+                        elif op == "$lte":
+                            conditions.append(field <= op_value)
+                        elif op == "$ne":
+                            conditions.append(field != op_value)
+                        elif op == "$in":
+                            conditions.append(field.in_(op_value))
+                        elif op == "$nin":
+                            conditions.append(field.not_in(op_value))
+                        else:
+                            logger.warning(f"过滤器中遇到未知操作符 '{op}' (字段: '{key}')。将跳过此操作符。")
+                else:
+                    # 直接相等比较
+                    conditions.append(field == value)
+            else:
+                logger.warning(f"过滤器键 '{key}' 在 Messages 模型中未找到。将跳过此条件。")
+        if conditions:
+            query = query.where(*conditions)
+
+    # 排除 id 为 "notice" 的消息
+    query = query.where(Messages.message_id != "notice")
+
+    if filter_bot:
+        query = query.where(Messages.user_id != global_config.bot.qq_account)
+
+    if filter_command:
+        query = query.where(Messages.is_command == False)  # noqa: E712
+
+    if limit > 0:
+        if limit_mode == "earliest":
+            # 获取时间最早的 limit 条记录，已经是正序
+            query = query.order_by(Messages.time.asc()).limit(limit)
+            rows = list(query.dicts())
+        else:  # 默认为 'latest'
+            # 获取时间最晚的 limit 条记录
+            query = query.order_by(Messages.time.desc()).limit(limit)
+            latest_rows = list(query.dicts())
+            # 将结果按时间正序排列
+            rows = sorted(latest_rows, key=lambda row: row["time"])
+    else:
+        # limit 为 0 时，应用传入的 sort 参数
+        if sort:
+            peewee_sort_terms = []
+            for field_name, direction in sort:
+                field = get_message_field(field_name)
+                if field is not None:
+                    if direction == 1:  # ASC
+                        peewee_sort_terms.append(field.asc())
+                    elif direction == -1:  # DESC
+                        peewee_sort_terms.append(field.desc())
+                    else:
+                        logger.warning(f"字段 '{field_name}' 的排序方向 '{direction}' 无效。将跳过此排序条件。")
+                else:
+                    logger.warning(f"排序字段 '{field_name}' 在 Messages 模型中未找到。将跳过此排序条件。")
+            if peewee_sort_terms:
+                query = query.order_by(*peewee_sort_terms)
+        rows = list(query.dicts())
+
+    if pending_rows:
+        rows = _merge_rows(rows, pending_rows, sort, limit, limit_mode)
+    if include_archive:
+        if archived_rows := _find_archived_rows(message_filter, filter_bot, filter_command):
+            # 未指定排序时按时间排序，使归档中较早的消息排在前面
+            rows = _merge_rows(rows, archived_rows, sort or [("time", 1)], limit, limit_mode)
+    return rows
 
 
 def find_messages(
@@ -25,6 +374,7 @@ def find_messages(
     limit_mode: str = "latest",
     filter_bot=False,
     filter_command=False,
+    include_archive: bool = False,
 ) -> List[DatabaseMessages]:
     """
     根据提供的过滤器、排序和限制条件查找消息。
@@ -34,95 +384,99 @@ def find_messages(
         sort: 排序条件列表，例如 [('time', 1)] (1 for asc, -1 for desc)。仅在 limit 为 0 时生效。
         limit: 返回的最大文档数，0表示不限制。
         limit_mode: 当 limit > 0 时生效。 'earliest' 表示获取最早的记录， 'latest' 表示获取最新的记录（结果仍按时间正序排列）。默认为 'latest'。
+        include_archive: 是否同时查询已归档的消息（会读取时间范围内各月份的归档文件，仅用于历史查询）。
 
     Returns:
         消息字典列表，如果出错则返回空列表。
     """
     try:
-        query = Messages.select()
+        rows = _query_message_rows(message_filter, sort, limit, limit_mode, filter_bot, filter_command, include_archive)
+        return [_model_to_instance(row) for row in rows]
+    except Exception as e:
+        log_message = (
+            f"使用 Peewee 查找消息失败 (filter={message_filter}, sort={sort}, limit={limit}, limit_mode={limit_mode}): {e}\n"
+            + traceback.format_exc()
+        )
+        logger.error(log_message)
+        return []
 
-        # 应用过滤器
-        if message_filter:
-            conditions = []
-            for key, value in message_filter.items():
-                if hasattr(Messages, key):
-                    field = getattr(Messages, key)
-                    if isinstance(value, dict):
-                        # 处理 MongoDB 风格的操作符
-                        for op, op_value in value.items():
-                            if op == "$gt":
-                                conditions.append(field > op_value)
-                            elif op == "$lt":
-                                conditions.append(field < op_value)
-                            elif op == "$gte":
-                                conditions.append(field >= op_value)
-                            elif op == "$lte":
-                                conditions.append(field <= op_value)
-                            elif op == "$ne":
-                                conditions.append(field != op_value)
-                            elif op == "$in":
-                                conditions.append(field.in_(op_value))
-                            elif op == "$nin":
-                                conditions.append(field.not_in(op_value))
-                            else:
-                                logger.warning(f"过滤器中遇到未知操作符 '{op}' (字段: '{key}')。将跳过此操作符。")
-                    else:
-                        # 直接相等比较
-                        conditions.append(field == value)
-                else:
-                    logger.warning(f"过滤器键 '{key}' 在 Messages 模型中未找到。将跳过此条件。")
-            if conditions:
-                query = query.where(*conditions)
 
-        # 排除 id 为 "notice" 的消息
-        query = query.where(Messages.message_id != "notice")
+def find_message_rows(
+    message_filter: dict[str, Any],
+    fields: Sequence[str],
+    sort: Optional[List[tuple[str, int]]] = None,
+    limit: int = 0,
+    limit_mode: str = "latest",
+    filter_bot=False,
+    filter_command=False,
+    include_archive: bool = False,
+) -> List[Any]:
+    """
+    只查询指定字段的 find_messages：数据库只读取所需的列，结果为轻量的命名元组而不是 DatabaseMessages，
+    适合只需要计数、时间、文本或发送者等少数字段的调用方。
 
-        if filter_bot:
-            query = query.where(Messages.user_id != global_config.bot.qq_account)
-
-        if filter_command:
-            query = query.where(not Messages.is_command)
-
-        if limit > 0:
-            if limit_mode == "earliest":
-                # 获取时间最早的 limit 条记录，已经是正序
-                query = query.order_by(Messages.time.asc()).limit(limit)
-                peewee_results = list(query)
-            else:  # 默认为 'latest'
-                # 获取时间最晚的 limit 条记录
-                query = query.order_by(Messages.time.desc()).limit(limit)
-                latest_results_peewee = list(query)
-                # 将结果按时间正序排列
-                peewee_results = sorted(latest_results_peewee, key=lambda msg: msg.time)
-        else:
-            # limit 为 0 时，应用传入的 sort 参数
-            if sort:
-                peewee_sort_terms = []
-                for field_name, direction in sort:
-                    if hasattr(Messages, field_name):
-                        field = getattr(Messages, field_name)
-                        if direction == 1:  # ASC
-                            peewee_sort_terms.append(field.asc())
-                        elif direction == -1:  # DESC
-                            peewee_sort_terms.append(field.desc())
-                        else:
-                            logger.warning(f"字段 '{field_name}' 的排序方向 '{direction}' 无效。将跳过此排序条件。")
-                    else:
-                        logger.warning(f"排序字段 '{field_name}' 在 Messages 模型中未找到。将跳过此排序条件。")
-                if peewee_sort_terms:
-                    query = query.order_by(*peewee_sort_terms)
-            peewee_results = list(query)
+    Args:
+        message_filter: 查询过滤器，同 find_messages。
+        fields: 需要的字段名（DatabaseMessages的扁平字段名，例如 "time"、"user_id"、"processed_plain_text"）。
+        其余参数同 find_messages。
 
-        return [_model_to_instance(msg) for msg in peewee_results]
+    Returns:
+        命名元组列表（按属性访问所需字段），如果出错则返回空列表。
+    """
+    row_type = _message_row_type(tuple(fields))
+    try:
+        rows = _query_message_rows(
+            message_filter, sort, limit, limit_mode, filter_bot, filter_command, include_archive, fields
+        )
+        return [row_type(*(row.get(name) for name in fields)) for row in rows]
     except Exception as e:
-        log_message = (
-            f"使用 Peewee 查找消息失败 (filter={message_filter}, sort={sort}, limit={limit}, limit_mode={limit_mode}): {e}\n"
+        logger.error(
+            f"使用 Peewee 查找消息字段失败 (filter={message_filter}, fields={fields}, limit={limit}): {e}\n"
             + traceback.format_exc()
         )
-        logger.error(log_message)
         return []
 
 
+async def find_messages_async(
+    message_filter: dict[str, Any],
+    sort: Optional[List[tuple[str, int]]] = None,
+    limit: int = 0,
+    limit_mode: str = "latest",
+    filter_bot=False,
+    filter_command=False,
+    include_archive: bool = False,
+) -> List[DatabaseMessages]:
+    """
+    find_messages 的异步版本，在数据库读线程中执行查询，不阻塞事件循环。参数与返回值同 find_messages。
+    """
+    if not include_archive:
+        # 已加载窗口的聊天直接在内存中回答，不需要进入读线程
+        rows = _find_in_recent_window(message_filter, sort, limit, limit_mode, filter_bot, filter_command, warm=False)
+        if rows is not None:
+            return [_model_to_instance(row) for row in rows]
+    return await db_executor.run_read(
+        find_messages, message_filter, sort, limit, limit_mode, filter_bot, filter_command, include_archive
+    )
+
+
+async def find_message_rows_async(
+    message_filter: dict[str, Any],
+    fields: Sequence[str],
+    sort: Optional[List[tuple[str, int]]] = None,
+    limit: int = 0,
+    limit_mode: str = "latest",
+    filter_bot=False,
+    filter_command=False,
+    include_archive: bool = False,
+) -> List[Any]:
+    """
+    find_message_rows 的异步版本，在数据库读线程中执行查询，不阻塞事件循环。参数与返回值同 find_message_rows。
+    """
+    return await db_executor.run_read(
+        find_message_rows, message_filter, fields, sort, limit, limit_mode, filter_bot, filter_command, include_archive
+    )
+
+
 def count_messages(message_filter: dict[str, Any]) -> int:
     """
     根据提供的过滤器计算消息数量。
@@ -134,14 +488,18 @@ def count_messages(message_filter: dict[str, Any]) -> int:
         符合条件的消息数量，如果出错则返回 0。
     """
     try:
+        pending_rows = _find_pending_rows(message_filter)
         query = Messages.select()
+        if message_filter and any(key in MESSAGE_INFO_FIELDS for key in message_filter):
+            # 只有按聊天信息/发送者信息筛选时才需要连接
+            query = join_message_info(query)
 
         # 应用过滤器
         if message_filter:
             conditions = []
             for key, value in message_filter.items():
-                if hasattr(Messages, key):
-                    field = getattr(Messages, key)
+                field = get_message_field(key)
+                if field is not None:
                     if isinstance(value, dict):
                         # 处理 MongoDB 风格的操作符
                         for op, op_value in value.items():
@@ -175,6 +533,16 @@ def count_messages(message_filter: dict[str, Any]) -> int:
         query = query.where(Messages.message_id != "notice")
 
         count = query.count()
+        if pending_rows:
+            # 排除快照之后已经落库、被上面的查询计入的消息
+            pending_ids = [row["message_id"] for row in pending_rows]
+            stored_keys = {
+                (msg.message_id, msg.chat_id, msg.time)
+                for msg in Messages.select(Messages.message_id, Messages.chat_id, Messages.time).where(
+                    Messages.message_id.in_(pending_ids)
+                )
+            }
+            count += sum(message_row_key(row) not in stored_keys for row in pending_rows)
         return count
     except Exception as e:
         log_message = f"使用 Peewee 计数消息失败 (message_filter={message_filter}): {e}\n{traceback.format_exc()}"
@@ -182,6 +550,80 @@ def count_messages(message_filter: dict[str, Any]) -> int:
         return 0
 
 
+async def count_messages_async(message_filter: dict[str, Any]) -> int:
+    """
+    count_messages 的异步版本，在数据库读线程中执行查询，不阻塞事件循环。参数与返回值同 count_messages。
+    """
+    return await db_executor.run_read(count_messages, message_filter)
+
+
+def search_messages(
+    query: str,
+    chat_id: Optional[str] = None,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    limit: int = 20,
+    order: str = "latest",
+) -> List[DatabaseMessages]:
+    """
+    按文本全文搜索消息（使用消息全文索引，不扫描消息表）。
+
+    搜索文本按jieba分词，返回包含所有词的消息；已归档的消息不在索引中。
+    order为"latest"时写缓冲区中尚未写入数据库的消息也会参与搜索（按子串匹配）。
+
+    Args:
+        query: 搜索文本。
+        chat_id: 只搜索该聊天的消息，为None时搜索所有聊天。
+        start_time: 开始时间戳（包含），为None时不限制。
+        end_time: 结束时间戳（包含），为None时不限制。
+        limit: 最多返回的消息数。
+        order: "latest" 按时间从新到旧排序，"rank" 按相关度从高到低排序。
+
+    Returns:
+        按order排序的消息列表，如果出错则返回空列表。
+    """
+    terms = split_search_terms(query)
+    if not terms or limit <= 0:
+        return []
+    try:
+        pending_rows: List[dict[str, Any]] = []
+        if order == "latest":
+            message_filter: dict[str, Any] = {} if chat_id is None else {"chat_id": chat_id}
+            if time_filter := {op: value for op, value in (("$gte", start_time), ("$lte", end_time)) if value is not None}:
+                message_filter["time"] = time_filter
+            lowered_terms = [term.lower() for term in terms]
+            pending_rows = [
+                row
+                for row in _find_pending_rows(message_filter)
+                if all(term in (row.get("processed_plain_text") or "").lower() for term in lowered_terms)
+            ]
+
+        ids = search_message_ids(build_match_query(terms), chat_id, start_time, end_time, limit, order)
+        rows_by_id = {row["id"]: row for row in select_messages_with_info().where(Messages.id.in_(ids)).dicts()}
+        rows = [rows_by_id[message_id] for message_id in ids if message_id in rows_by_id]
+        if pending_rows:
+            # 合并时按时间正序截取最新的limit条，再恢复为从新到旧
+            rows = _merge_rows(rows[::-1], pending_rows, None, limit, "latest")[::-1]
+        return [_model_to_instance(row) for row in rows]
+    except Exception as e:
+        logger.error(f"全文搜索消息失败 (query={query}, chat_id={chat_id}, order={order}): {e}\n{traceback.format_exc()}")
+        return []
+
+
+async def search_messages_async(
+    query: str,
+    chat_id: Optional[str] = None,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    limit: int = 20,
+    order: str = "latest",
+) -> List[DatabaseMessages]:
+    """
+    search_messages 的异步版本，在数据库读线程中执行查询，不阻塞事件循环。参数与返回值同 search_messages。
+    """
+    return await db_executor.run_read(search_messages, query, chat_id, start_time, end_time, limit, order)
+
+
 # 你可以在这里添加更多与 messages 集合相关的数据库操作函数，例如 find_one_message, insert_message 等。
 # 注意：对于 Peewee，插入操作通常是 Messages.create(...) 或 instance.save()。
 # 查找单个消息可以是 Messages.get_or_none(...) 或 query.first()。
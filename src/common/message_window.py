@@ -0,0 +1,169 @@
+import bisect
+import threading
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.common.message_write_buffer import message_row_key
+
+RECENT_WINDOW_SIZE = 200
+"""每个聊天在内存中保留的最近消息数"""
+
+RECENT_WINDOW_MAX_CHATS = 256
+"""保留最近消息窗口的聊天数（超出时淘汰最久未访问的聊天）"""
+
+
+class ChatMessageWindow:
+    """单个聊天的最近消息窗口（按时间升序）"""
+
+    def __init__(self, covered_since: float, size: int = RECENT_WINDOW_SIZE):
+        self.size = size
+        self.rows: List[Dict[str, Any]] = []
+        self._times: List[float] = []
+        self._keys: Set[Tuple[Any, Any, Any]] = set()
+
+        self.covered_since: float = covered_since
+        """窗口包含该聊天所有时间晚于此值的消息（更早的消息只能从数据库查询）"""
+
+    def insert(self, row: Dict[str, Any]):
+        """按时间顺序插入一条消息，超出窗口大小时淘汰最早的消息"""
+        row_time = row.get("time")
+        if row_time is None or row_time <= self.covered_since:
+            return
+        key = message_row_key(row)
+        if key in self._keys:
+            return
+        index = bisect.bisect_right(self._times, row_time)
+        self._times.insert(index, row_time)
+        self.rows.insert(index, row)
+        self._keys.add(key)
+        while len(self.rows) > self.size:
+            evicted = self.rows.pop(0)
+            self._times.pop(0)
+            self._keys.discard(message_row_key(evicted))
+            self.covered_since = max(self.covered_since, evicted["time"])
+
+    def update_message_id(self, old_message_id: str, new_message_id: str) -> bool:
+        """将最新一条匹配消息的message_id更新为新值（与数据库中的更新一致），返回是否找到匹配的消息"""
+        for index in range(len(self.rows) - 1, -1, -1):
+            row = self.rows[index]
+            if row.get("message_id") == old_message_id:
+                # 消息行可能同时被写缓冲区引用，替换而不是原地修改
+                updated = {**row, "message_id": new_message_id}
+                self._keys.discard(message_row_key(row))
+                self._keys.add(message_row_key(updated))
+                self.rows[index] = updated
+                return True
+        return False
+
+
+class RecentMessageWindow:
+    """
+    最近消息窗口
+
+    为活跃的聊天在内存中保留最近的消息，消息在存储时（收到与发送）加入窗口；
+    首次查询某个聊天时从数据库加载最近的消息，之后覆盖范围内的查询可直接由窗口回答，不再访问数据库
+    """
+
+    def __init__(self, window_size: int = RECENT_WINDOW_SIZE, max_chats: int = RECENT_WINDOW_MAX_CHATS):
+        self.window_size = window_size
+        self.max_chats = max_chats
+        self._windows: "OrderedDict[str, ChatMessageWindow]" = OrderedDict()
+        self._warming: Dict[str, List[Dict[str, Any]]] = {}
+        """正在从数据库加载的聊天 -> 加载期间加入的消息"""
+
+        self._lock = threading.Lock()
+        """窗口锁（查询可能在数据库读线程中进行）"""
+
+        self.hits: int = 0
+        """由窗口回答的查询数"""
+
+        self.misses: int = 0
+        """需要查询数据库的查询数"""
+
+    def add(self, row: Dict[str, Any]):
+        """
+        将一条刚存储的消息加入所属聊天的窗口（尚未加载窗口的聊天忽略，之后查询时从数据库加载）
+        :param row: 已规范化的消息行
+        """
+        chat_id = row.get("chat_id")
+        with self._lock:
+            if chat_id in self._windows:
+                self._windows[chat_id].insert(row)
+            elif chat_id in self._warming:
+                self._warming[chat_id].append(row)
+
+    def update_message_id(self, old_message_id: str, new_message_id: str):
+        """同步数据库中的message_id更新（从最近访问的聊天开始查找）"""
+        with self._lock:
+            for window in reversed(self._windows.values()):
+                if window.update_message_id(old_message_id, new_message_id):
+                    return
+
+    def snapshot(self, chat_id: str) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        """
+        获取聊天窗口中的消息与覆盖范围
+        :return: (按时间升序的消息行, covered_since)，聊天没有窗口时为None
+        """
+        with self._lock:
+            window = self._windows.get(chat_id)
+            if window is None:
+                return None
+            self._windows.move_to_end(chat_id)
+            return list(window.rows), window.covered_since
+
+    def begin_warm(self, chat_id: str) -> bool:
+        """开始为聊天加载窗口，返回是否需要由调用方加载（已有窗口或正在加载时为False）"""
+        with self._lock:
+            if chat_id in self._windows or chat_id in self._warming:
+                return False
+            self._warming[chat_id] = []
+            return True
+
+    def finish_warm(self, chat_id: str, db_rows: List[Dict[str, Any]], pending_rows: List[Dict[str, Any]]):
+        """
+        用从数据库加载的消息创建聊天窗口
+        :param db_rows: 数据库中该聊天最近的window_size条消息
+        :param pending_rows: 写缓冲区中该聊天的消息（需在查询数据库之前获取）
+        """
+        # 数据库中的消息不足window_size条时窗口包含该聊天的全部消息，否则只包含晚于其中最早一条的消息
+        covered_since = (
+            min(row["time"] for row in db_rows) if len(db_rows) >= self.window_size else float("-inf")
+        )
+        window = ChatMessageWindow(covered_since, self.window_size)
+        with self._lock:
+            if chat_id not in self._warming:
+                return  # 加载期间窗口被移除（消息被修改或删除），加载的结果可能已过期
+            added_rows = self._warming.pop(chat_id)
+            for row in db_rows + pending_rows + added_rows:
+                window.insert(row)
+            self._windows[chat_id] = window
+            while len(self._windows) > self.max_chats:
+                self._windows.popitem(last=False)
+
+    def abort_warm(self, chat_id: str):
+        """放弃加载聊天窗口"""
+        with self._lock:
+            self._warming.pop(chat_id, None)
+
+    def evict(self, chat_ids: Optional[Iterable[str]] = None):
+        """
+        移除聊天的窗口（消息在存储流程之外被修改或删除后调用，之后查询时重新从数据库加载）
+        :param chat_ids: 需要移除窗口的聊天，为None时移除所有聊天的窗口
+        """
+        with self._lock:
+            if chat_ids is None:
+                self._windows.clear()
+                self._warming.clear()
+                return
+            for chat_id in chat_ids:
+                self._windows.pop(chat_id, None)
+                self._warming.pop(chat_id, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取窗口状态：聊天数与命中/未命中次数"""
+        return {"chats": len(self._windows), "hits": self.hits, "misses": self.misses}
+
+
+recent_message_window = RecentMessageWindow()
+"""全局最近消息窗口"""
@@ -0,0 +1,212 @@
+import asyncio
+import threading
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from src.common.database.database import db
+from src.common.database.database_model import Messages
+from src.common.database.db_executor import db_executor
+from src.common.database.message_info import get_message_value_field, message_info_resolver
+from src.common.database.message_search import index_messages
+from src.common.logger import get_logger
+from src.manager.async_task_manager import AsyncTask
+
+logger = get_logger("message_write_buffer")
+
+MESSAGE_FLUSH_BATCH_SIZE = 50
+"""消息批量写入的批次大小（缓冲区达到该长度时立即触发写入）"""
+
+MESSAGE_FLUSH_INTERVAL = 1
+"""消息定时写入的间隔（单位：秒）"""
+
+MESSAGE_BUFFER_MAX_SIZE = 5000
+"""缓冲区的最大长度（数据库持续写入失败时超出部分丢弃最早的消息）"""
+
+
+def message_row_key(row: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    """消息行的去重键（缓冲区中的消息与刚写入数据库的同一条消息可能同时被读到）"""
+    return row.get("message_id"), row.get("chat_id"), row.get("time")
+
+
+class MessageWriteBuffer:
+    """
+    消息写缓冲区
+
+    消息先进入内存缓冲区立即返回，由后台任务按批次（数量/时间触发）在工作线程中以insert_many事务写入数据库；
+    写入完成前缓冲区中的消息仍可通过snapshot读到，保证同一聊天读到自己刚写入的消息
+    """
+
+    def __init__(self):
+        self._pending: Deque[Dict[str, Any]] = deque()
+        """等待写入的消息行"""
+
+        self._inflight: List[Dict[str, Any]] = []
+        """正在写入的消息行（事务提交后才移除）"""
+
+        self._lock = threading.Lock()
+        """缓冲区锁（写入在工作线程中进行）"""
+
+        self._flush_lock = threading.Lock()
+        """写库锁，保证同一时间只有一个批次在写入"""
+
+        self._flush_scheduled: bool = False
+        """是否已经调度了一次按数量触发的写入"""
+
+        self._flush_tasks: Set[asyncio.Task] = set()
+        """按数量触发的写入任务（保留引用，避免任务在完成前被回收）"""
+
+        self.flushed_rows: int = 0
+        """已写入数据库的消息数"""
+
+        self.dropped_rows: int = 0
+        """因缓冲区溢出而丢弃的消息数"""
+
+    @staticmethod
+    def _normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """按字段类型转换消息行的值，使缓冲区中读到的消息与从数据库读回的一致"""
+        normalized = {}
+        for name, value in row.items():
+            field = get_message_value_field(name)
+            normalized[name] = field.python_value(field.db_value(value)) if field is not None else value
+        return normalized
+
+    def add(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将一条消息加入缓冲区
+        :param row: 消息行（键为DatabaseMessages的扁平字段名，包括聊天信息与发送者信息）
+        :return: 按字段类型转换后的消息行
+        """
+        row = self._normalize_row(row)
+        with self._lock:
+            if len(self._pending) >= MESSAGE_BUFFER_MAX_SIZE:
+                self._pending.popleft()
+                self.dropped_rows += 1
+                logger.error(f"消息写缓冲区已满，丢弃最早的消息（累计丢弃 {self.dropped_rows} 条）")
+            self._pending.append(row)
+            pending = len(self._pending)
+
+        if pending >= MESSAGE_FLUSH_BATCH_SIZE and not self._flush_scheduled:
+            # 达到批次大小，立即调度一次写入
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return row  # 不在事件循环中，交给定时任务写入
+            self._flush_scheduled = True
+            task = loop.create_task(self.flush_async())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        return row
+
+    def snapshot(self, chat_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        获取尚未确认写入数据库的消息行（按加入顺序）
+        查询时应先取快照再查数据库，并按message_row_key去重：消息只会在事务提交后才从缓冲区移除
+        :param chat_id: 只返回该聊天的消息（为None时返回全部）
+        """
+        with self._lock:
+            rows = self._inflight + list(self._pending)
+        if chat_id is None:
+            return rows
+        return [row for row in rows if row.get("chat_id") == chat_id]
+
+    def contains_message_id(self, message_id: str) -> bool:
+        """缓冲区中是否有指定message_id的消息"""
+        with self._lock:
+            return any(row.get("message_id") == message_id for row in self._inflight + list(self._pending))
+
+    def flush(self) -> int:
+        """
+        将缓冲区中的消息批量写入数据库（同步，会阻塞当前线程）
+        批量写入失败时逐条写入；整批都无法写入时放回缓冲区头部，下次写入时重试
+        Returns:
+            int: 本次写入的消息数
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    count = min(len(self._pending), MESSAGE_FLUSH_BATCH_SIZE)
+                    self._inflight = [self._pending.popleft() for _ in range(count)]
+                    batch = self._inflight
+                if not batch:
+                    break
+                try:
+                    with db.atomic():
+                        last_id = Messages.insert_many(
+                            [message_info_resolver.to_storage_row(row) for row in batch]
+                        ).execute()
+                        # 同一条插入语句中的消息依次获得连续的id
+                        first_id = last_id - len(batch) + 1
+                        index_messages(
+                            (first_id + offset, row.get("processed_plain_text")) for offset, row in enumerate(batch)
+                        )
+                    batch_written = len(batch)
+                except Exception as e:
+                    # 事务回滚后新建的聊天信息/发送者信息也被撤销，缓存的id不再有效
+                    message_info_resolver.clear_cache()
+                    logger.warning(f"批量写入 {len(batch)} 条消息失败，改为逐条写入: {e}")
+                    batch_written = self._insert_one_by_one(batch)
+                    if not batch_written:
+                        # 整批都无法写入（例如数据库被锁），放回缓冲区等待下次重试
+                        with self._lock:
+                            self._pending.extendleft(reversed(batch))
+                            self._inflight = []
+                        break
+                with self._lock:
+                    self._inflight = []
+                written += batch_written
+        self.flushed_rows += written
+        return written
+
+    def _insert_one_by_one(self, batch: List[Dict[str, Any]]) -> int:
+        """逐条写入批次中的消息，丢弃无法写入的消息，返回写入成功的数量（全部失败时不丢弃）"""
+        failed: List[Tuple[Dict[str, Any], Exception]] = []
+        for row in batch:
+            try:
+                with db.atomic():
+                    message_id = Messages.insert(message_info_resolver.to_storage_row(row)).execute()
+                    index_messages([(message_id, row.get("processed_plain_text"))])
+            except Exception as e:
+                message_info_resolver.clear_cache()
+                failed.append((row, e))
+        written = len(batch) - len(failed)
+        if written:
+            for row, e in failed:
+                self.dropped_rows += 1
+                logger.error(f"消息 {row.get('message_id')} 写入失败，已丢弃: {e}")
+        return written
+
+    async def flush_async(self) -> int:
+        """
+        在数据库写线程中批量写入消息，不阻塞事件循环
+        Returns:
+            int: 本次写入的消息数
+        """
+        try:
+            return await db_executor.run_write(self.flush)
+        finally:
+            self._flush_scheduled = False
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓冲区状态：待写入、已写入和已丢弃的消息数"""
+        return {
+            "pending": len(self._pending) + len(self._inflight),
+            "flushed_rows": self.flushed_rows,
+            "dropped_rows": self.dropped_rows,
+        }
+
+
+class MessageFlushTask(AsyncTask):
+    """消息定时写入任务"""
+
+    def __init__(self):
+        super().__init__(task_name="Message Flush Task", run_interval=MESSAGE_FLUSH_INTERVAL)
+
+    async def run(self):
+        if written := await message_write_buffer.flush_async():
+            logger.debug(f"已批量写入 {written} 条消息，当前状态: {message_write_buffer.get_stats()}")
+
+
+message_write_buffer = MessageWriteBuffer()
+"""全局消息写缓冲区"""
@@ -1,4 +1,5 @@
 from dataclasses import dataclass, field
+from typing import Literal
 
 from .config_base import ConfigBase
 
@@ -28,6 +29,30 @@ class APIProvider(ConfigBase):
     retry_interval: int = 10
     """重试间隔（如果API调用失败，重试的间隔时间，单位：秒）"""
 
+    max_concurrency: int = 0
+    """最大并发请求数（超出的请求排队等待，0表示不限制）"""
+
+    rpm: int = 0
+    """每分钟最大请求数（0表示不限制）"""
+
+    tpm: int = 0
+    """每分钟最大token数（按请求内容估算，0表示不限制）"""
+
+    max_connections: int = 100
+    """HTTP连接池的最大连接数"""
+
+    max_keepalive_connections: int = 20
+    """HTTP连接池中保持空闲的最大连接数"""
+
+    keepalive_expiry: float = 30.0
+    """空闲连接的保持时长（单位：秒）"""
+
+    connect_timeout: float = 5.0
+    """建立连接的超时时长（单位：秒，读写超时仍使用timeout）"""
+
+    http2: bool = False
+    """是否启用HTTP/2（需要安装h2库）"""
+
     def get_api_key(self) -> str:
         return self.api_key
 
@@ -35,7 +60,7 @@ class APIProvider(ConfigBase):
         """确保api_key在repr中不被显示"""
         if not self.api_key:
             raise ValueError("API密钥不能为空，请在配置中设置有效的API密钥。")
-        if not self.base_url and self.client_type != "gemini":
+        if not self.base_url and self.client_type not in ("gemini", "mock"):
             raise ValueError("API基础URL不能为空，请在配置中设置有效的基础URL。")
         if not self.name:
             raise ValueError("API提供商名称不能为空，请在配置中设置有效的名称。")
@@ -88,6 +113,62 @@ class TaskConfig(ConfigBase):
     temperature: float = 0.3
     """模型温度"""
 
+    priority: Literal["", "interactive", "planning", "background"] = ""
+    """请求调度优先级：interactive（回复）、planning（规划）、background（后台），为空时按请求类型自动推断"""
+
+    prompt_token_budget: int = 0
+    """提示词token预算（目前用于replyer、planner与planner_small；超出时按优先级裁剪聊天记录、记忆、知识等信息块，0表示不限制）"""
+
+    selection_policy: Literal["balance", "least_latency", "p2c", "weighted"] = "balance"
+    """模型选择策略：balance按token用量和惩罚值均衡，least_latency选择实时延迟最低者，p2c随机取两个选择较优者，weighted按延迟倒数加权随机"""
+
+    hedge_enabled: bool = False
+    """是否启用对冲请求（首个模型在其近期延迟的指定分位数内仍未返回时，向模型列表中的下一个模型再发出一次请求，先返回者胜出）"""
+
+    hedge_percentile: float = 90
+    """触发对冲请求的延迟分位数（0-100）"""
+
+    hedge_budget_ratio: float = 0.1
+    """对冲请求额外消耗的token占该任务累计消耗的最大比例"""
+
+    single_flight: bool = False
+    """是否合并并发的相同请求（相同的模型列表、提示词、温度、最大token数和工具时，只向上游发送一次请求并共享结果）"""
+
+    response_cache: bool = False
+    """是否启用响应缓存（适用于低温度、输入稳定的确定性任务，相同请求直接返回本地缓存的结果）"""
+
+    response_cache_ttl: int = 86400
+    """响应缓存有效期（单位：秒）"""
+
+    response_cache_max_entries: int = 10000
+    """同一请求类型的最大缓存条数"""
+
+
+@dataclass
+class SchedulerConfig(ConfigBase):
+    """LLM请求调度配置类"""
+
+    max_concurrency: int = 0
+    """所有LLM请求的总并发上限，超出时按优先级排队（0表示不限制）"""
+
+    interactive_weight: int = 8
+    """交互类请求（回复）的调度权重"""
+
+    planning_weight: int = 4
+    """规划类请求（决策、动作判断）的调度权重"""
+
+    background_weight: int = 1
+    """后台类请求（记忆构建、表达学习、情绪、关系等）的调度权重"""
+
+    interactive_max_concurrency: int = 0
+    """交互类请求的并发上限（0表示只受总并发限制）"""
+
+    planning_max_concurrency: int = 0
+    """规划类请求的并发上限（0表示只受总并发限制）"""
+
+    background_max_concurrency: int = 0
+    """后台类请求的并发上限（0表示只受总并发限制）"""
+
 
 @dataclass
 class ModelTaskConfig(ConfigBase):
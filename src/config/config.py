@@ -33,6 +33,7 @@ from src.config.official_configs import (
     ToolConfig,
     VoiceConfig,
     DebugConfig,
+    DatabaseConfig,
     CustomPromptConfig,
 )
 
@@ -40,6 +41,7 @@ from .api_ada_configs import (
     ModelTaskConfig,
     ModelInfo,
     APIProvider,
+    SchedulerConfig,
 )
 
 
@@ -361,6 +363,7 @@ class Config(ConfigBase):
     debug: DebugConfig
     custom_prompt: CustomPromptConfig
     voice: VoiceConfig
+    database: DatabaseConfig = field(default_factory=DatabaseConfig)
 
 
 @dataclass
@@ -376,6 +379,9 @@ class APIAdapterConfig(ConfigBase):
     api_providers: List[APIProvider] = field(default_factory=list)
     """API提供商列表"""
 
+    scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
+    """LLM请求调度配置"""
+
     def __post_init__(self):
         if not self.models:
             raise ValueError("模型列表不能为空，请在配置中设置有效的模型列表。")
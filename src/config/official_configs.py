@@ -460,6 +460,17 @@ class TelemetryConfig(ConfigBase):
     """是否启用遥测"""
 
 
+@dataclass
+class DatabaseConfig(ConfigBase):
+    """数据库配置类"""
+
+    message_archive_enable: bool = False
+    """是否启用消息归档：定期将较早的消息移出消息表，按月保存到data/message_archive下的SQLite文件中"""
+
+    message_archive_days: int = 30
+    """消息在消息表中保留的天数，更早的消息会被归档"""
+
+
 @dataclass
 class DebugConfig(ConfigBase):
     """调试配置类"""
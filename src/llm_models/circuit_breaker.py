@@ -0,0 +1,186 @@
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, Optional
+
+from src.common.logger import get_logger
+from .exceptions import NetworkConnectionError, EmptyResponseException, RespNotOkException
+
+logger = get_logger("circuit_breaker")
+
+CIRCUIT_FAILURE_THRESHOLD = 3
+"""连续失败多少次后熔断"""
+
+CIRCUIT_ERROR_RATE_THRESHOLD = 0.5
+"""最近请求的错误率达到该值后熔断"""
+
+CIRCUIT_WINDOW_SIZE = 20
+"""计算错误率时使用的最近请求数"""
+
+CIRCUIT_MIN_SAMPLES = 10
+"""按错误率熔断前至少需要的样本数"""
+
+CIRCUIT_OPEN_SECONDS = 30.0
+"""熔断后首次探测前的等待时间（单位：秒）"""
+
+CIRCUIT_MAX_OPEN_SECONDS = 300.0
+"""探测连续失败时熔断时间翻倍，最长不超过该值（单位：秒）"""
+
+
+class CircuitState(Enum):
+    """熔断器状态"""
+
+    CLOSED = "closed"
+    """正常：请求照常发出"""
+
+    OPEN = "open"
+    """熔断：请求直接跳过该模型"""
+
+    HALF_OPEN = "half_open"
+    """半开：熔断时间已过，只放行一个探测请求"""
+
+
+@dataclass
+class ModelCircuit:
+    """单个模型的熔断器"""
+
+    state: CircuitState = CircuitState.CLOSED
+    """当前状态"""
+
+    consecutive_failures: int = 0
+    """连续失败次数"""
+
+    recent_results: deque = field(default_factory=lambda: deque(maxlen=CIRCUIT_WINDOW_SIZE))
+    """最近请求的结果（True为失败）"""
+
+    opened_at: float = 0.0
+    """最近一次熔断的时间"""
+
+    open_seconds: float = CIRCUIT_OPEN_SECONDS
+    """本次熔断的持续时间"""
+
+    probe_in_flight: bool = False
+    """半开状态下是否已有探测请求在进行"""
+
+    total_trips: int = 0
+    """累计熔断次数"""
+
+
+def is_circuit_failure(e: BaseException) -> bool:
+    """
+    判断异常是否说明模型端点不可用（只有此类异常计入熔断统计；参数错误、请求体过大、主动中断等与端点健康无关的异常不计入）
+    """
+    if isinstance(e, (NetworkConnectionError, EmptyResponseException)):
+        return True
+    if isinstance(e, RespNotOkException):
+        return e.status_code == 429 or e.status_code >= 500
+    return False
+
+
+class CircuitBreakerRegistry:
+    """
+    模型熔断器注册表
+
+    按模型记录连续失败次数与最近错误率（所有LLMRequest实例共享），超过阈值时熔断该模型：熔断期间的请求直接跳过该模型，
+    熔断时间结束后放行一个探测请求，探测成功则恢复，失败则以翻倍的时间继续熔断
+    """
+
+    def __init__(self):
+        self._circuits: Dict[str, ModelCircuit] = {}
+
+    def get(self, model_name: str) -> ModelCircuit:
+        if model_name not in self._circuits:
+            self._circuits[model_name] = ModelCircuit()
+        return self._circuits[model_name]
+
+    def is_available(self, model_name: str) -> bool:
+        """
+        判断模型当前是否可以接收请求（不改变状态）
+        """
+        circuit = self.get(model_name)
+        if circuit.state == CircuitState.CLOSED:
+            return True
+        if circuit.state == CircuitState.OPEN:
+            return time.time() - circuit.opened_at >= circuit.open_seconds
+        return not circuit.probe_in_flight
+
+    def on_request_start(self, model_name: str):
+        """记录请求开始（熔断时间已过的模型由此进入半开状态，本次请求作为探测请求）"""
+        circuit = self.get(model_name)
+        if circuit.state == CircuitState.OPEN and time.time() - circuit.opened_at >= circuit.open_seconds:
+            circuit.state = CircuitState.HALF_OPEN
+            logger.info(f"模型 '{model_name}' 熔断时间已到，发出探测请求")
+        if circuit.state == CircuitState.HALF_OPEN:
+            circuit.probe_in_flight = True
+
+    def on_request_success(self, model_name: str):
+        """记录请求成功"""
+        circuit = self.get(model_name)
+        circuit.consecutive_failures = 0
+        circuit.recent_results.append(False)
+        if circuit.state != CircuitState.CLOSED:
+            logger.info(f"模型 '{model_name}' 探测成功，恢复请求")
+            circuit.state = CircuitState.CLOSED
+            circuit.open_seconds = CIRCUIT_OPEN_SECONDS
+            circuit.recent_results.clear()
+        circuit.probe_in_flight = False
+
+    def on_request_failure(self, model_name: str, e: BaseException):
+        """
+        记录请求失败（与端点健康无关的异常只结束探测，不计入统计）
+        """
+        circuit = self.get(model_name)
+        if not is_circuit_failure(e):
+            circuit.probe_in_flight = False
+            return
+
+        circuit.consecutive_failures += 1
+        circuit.recent_results.append(True)
+        if circuit.state == CircuitState.HALF_OPEN:
+            # 探测失败，延长熔断时间
+            circuit.open_seconds = min(circuit.open_seconds * 2, CIRCUIT_MAX_OPEN_SECONDS)
+            self._trip(model_name, circuit, f"探测失败: {e}")
+            return
+        if circuit.state == CircuitState.OPEN:
+            return
+
+        error_rate = sum(circuit.recent_results) / len(circuit.recent_results)
+        if circuit.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self._trip(model_name, circuit, f"连续失败 {circuit.consecutive_failures} 次: {e}")
+        elif len(circuit.recent_results) >= CIRCUIT_MIN_SAMPLES and error_rate >= CIRCUIT_ERROR_RATE_THRESHOLD:
+            self._trip(model_name, circuit, f"最近错误率 {error_rate:.0%}: {e}")
+
+    def on_request_cancelled(self, model_name: str):
+        """记录请求被取消（不计入统计，只结束探测）"""
+        self.get(model_name).probe_in_flight = False
+
+    def _trip(self, model_name: str, circuit: ModelCircuit, reason: str):
+        circuit.state = CircuitState.OPEN
+        circuit.opened_at = time.time()
+        circuit.probe_in_flight = False
+        circuit.total_trips += 1
+        logger.warning(f"模型 '{model_name}' 已熔断 {circuit.open_seconds:.0f} 秒，原因：{reason}")
+
+    def get_remaining_open_time(self, model_name: str) -> Optional[float]:
+        """获取模型剩余的熔断时间（单位：秒），未熔断时为None"""
+        circuit = self.get(model_name)
+        if circuit.state != CircuitState.OPEN:
+            return None
+        return max(0.0, circuit.opened_at + circuit.open_seconds - time.time())
+
+    def get_summary(self) -> Dict[str, Dict[str, object]]:
+        """获取所有模型的熔断器状态"""
+        return {
+            name: {
+                "state": circuit.state.value,
+                "consecutive_failures": circuit.consecutive_failures,
+                "total_trips": circuit.total_trips,
+            }
+            for name, circuit in self._circuits.items()
+        }
+
+
+circuit_breaker = CircuitBreakerRegistry()
+"""全局模型熔断器，所有LLMRequest实例共享"""
@@ -28,9 +28,18 @@ class NetworkConnectionError(Exception):
 class ReqAbortException(Exception):
     """请求异常退出，常见于请求被中断或取消"""
 
-    def __init__(self, message: str | None = None):
+    def __init__(
+        self,
+        message: str | None = None,
+        partial_content: str = "",
+        usage: tuple[int, int, int, int] | None = None,
+    ):
         super().__init__(message)
         self.message = message
+        self.partial_content = partial_content
+        """中断前已生成的内容（含推理内容，用于估算已消耗的token）"""
+        self.usage = usage
+        """中断前上游已返回的使用情况 (prompt_tokens, completion_tokens, total_tokens, cached_tokens)，多数情况下为None"""
 
     def __str__(self):
         return self.message or "请求因未知原因异常终止"
@@ -107,3 +116,14 @@ class EmptyResponseException(Exception):
 
     def __str__(self):
         return self.message
+
+
+class ModelCircuitOpenException(Exception):
+    """模型已熔断，本次请求应切换到其他模型"""
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        self.model_name = model_name
+
+    def __str__(self):
+        return f"模型 '{self.model_name}' 已熔断"
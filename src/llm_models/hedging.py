@@ -0,0 +1,65 @@
+from typing import Dict
+
+from src.common.logger import get_logger
+
+logger = get_logger("hedging")
+
+HEDGE_MIN_SAMPLES = 10
+"""模型至少有多少个延迟样本后才允许对冲（样本太少时分位数不可靠）"""
+
+HEDGE_BUDGET_WARMUP_TOKENS = 20000
+"""预算预热额度：任务累计token数较少时，按该值计算对冲预算，避免冷启动时完全无法对冲"""
+
+
+class HedgeBudget:
+    """
+    对冲请求预算
+
+    按请求类型统计正常请求与对冲请求消耗的token，对冲请求的额外消耗不得超过正常消耗的一定比例
+    """
+
+    def __init__(self):
+        self._total_tokens: Dict[str, int] = {}
+        """请求类型 -> 累计消耗的token数"""
+
+        self._hedge_tokens: Dict[str, int] = {}
+        """请求类型 -> 对冲请求额外消耗的token数（估算）"""
+
+        self.hedged_requests: int = 0
+        """发出的对冲请求数"""
+
+        self.hedge_wins: int = 0
+        """对冲请求先于原请求返回的次数"""
+
+    def record_tokens(self, request_type: str, tokens: int):
+        """记录请求实际消耗的token数"""
+        self._total_tokens[request_type] = self._total_tokens.get(request_type, 0) + tokens
+
+    def try_spend(self, request_type: str, estimated_tokens: int, budget_ratio: float) -> bool:
+        """
+        尝试为一次对冲请求申请预算
+        :param request_type: 请求类型
+        :param estimated_tokens: 对冲请求估算的token数
+        :param budget_ratio: 对冲额外消耗占累计消耗的最大比例
+        :return: 预算是否充足（充足时会立即扣减）
+        """
+        total = max(self._total_tokens.get(request_type, 0), HEDGE_BUDGET_WARMUP_TOKENS)
+        spent = self._hedge_tokens.get(request_type, 0)
+        if spent + estimated_tokens > total * budget_ratio:
+            logger.debug(f"请求类型 '{request_type}' 的对冲预算不足，已用 {spent}，上限 {total * budget_ratio:.0f}")
+            return False
+        self._hedge_tokens[request_type] = spent + estimated_tokens
+        self.hedged_requests += 1
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取对冲统计信息"""
+        return {
+            "hedged_requests": self.hedged_requests,
+            "hedge_wins": self.hedge_wins,
+            "hedge_tokens": sum(self._hedge_tokens.values()),
+        }
+
+
+hedge_budget = HedgeBudget()
+"""全局对冲请求预算"""
@@ -6,3 +6,5 @@ if "openai" in used_client_types:
     from . import openai_client  # noqa: F401
 if "gemini" in used_client_types:
     from . import gemini_client  # noqa: F401
+if "mock" in used_client_types:
+    from . import mock_client  # noqa: F401
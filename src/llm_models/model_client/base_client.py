@@ -1,12 +1,18 @@
 import asyncio
+import json
+import weakref
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
-from typing import Callable, Any, Optional
+from typing import Callable, Any, Optional, AsyncIterator, Coroutine, TypeVar
 
 from src.config.api_ada_configs import ModelInfo, APIProvider
+from src.common.logger import get_logger
 from ..payload_content.message import Message
 from ..payload_content.resp_format import RespFormat
 from ..payload_content.tool_option import ToolOption, ToolCall
+from ..exceptions import ReqAbortException
+
+logger = get_logger("API客户端")
 
 
 @dataclass
@@ -30,6 +36,9 @@ class UsageRecord:
     total_tokens: int
     """总token数"""
 
+    cached_tokens: int = 0
+    """命中服务商提示词缓存的token数（包含在prompt_tokens中）"""
+
 
 @dataclass
 class APIResponse:
@@ -56,6 +65,69 @@ class APIResponse:
     """响应原始数据"""
 
 
+T = TypeVar("T")
+
+
+async def await_interruptible(coro: Coroutine[Any, Any, T], interrupt_flag: asyncio.Event | None) -> T:
+    """
+    等待请求完成，同时监听中断信号量；信号量被设置时立即取消请求（请求内的流式响应会随之关闭）
+    :param coro: 请求协程
+    :param interrupt_flag: 中断信号量（为None时直接等待请求）
+    :return: 请求结果
+    :raises ReqAbortException: 请求被中断
+    """
+    if interrupt_flag is None:
+        return await coro
+    if interrupt_flag.is_set():
+        coro.close()
+        raise ReqAbortException("请求被外部信号中断")
+
+    req_task = asyncio.ensure_future(coro)
+    flag_task = asyncio.create_task(interrupt_flag.wait())
+    try:
+        await asyncio.wait({req_task, flag_task}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        req_task.cancel()
+        # 外部取消时请求任务的结果不再需要，避免 "Task exception was never retrieved" 警告
+        req_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        raise
+    finally:
+        flag_task.cancel()
+
+    if req_task.done():
+        return req_task.result()
+
+    req_task.cancel()
+    try:
+        await req_task
+    except asyncio.CancelledError:
+        raise ReqAbortException("请求被外部信号中断") from None
+    # 请求在取消生效前恰好完成，仍视为被中断
+    raise ReqAbortException("请求被外部信号中断")
+
+
+@dataclass
+class StreamDelta:
+    """
+    流式响应增量
+    """
+
+    content: str | None = None
+    """正式内容增量"""
+
+    reasoning_content: str | None = None
+    """推理内容增量"""
+
+    tool_call_fragment: tuple[int, str | None, str | None, str] | None = None
+    """工具调用片段 (调用索引, 调用ID, 函数名称, 参数串片段)，ID和函数名称只在该调用的首个片段中出现"""
+
+    usage: UsageRecord | None = None
+    """使用情况（通常只在最后一个增量中出现）"""
+
+    model_name: str | None = None
+    """产生该增量的模型名称（由LLMRequest填充）"""
+
+
 class BaseClient(ABC):
     """
     基础客户端
@@ -97,6 +169,43 @@ class BaseClient(ABC):
         """
         raise NotImplementedError("'get_response' method should be overridden in subclasses")
 
+    async def get_response_stream(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        extra_params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[StreamDelta]:
+        """
+        以流式方式获取对话响应（默认实现为请求完整响应后一次性输出，支持流式的客户端应覆盖该方法）
+        :param model_info: 模型信息
+        :param message_list: 对话体
+        :param tool_options: 工具选项（可选，默认为None）
+        :param max_tokens: 最大token数（可选，默认为1024）
+        :param temperature: 温度（可选，默认为0.7）
+        :return: 流式响应增量的异步迭代器
+        """
+        resp = await self.get_response(
+            model_info=model_info,
+            message_list=message_list,
+            tool_options=tool_options,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            extra_params=extra_params,
+        )
+        if resp.reasoning_content:
+            yield StreamDelta(reasoning_content=resp.reasoning_content)
+        if resp.content:
+            yield StreamDelta(content=resp.content)
+        for index, call in enumerate(resp.tool_calls or []):
+            yield StreamDelta(
+                tool_call_fragment=(index, call.call_id, call.func_name, json.dumps(call.args or {}, ensure_ascii=False))
+            )
+        if resp.usage:
+            yield StreamDelta(usage=resp.usage)
+
     @abstractmethod
     async def get_embedding(
         self,
@@ -136,13 +245,31 @@ class BaseClient(ABC):
         """
         raise NotImplementedError("'get_support_image_formats' method should be overridden in subclasses")
 
+    async def aclose(self) -> None:
+        """
+        关闭客户端持有的连接（默认无操作，持有连接池的客户端应覆盖该方法）
+        """
+        return None
+
+    def get_connection_stats(self) -> dict[str, float]:
+        """
+        获取连接池统计（默认为空，持有连接池的客户端应覆盖该方法）
+        :return: {open_connections: 当前打开的连接数, requests: 请求数, new_connections: 新建的连接数}
+        """
+        return {}
+
 
 class ClientRegistry:
     def __init__(self) -> None:
         self.client_registry: dict[str, type[BaseClient]] = {}
         """APIProvider.type -> BaseClient的映射表"""
-        self.client_instance_cache: dict[str, BaseClient] = {}
-        """APIProvider.name -> BaseClient的映射表"""
+        self.client_instance_cache: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[str, BaseClient]
+        ] = weakref.WeakKeyDictionary()
+        """事件循环 -> (APIProvider.name -> BaseClient)的映射表
+        （HTTP连接池绑定事件循环，每个事件循环各自持有一组长连接客户端；事件循环被回收时其客户端随之释放）"""
+        self._no_loop_cache: dict[str, BaseClient] = {}
+        """无运行中事件循环时创建的客户端"""
 
     def register_client_class(self, client_type: str):
         """
@@ -161,27 +288,78 @@ class ClientRegistry:
 
     def get_client_class_instance(self, api_provider: APIProvider, force_new=False) -> BaseClient:
         """
-        获取注册的API客户端实例
+        获取注册的API客户端实例（同一事件循环中的同一API提供商共享一个客户端及其连接池）
         Args:
             api_provider: APIProvider实例
-            force_new: 是否强制创建新实例（用于解决事件循环问题）
+            force_new: 是否强制创建新实例（新实例不会被缓存，调用方需自行关闭）
         Returns:
             BaseClient: 注册的API客户端实例
         """
-        # 如果强制创建新实例，直接创建不使用缓存
+        client_class = self.client_registry.get(api_provider.client_type)
+        if client_class is None:
+            raise KeyError(f"'{api_provider.client_type}' 类型的 Client 未注册")
         if force_new:
-            if client_class := self.client_registry.get(api_provider.client_type):
-                return client_class(api_provider)
-            else:
-                raise KeyError(f"'{api_provider.client_type}' 类型的 Client 未注册")
-        
-        # 正常的缓存逻辑
-        if api_provider.name not in self.client_instance_cache:
-            if client_class := self.client_registry.get(api_provider.client_type):
-                self.client_instance_cache[api_provider.name] = client_class(api_provider)
-            else:
-                raise KeyError(f"'{api_provider.client_type}' 类型的 Client 未注册")
-        return self.client_instance_cache[api_provider.name]
+            return client_class(api_provider)
+
+        try:
+            cache = self.client_instance_cache.setdefault(asyncio.get_running_loop(), {})
+        except RuntimeError:
+            cache = self._no_loop_cache
+        if api_provider.name not in cache:
+            cache[api_provider.name] = client_class(api_provider)
+        return cache[api_provider.name]
+
+    async def aclose_all(self) -> None:
+        """
+        关闭缓存的所有客户端：当前事件循环与无事件循环时创建的客户端在当前循环中关闭，
+        其他仍在运行的事件循环中的客户端提交到对应循环中关闭；已停止的事件循环无法再执行关闭，只记录警告
+        """
+        current_loop = asyncio.get_running_loop()
+        pending: list[tuple[Optional[asyncio.AbstractEventLoop], list[BaseClient]]] = [
+            (loop, list(cache.values())) for loop, cache in list(self.client_instance_cache.items())
+        ]
+        # 无事件循环时创建的客户端在首次请求时才绑定事件循环，在当前循环中关闭
+        pending.append((None, list(self._no_loop_cache.values())))
+        self.client_instance_cache.clear()
+        self._no_loop_cache.clear()
+
+        for loop, clients in pending:
+            if loop is not None and loop is not current_loop and not loop.is_running():
+                if clients:
+                    logger.warning(
+                        f"事件循环已停止，无法关闭其中的 {len(clients)} 个API客户端"
+                        f"（{', '.join(client.api_provider.name for client in clients)}），连接将随事件循环回收释放"
+                    )
+                continue
+            for client in clients:
+                try:
+                    if loop is None or loop is current_loop:
+                        await client.aclose()
+                    else:
+                        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+                except Exception as e:
+                    logger.warning(f"关闭API客户端 '{client.api_provider.name}' 失败: {e}")
+
+    def get_connection_stats(self) -> dict[str, dict[str, float]]:
+        """
+        获取各API提供商的连接池统计（跨事件循环汇总）
+        :return: APIProvider.name -> {open_connections, requests, new_connections, reuse_rate}
+        """
+        stats: dict[str, dict[str, float]] = {}
+        for cache in list(self.client_instance_cache.values()):
+            for name, client in cache.items():
+                client_stats = client.get_connection_stats()
+                if not client_stats:
+                    continue
+                provider_stats = stats.setdefault(name, {"open_connections": 0, "requests": 0, "new_connections": 0})
+                for key in provider_stats:
+                    provider_stats[key] += client_stats.get(key, 0)
+        for provider_stats in stats.values():
+            requests = provider_stats["requests"]
+            provider_stats["reuse_rate"] = (
+                max(0.0, 1 - provider_stats["new_connections"] / requests) if requests else 0.0
+            )
+        return stats
 
 
 client_registry = ClientRegistry()
@@ -1,5 +1,6 @@
 import asyncio
 import io
+import json
 import base64
 from typing import Callable, AsyncIterator, Optional, Coroutine, Any, List
 
@@ -31,7 +32,7 @@ from google.genai.errors import (
 from src.config.api_ada_configs import ModelInfo, APIProvider
 from src.common.logger import get_logger
 
-from .base_client import APIResponse, UsageRecord, BaseClient, client_registry
+from .base_client import await_interruptible, APIResponse, UsageRecord, BaseClient, StreamDelta, client_registry
 from ..exceptions import (
     RespParseException,
     NetworkConnectionError,
@@ -236,7 +237,7 @@ def _build_stream_api_resp(
 async def _default_stream_response_handler(
     resp_stream: AsyncIterator[GenerateContentResponse],
     interrupt_flag: asyncio.Event | None,
-) -> tuple[APIResponse, Optional[tuple[int, int, int]]]:
+) -> tuple[APIResponse, Optional[tuple[int, int, int, int]]]:
     """
     流式响应处理函数 - 处理Gemini API的流式响应
     :param resp_stream: 流式响应对象,是一个神秘的iterator，我完全不知道这个玩意能不能跑，不过遍历一遍之后它就空了，如果跑不了一点的话可以考虑改成别的东西
@@ -250,25 +251,36 @@ async def _default_stream_response_handler(
         if _fc_delta_buffer and not _fc_delta_buffer.closed:
             _fc_delta_buffer.close()
 
-    async for chunk in resp_stream:
-        # 检查是否有中断量
-        if interrupt_flag and interrupt_flag.is_set():
-            # 如果中断量被设置，则抛出ReqAbortException
-            raise ReqAbortException("请求被外部信号中断")
-
-        _process_delta(
-            chunk,
-            _fc_delta_buffer,
-            _tool_calls_buffer,
-        )
-
-        if chunk.usage_metadata:
-            # 如果有使用情况，则将其存储在APIResponse对象中
-            _usage_record = (
-                chunk.usage_metadata.prompt_token_count or 0,
-                (chunk.usage_metadata.candidates_token_count or 0) + (chunk.usage_metadata.thoughts_token_count or 0),
-                chunk.usage_metadata.total_token_count or 0,
+    try:
+        async for chunk in resp_stream:
+            _process_delta(
+                chunk,
+                _fc_delta_buffer,
+                _tool_calls_buffer,
             )
+
+            if chunk.usage_metadata:
+                # 如果有使用情况，则将其存储在APIResponse对象中
+                _usage_record = (
+                    chunk.usage_metadata.prompt_token_count or 0,
+                    (chunk.usage_metadata.candidates_token_count or 0)
+                    + (chunk.usage_metadata.thoughts_token_count or 0),
+                    chunk.usage_metadata.total_token_count or 0,
+                    chunk.usage_metadata.cached_content_token_count or 0,
+                )
+    except asyncio.CancelledError:
+        if not (interrupt_flag and interrupt_flag.is_set()):
+            # 外部取消，照常传播
+            _insure_buffer_closed()
+            raise
+        # 请求被中断信号量取消，保留已生成的内容用于估算已消耗的token
+        partial_content = _fc_delta_buffer.getvalue()
+        _insure_buffer_closed()
+        raise ReqAbortException("请求被外部信号中断", partial_content=partial_content, usage=_usage_record) from None
+    finally:
+        # 及时关闭HTTP流，释放连接
+        if hasattr(resp_stream, "aclose"):
+            await resp_stream.aclose()  # type: ignore
     try:
         return _build_stream_api_resp(
             _fc_delta_buffer,
@@ -282,7 +294,7 @@ async def _default_stream_response_handler(
 
 def _default_normal_response_parser(
     resp: GenerateContentResponse,
-) -> tuple[APIResponse, Optional[tuple[int, int, int]]]:
+) -> tuple[APIResponse, Optional[tuple[int, int, int, int]]]:
     """
     解析对话补全响应 - 将Gemini API响应解析为APIResponse对象
     :param resp: 响应对象
@@ -326,6 +338,7 @@ def _default_normal_response_parser(
             usage_metadata.prompt_token_count or 0,
             (usage_metadata.candidates_token_count or 0) + (usage_metadata.thoughts_token_count or 0),
             usage_metadata.total_token_count or 0,
+            usage_metadata.cached_content_token_count or 0,
         )
     else:
         _usage_record = None
@@ -349,6 +362,11 @@ class GeminiClient(BaseClient):
             api_key=api_provider.api_key,
         )  # 这里和openai不一样，gemini会自己决定自己是否需要retry
 
+    async def aclose(self) -> None:
+        # 较旧版本的google-genai没有提供关闭方法，此时由SDK自行管理连接
+        if aclose := getattr(self.client.aio, "aclose", None):
+            await aclose()
+
     @staticmethod
     def clamp_thinking_budget(tb: int, model_id: str) -> int:
         """
@@ -384,47 +402,20 @@ class GeminiClient(BaseClient):
         logger.warning(f"模型 {model_id} 未在 THINKING_BUDGET_LIMITS 中定义，将使用动态模式 tb=-1 兼容。")
         return THINKING_BUDGET_AUTO
 
-    async def get_response(
+    def _build_request(
         self,
         model_info: ModelInfo,
         message_list: list[Message],
-        tool_options: list[ToolOption] | None = None,
-        max_tokens: int = 1024,
-        temperature: float = 0.4,
-        response_format: RespFormat | None = None,
-        stream_response_handler: Optional[
-            Callable[
-                [AsyncIterator[GenerateContentResponse], asyncio.Event | None],
-                Coroutine[Any, Any, tuple[APIResponse, Optional[tuple[int, int, int]]]],
-            ]
-        ] = None,
-        async_response_parser: Optional[
-            Callable[[GenerateContentResponse], tuple[APIResponse, Optional[tuple[int, int, int]]]]
-        ] = None,
-        interrupt_flag: asyncio.Event | None = None,
-        extra_params: dict[str, Any] | None = None,
-    ) -> APIResponse:
+        tool_options: list[ToolOption] | None,
+        max_tokens: int,
+        temperature: float,
+        response_format: RespFormat | None,
+        extra_params: dict[str, Any] | None,
+    ) -> tuple[tuple[ContentListUnion, list[str] | None], GenerateContentConfig]:
         """
-        获取对话响应
-        Args:
-            model_info: 模型信息
-            message_list: 对话体
-            tool_options: 工具选项（可选，默认为None）
-            max_tokens: 最大token数（可选，默认为1024）
-            temperature: 温度（可选，默认为0.7）
-            response_format: 响应格式（默认为text/plain,如果是输入的JSON Schema则必须遵守OpenAPI3.0格式,理论上和openai是一样的，暂不支持其它相应格式输入）
-            stream_response_handler: 流式响应处理函数（可选，默认为default_stream_response_handler）
-            async_response_parser: 响应解析函数（可选，默认为default_response_parser）
-            interrupt_flag: 中断信号量（可选，默认为None）
-        Returns:
-            APIResponse对象，包含响应内容、推理内容、工具调用等信息
+        构建请求内容与生成配置
+        :return: ((转换后的消息列表, system消息), 生成配置)
         """
-        if stream_response_handler is None:
-            stream_response_handler = _default_stream_response_handler
-
-        if async_response_parser is None:
-            async_response_parser = _default_normal_response_parser
-
         # 将messages构造为Gemini API所需的格式
         messages = _convert_messages(message_list)
         # 将tool_options转换为Gemini API所需的格式
@@ -464,38 +455,76 @@ class GeminiClient(BaseClient):
 
         generation_config = GenerateContentConfig(**generation_config_dict)
 
+        return messages, generation_config
+
+    async def get_response(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.4,
+        response_format: RespFormat | None = None,
+        stream_response_handler: Optional[
+            Callable[
+                [AsyncIterator[GenerateContentResponse], asyncio.Event | None],
+                Coroutine[Any, Any, tuple[APIResponse, Optional[tuple[int, int, int, int]]]],
+            ]
+        ] = None,
+        async_response_parser: Optional[
+            Callable[[GenerateContentResponse], tuple[APIResponse, Optional[tuple[int, int, int, int]]]]
+        ] = None,
+        interrupt_flag: asyncio.Event | None = None,
+        extra_params: dict[str, Any] | None = None,
+    ) -> APIResponse:
+        """
+        获取对话响应
+        Args:
+            model_info: 模型信息
+            message_list: 对话体
+            tool_options: 工具选项（可选，默认为None）
+            max_tokens: 最大token数（可选，默认为1024）
+            temperature: 温度（可选，默认为0.7）
+            response_format: 响应格式（默认为text/plain,如果是输入的JSON Schema则必须遵守OpenAPI3.0格式,理论上和openai是一样的，暂不支持其它相应格式输入）
+            stream_response_handler: 流式响应处理函数（可选，默认为default_stream_response_handler）
+            async_response_parser: 响应解析函数（可选，默认为default_response_parser）
+            interrupt_flag: 中断信号量（可选，默认为None）
+        Returns:
+            APIResponse对象，包含响应内容、推理内容、工具调用等信息
+        """
+        if stream_response_handler is None:
+            stream_response_handler = _default_stream_response_handler
+
+        if async_response_parser is None:
+            async_response_parser = _default_normal_response_parser
+
+        messages, generation_config = self._build_request(
+            model_info, message_list, tool_options, max_tokens, temperature, response_format, extra_params
+        )
+
+        async def _stream_request() -> tuple[APIResponse, Optional[tuple[int, int, int, int]]]:
+            resp_stream = await self.client.aio.models.generate_content_stream(
+                model=model_info.model_identifier,
+                contents=messages[0],
+                config=generation_config,
+            )
+            return await stream_response_handler(resp_stream, interrupt_flag)
+
+        async def _normal_request() -> tuple[APIResponse, Optional[tuple[int, int, int, int]]]:
+            resp = await self.client.aio.models.generate_content(
+                model=model_info.model_identifier,
+                contents=messages[0],
+                config=generation_config,
+            )
+            return async_response_parser(resp)
+
         try:
-            if model_info.force_stream_mode:
-                req_task = asyncio.create_task(
-                    self.client.aio.models.generate_content_stream(
-                        model=model_info.model_identifier,
-                        contents=messages[0],
-                        config=generation_config,
-                    )
-                )
-                while not req_task.done():
-                    if interrupt_flag and interrupt_flag.is_set():
-                        # 如果中断量存在且被设置，则取消任务并抛出异常
-                        req_task.cancel()
-                        raise ReqAbortException("请求被外部信号中断")
-                    await asyncio.sleep(0.1)  # 等待0.1秒后再次检查任务&中断信号量状态
-                resp, usage_record = await stream_response_handler(req_task.result(), interrupt_flag)
-            else:
-                req_task = asyncio.create_task(
-                    self.client.aio.models.generate_content(
-                        model=model_info.model_identifier,
-                        contents=messages[0],
-                        config=generation_config,
-                    )
-                )
-                while not req_task.done():
-                    if interrupt_flag and interrupt_flag.is_set():
-                        # 如果中断量存在且被设置，则取消任务并抛出异常
-                        req_task.cancel()
-                        raise ReqAbortException("请求被外部信号中断")
-                    await asyncio.sleep(0.5)  # 等待0.5秒后再次检查任务&中断信号量状态
-
-                resp, usage_record = async_response_parser(req_task.result())
+            # 中断信号量被设置时立即取消请求任务，而不是轮询检查
+            resp, usage_record = await await_interruptible(
+                _stream_request() if model_info.force_stream_mode else _normal_request(), interrupt_flag
+            )
+        except ReqAbortException:
+            raise
         except (ClientError, ServerError) as e:
             # 重封装ClientError和ServerError为RespNotOkException
             raise RespNotOkException(e.code, e.message) from None
@@ -515,10 +544,92 @@ class GeminiClient(BaseClient):
                 prompt_tokens=usage_record[0],
                 completion_tokens=usage_record[1],
                 total_tokens=usage_record[2],
+                cached_tokens=usage_record[3],
             )
 
         return resp
 
+    async def get_response_stream(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        extra_params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[StreamDelta]:
+        """
+        以流式方式获取对话响应
+        Args:
+            model_info: 模型信息
+            message_list: 对话体
+            tool_options: 工具选项（可选，默认为None）
+            max_tokens: 最大token数（可选，默认为1024）
+            temperature: 温度（可选，默认为0.7）
+        Returns:
+            流式响应增量的异步迭代器
+        """
+        messages, generation_config = self._build_request(
+            model_info, message_list, tool_options, max_tokens, temperature, None, extra_params
+        )
+
+        last_usage_metadata = None
+        tool_call_index = 0
+        try:
+            resp_stream = await self.client.aio.models.generate_content_stream(
+                model=model_info.model_identifier,
+                contents=messages[0],
+                config=generation_config,
+            )
+            async for chunk in resp_stream:
+                if chunk.usage_metadata:
+                    # 只有最后一个chunk的usage_metadata是完整的
+                    last_usage_metadata = chunk.usage_metadata
+                if not chunk.candidates or not chunk.candidates[0].content:
+                    continue
+                for part in chunk.candidates[0].content.parts or []:
+                    if not part.text:
+                        continue
+                    if part.thought:
+                        yield StreamDelta(reasoning_content=part.text)
+                    else:
+                        yield StreamDelta(content=part.text)
+                # gemini的工具调用不会被拆分，每个调用作为一个完整片段输出
+                for call in chunk.function_calls or []:
+                    yield StreamDelta(
+                        tool_call_fragment=(
+                            tool_call_index,
+                            call.id or f"call_{tool_call_index}",
+                            call.name,
+                            json.dumps(call.args or {}, ensure_ascii=False),
+                        )
+                    )
+                    tool_call_index += 1
+        except (ClientError, ServerError) as e:
+            # 重封装ClientError和ServerError为RespNotOkException
+            raise RespNotOkException(e.code, e.message) from None
+        except (
+            UnknownFunctionCallArgumentError,
+            UnsupportedFunctionError,
+            FunctionInvocationError,
+        ) as e:
+            raise ValueError(f"工具类型错误：请检查工具选项和参数：{str(e)}") from None
+        except Exception as e:
+            raise NetworkConnectionError() from e
+
+        if last_usage_metadata:
+            yield StreamDelta(
+                usage=UsageRecord(
+                    model_name=model_info.name,
+                    provider_name=model_info.api_provider,
+                    prompt_tokens=last_usage_metadata.prompt_token_count or 0,
+                    completion_tokens=(last_usage_metadata.candidates_token_count or 0)
+                    + (last_usage_metadata.thoughts_token_count or 0),
+                    total_tokens=last_usage_metadata.total_token_count or 0,
+                    cached_tokens=last_usage_metadata.cached_content_token_count or 0,
+                )
+            )
+
     async def get_embedding(
         self,
         model_info: ModelInfo,
@@ -612,6 +723,7 @@ class GeminiClient(BaseClient):
                 prompt_tokens=usage_record[0],
                 completion_tokens=usage_record[1],
                 total_tokens=usage_record[2],
+                cached_tokens=usage_record[3],
             )
 
         return resp
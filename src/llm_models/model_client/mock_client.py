@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+from dataclasses import dataclass, field, fields
+from typing import Any, AsyncIterator, Optional
+
+from src.config.api_ada_configs import ModelInfo, APIProvider
+from src.common.logger import get_logger
+
+from .base_client import APIResponse, UsageRecord, BaseClient, StreamDelta, await_interruptible, client_registry
+from ..exceptions import NetworkConnectionError, RespNotOkException, EmptyResponseException
+from ..payload_content.message import Message
+from ..payload_content.resp_format import RespFormat
+from ..payload_content.tool_option import ToolOption, ToolParamType, ToolCall
+from ..utils import estimate_message_tokens, estimate_text_tokens
+
+logger = get_logger("Mock客户端")
+
+
+@dataclass
+class MockSettings:
+    """
+    模拟模型的行为配置（从模型配置的extra_params中读取同名参数）
+    """
+
+    mock_response: str = "[模拟回复] {model} 收到了 {prompt_tokens} tokens 的请求：{prompt}"
+    """回复模板，可用变量：{model}（模型名称）、{prompt}（最后一条消息的前50个字符）、{prompt_tokens}（输入token数）、{request_id}（请求序号）"""
+
+    mock_reasoning: str = ""
+    """推理内容模板（变量同mock_response，为空时不输出推理内容）"""
+
+    mock_latency: float = 0.5
+    """平均延迟（单位：秒）"""
+
+    mock_latency_jitter: float = 0.1
+    """延迟抖动：uniform分布时为半宽，normal/lognormal分布时为标准差（单位：秒）"""
+
+    mock_latency_distribution: str = "normal"
+    """延迟分布（fixed/uniform/normal/lognormal）"""
+
+    mock_ttft_ratio: float = 0.3
+    """流式输出时首token延迟占总延迟的比例"""
+
+    mock_error_rate: float = 0.0
+    """注入错误的概率（0-1）"""
+
+    mock_error_codes: list[int] = field(default_factory=lambda: [429, 500, 503])
+    """注入错误时随机选择的状态码（0表示连接错误，-1表示空响应）"""
+
+    mock_tool_call_rate: float = 0.0
+    """提供了工具时返回工具调用的概率（0-1）"""
+
+    mock_stream_chunk_chars: int = 4
+    """流式输出时每个增量的字符数"""
+
+    mock_embedding_dim: int = 1024
+    """嵌入向量维度"""
+
+    mock_seed: Optional[int] = None
+    """随机种子；设置后相同请求的延迟、错误与工具调用结果完全确定"""
+
+    @classmethod
+    def from_extra_params(cls, extra_params: dict[str, Any] | None) -> "MockSettings":
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (extra_params or {}).items() if k in known})
+
+
+def _last_message_text(message_list: list[Message]) -> str:
+    if not message_list:
+        return ""
+    content = message_list[-1].content
+    if isinstance(content, str):
+        return content
+    return "".join(item for item in content if isinstance(item, str))
+
+
+@client_registry.register_client_class("mock")
+class MockClient(BaseClient):
+    """
+    模拟客户端
+
+    不发出任何网络请求，按配置生成回复、嵌入与工具调用，并模拟延迟、错误与流式输出，用于离线压测与基准测试
+    """
+
+    def __init__(self, api_provider: APIProvider):
+        super().__init__(api_provider)
+        self._request_count = 0
+
+    def _prepare(
+        self, model_info: ModelInfo, key: str, extra_params: dict[str, Any] | None
+    ) -> tuple[MockSettings, random.Random, int]:
+        """解析配置并创建本次请求的随机数生成器"""
+        self._request_count += 1
+        settings = MockSettings.from_extra_params(extra_params)
+        if settings.mock_seed is None:
+            rng = random.Random()
+        else:
+            digest = hashlib.sha256(f"{settings.mock_seed}:{model_info.name}:{key}".encode("utf-8")).hexdigest()
+            rng = random.Random(int(digest[:16], 16))
+        return settings, rng, self._request_count
+
+    @staticmethod
+    def _sample_latency(settings: MockSettings, rng: random.Random) -> float:
+        mean, jitter = settings.mock_latency, settings.mock_latency_jitter
+        distribution = settings.mock_latency_distribution
+        if distribution == "fixed" or jitter <= 0:
+            latency = mean
+        elif distribution == "uniform":
+            latency = rng.uniform(mean - jitter, mean + jitter)
+        elif distribution == "lognormal" and mean > 0:
+            # 按给定的均值与标准差换算对数正态分布参数，得到长尾延迟
+            sigma2 = math.log(1 + (jitter / mean) ** 2)
+            latency = rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        else:
+            latency = rng.gauss(mean, jitter)
+        return max(0.0, latency)
+
+    @staticmethod
+    def _maybe_raise_error(settings: MockSettings, rng: random.Random):
+        if settings.mock_error_rate <= 0 or rng.random() >= settings.mock_error_rate:
+            return
+        code = rng.choice(settings.mock_error_codes or [500])
+        logger.debug(f"注入模拟错误: {code}")
+        if code == 0:
+            raise NetworkConnectionError()
+        if code == -1:
+            raise EmptyResponseException("模拟的空响应")
+        raise RespNotOkException(code, f"模拟的错误响应：{code}")
+
+    @staticmethod
+    def _build_tool_calls(
+        settings: MockSettings, rng: random.Random, tool_options: list[ToolOption] | None
+    ) -> list[ToolCall] | None:
+        if not tool_options or rng.random() >= settings.mock_tool_call_rate:
+            return None
+        tool = rng.choice(tool_options)
+        default_values = {
+            ToolParamType.STRING: "mock",
+            ToolParamType.INTEGER: 1,
+            ToolParamType.FLOAT: 1.0,
+            ToolParamType.BOOLEAN: True,
+        }
+        args = {
+            param.name: param.enum_values[0] if param.enum_values else default_values[param.param_type]
+            for param in tool.params or []
+            if param.required
+        }
+        return [ToolCall(f"mock_call_{rng.randrange(1 << 32):08x}", tool.name, args)]
+
+    def _build_response(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None,
+        max_tokens: int,
+        settings: MockSettings,
+        rng: random.Random,
+        request_id: int,
+    ) -> APIResponse:
+        prompt_tokens = estimate_message_tokens(message_list)
+        variables = {
+            "model": model_info.name,
+            "prompt": _last_message_text(message_list)[:50],
+            "prompt_tokens": prompt_tokens,
+            "request_id": request_id,
+        }
+        tool_calls = self._build_tool_calls(settings, rng, tool_options)
+        # 与真实模型一致：返回工具调用时通常不输出正文
+        content = "" if tool_calls else settings.mock_response.format(**variables)
+        reasoning = settings.mock_reasoning.format(**variables) if settings.mock_reasoning else None
+
+        completion_tokens = min(max_tokens, estimate_text_tokens(content) + estimate_text_tokens(reasoning or ""))
+        return APIResponse(
+            content=content,
+            reasoning_content=reasoning,
+            tool_calls=tool_calls,
+            usage=UsageRecord(
+                model_name=model_info.name,
+                provider_name=model_info.api_provider,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+
+    async def get_response(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        response_format: RespFormat | None = None,
+        stream_response_handler: Optional[Any] = None,
+        async_response_parser: Optional[Any] = None,
+        interrupt_flag: asyncio.Event | None = None,
+        extra_params: dict[str, Any] | None = None,
+    ) -> APIResponse:
+        """
+        获取模拟的对话响应（流式处理函数与响应解析函数不会被调用）
+        """
+        settings, rng, request_id = self._prepare(model_info, _last_message_text(message_list), extra_params)
+        await await_interruptible(asyncio.sleep(self._sample_latency(settings, rng)), interrupt_flag)
+        self._maybe_raise_error(settings, rng)
+        return self._build_response(model_info, message_list, tool_options, max_tokens, settings, rng, request_id)
+
+    async def get_response_stream(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        extra_params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[StreamDelta]:
+        """
+        以流式方式获取模拟的对话响应：首个增量在总延迟的mock_ttft_ratio处到达，其余增量在剩余时间内均匀到达
+        """
+        settings, rng, request_id = self._prepare(model_info, _last_message_text(message_list), extra_params)
+        latency = self._sample_latency(settings, rng)
+        ttft = latency * min(1.0, max(0.0, settings.mock_ttft_ratio))
+        await asyncio.sleep(ttft)
+        self._maybe_raise_error(settings, rng)
+        resp = self._build_response(model_info, message_list, tool_options, max_tokens, settings, rng, request_id)
+
+        chunk_size = max(1, settings.mock_stream_chunk_chars)
+        deltas: list[StreamDelta] = []
+        if resp.reasoning_content:
+            deltas.extend(
+                StreamDelta(reasoning_content=resp.reasoning_content[i : i + chunk_size])
+                for i in range(0, len(resp.reasoning_content), chunk_size)
+            )
+        if resp.content:
+            deltas.extend(
+                StreamDelta(content=resp.content[i : i + chunk_size]) for i in range(0, len(resp.content), chunk_size)
+            )
+        for index, call in enumerate(resp.tool_calls or []):
+            deltas.append(StreamDelta(tool_call_fragment=(index, call.call_id, call.func_name, json.dumps(call.args or {}, ensure_ascii=False))))
+
+        interval = (latency - ttft) / max(1, len(deltas) - 1)
+        for index, delta in enumerate(deltas):
+            if index > 0:
+                await asyncio.sleep(interval)
+            yield delta
+        yield StreamDelta(usage=resp.usage)
+
+    async def get_embedding(
+        self,
+        model_info: ModelInfo,
+        embedding_input: str,
+        extra_params: dict[str, Any] | None = None,
+    ) -> APIResponse:
+        """
+        获取模拟的文本嵌入（相同文本总是得到相同的单位向量）
+        """
+        settings, rng, _ = self._prepare(model_info, embedding_input, extra_params)
+        await asyncio.sleep(self._sample_latency(settings, rng))
+        self._maybe_raise_error(settings, rng)
+
+        digest = hashlib.sha256(embedding_input.encode("utf-8")).hexdigest()
+        vector_rng = random.Random(int(digest[:16], 16))
+        vector = [vector_rng.gauss(0.0, 1.0) for _ in range(settings.mock_embedding_dim)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+
+        prompt_tokens = estimate_text_tokens(embedding_input)
+        return APIResponse(
+            embedding=[v / norm for v in vector],
+            usage=UsageRecord(
+                model_name=model_info.name,
+                provider_name=model_info.api_provider,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=0,
+                total_tokens=prompt_tokens,
+            ),
+        )
+
+    async def get_audio_transcriptions(
+        self,
+        model_info: ModelInfo,
+        audio_base64: str,
+        extra_params: dict[str, Any] | None = None,
+    ) -> APIResponse:
+        """
+        获取模拟的音频转录
+        """
+        settings, rng, _ = self._prepare(model_info, audio_base64[:64], extra_params)
+        await asyncio.sleep(self._sample_latency(settings, rng))
+        self._maybe_raise_error(settings, rng)
+        return APIResponse(content=f"[模拟转录] {model_info.name}")
+
+    def get_support_image_formats(self) -> list[str]:
+        """
+        获取支持的图片格式
+        """
+        return ["jpg", "jpeg", "png", "webp", "gif"]
@@ -3,10 +3,13 @@ import io
 import json
 import re
 import base64
+import importlib.util
 from collections.abc import Iterable
-from typing import Callable, Any, Coroutine, Optional
+from typing import Callable, Any, Coroutine, Optional, AsyncIterator
 from json_repair import repair_json
 
+import httpx
+
 from openai import (
     AsyncOpenAI,
     APIConnectionError,
@@ -24,7 +27,7 @@ from openai.types.chat.chat_completion_chunk import ChoiceDelta
 
 from src.config.api_ada_configs import ModelInfo, APIProvider
 from src.common.logger import get_logger
-from .base_client import APIResponse, UsageRecord, BaseClient, client_registry
+from .base_client import await_interruptible, APIResponse, UsageRecord, BaseClient, StreamDelta, client_registry
 from ..exceptions import (
     RespParseException,
     NetworkConnectionError,
@@ -242,10 +245,20 @@ def _build_stream_api_resp(
     return resp
 
 
+def _get_cached_tokens(usage: Any) -> int:
+    """
+    获取命中提示词缓存的token数
+    OpenAI格式在prompt_tokens_details.cached_tokens中返回，DeepSeek等服务商在prompt_cache_hit_tokens中返回
+    """
+    if (details := getattr(usage, "prompt_tokens_details", None)) and getattr(details, "cached_tokens", None):
+        return details.cached_tokens
+    return getattr(usage, "prompt_cache_hit_tokens", None) or 0
+
+
 async def _default_stream_response_handler(
     resp_stream: AsyncStream[ChatCompletionChunk],
     interrupt_flag: asyncio.Event | None,
-) -> tuple[APIResponse, Optional[tuple[int, int, int]]]:
+) -> tuple[APIResponse, Optional[tuple[int, int, int, int]]]:
     """
     流式响应处理函数 - 处理OpenAI API的流式响应
     :param resp_stream: 流式响应对象
@@ -269,42 +282,53 @@ async def _default_stream_response_handler(
             if buffer and not buffer.closed:
                 buffer.close()
 
-    async for event in resp_stream:
-        if interrupt_flag and interrupt_flag.is_set():
-            # 如果中断量被设置，则抛出ReqAbortException
-            _insure_buffer_closed()
-            raise ReqAbortException("请求被外部信号中断")
-        # 空 choices / usage-only 帧的防御
-        if not hasattr(event, "choices") or not event.choices:
-            if hasattr(event, "usage") and event.usage:
+    try:
+        async for event in resp_stream:
+            # 空 choices / usage-only 帧的防御
+            if not hasattr(event, "choices") or not event.choices:
+                if hasattr(event, "usage") and event.usage:
+                    _usage_record = (
+                        event.usage.prompt_tokens or 0,
+                        event.usage.completion_tokens or 0,
+                        event.usage.total_tokens or 0,
+                        _get_cached_tokens(event.usage),
+                    )
+                continue  # 跳过本帧，避免访问 choices[0]
+            delta = event.choices[0].delta  # 获取当前块的delta内容
+
+            if hasattr(delta, "reasoning_content") and delta.reasoning_content:  # type: ignore
+                # 标记：有独立的推理内容块
+                _has_rc_attr_flag = True
+
+            _in_rc_flag = _process_delta(
+                delta,
+                _has_rc_attr_flag,
+                _in_rc_flag,
+                _rc_delta_buffer,
+                _fc_delta_buffer,
+                _tool_calls_buffer,
+            )
+
+            if event.usage:
+                # 如果有使用情况，则将其存储在APIResponse对象中
                 _usage_record = (
                     event.usage.prompt_tokens or 0,
                     event.usage.completion_tokens or 0,
                     event.usage.total_tokens or 0,
+                    _get_cached_tokens(event.usage),
                 )
-            continue  # 跳过本帧，避免访问 choices[0]
-        delta = event.choices[0].delta  # 获取当前块的delta内容
-
-        if hasattr(delta, "reasoning_content") and delta.reasoning_content:  # type: ignore
-            # 标记：有独立的推理内容块
-            _has_rc_attr_flag = True
-
-        _in_rc_flag = _process_delta(
-            delta,
-            _has_rc_attr_flag,
-            _in_rc_flag,
-            _rc_delta_buffer,
-            _fc_delta_buffer,
-            _tool_calls_buffer,
-        )
-
-        if event.usage:
-            # 如果有使用情况，则将其存储在APIResponse对象中
-            _usage_record = (
-                event.usage.prompt_tokens or 0,
-                event.usage.completion_tokens or 0,
-                event.usage.total_tokens or 0,
-            )
+    except asyncio.CancelledError:
+        if not (interrupt_flag and interrupt_flag.is_set()):
+            # 外部取消，照常传播
+            _insure_buffer_closed()
+            raise
+        # 请求被中断信号量取消，保留已生成的内容用于估算已消耗的token
+        partial_content = _rc_delta_buffer.getvalue() + _fc_delta_buffer.getvalue()
+        _insure_buffer_closed()
+        raise ReqAbortException("请求被外部信号中断", partial_content=partial_content, usage=_usage_record) from None
+    finally:
+        # 及时关闭HTTP流，释放连接
+        await resp_stream.close()
 
     try:
         return _build_stream_api_resp(
@@ -327,7 +351,7 @@ pattern = re.compile(
 
 def _default_normal_response_parser(
     resp: ChatCompletion,
-) -> tuple[APIResponse, Optional[tuple[int, int, int]]]:
+) -> tuple[APIResponse, Optional[tuple[int, int, int, int]]]:
     """
     解析对话补全响应 - 将OpenAI API响应解析为APIResponse对象
     :param resp: 响应对象
@@ -374,6 +398,7 @@ def _default_normal_response_parser(
             resp.usage.prompt_tokens or 0,
             resp.usage.completion_tokens or 0,
             resp.usage.total_tokens or 0,
+            _get_cached_tokens(resp.usage),
         )
     else:
         _usage_record = None
@@ -391,13 +416,58 @@ def _default_normal_response_parser(
 class OpenaiClient(BaseClient):
     def __init__(self, api_provider: APIProvider):
         super().__init__(api_provider)
+        self._request_count = 0
+        """经过连接池的HTTP请求数"""
+        self._new_connection_count = 0
+        """连接池新建的连接数"""
+
+        http2 = api_provider.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning(f"API提供商 '{api_provider.name}' 启用了HTTP/2，但未安装h2库，将回退到HTTP/1.1")
+            http2 = False
+
+        self.http_client: httpx.AsyncClient = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=api_provider.max_connections,
+                max_keepalive_connections=api_provider.max_keepalive_connections,
+                keepalive_expiry=api_provider.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(api_provider.timeout, connect=api_provider.connect_timeout),
+            event_hooks={"request": [self._on_http_request]},
+        )
+        """长连接HTTP客户端，同一API提供商的所有请求共享其连接池"""
+
         self.client: AsyncOpenAI = AsyncOpenAI(
             base_url=api_provider.base_url,
             api_key=api_provider.api_key,
             max_retries=0,
             timeout=api_provider.timeout,
+            http_client=self.http_client,
         )
 
+    async def _on_http_request(self, request: httpx.Request):
+        """统计请求数，并通过httpcore的trace扩展统计新建连接数"""
+        self._request_count += 1
+        request.extensions["trace"] = self._trace_connection
+
+    async def _trace_connection(self, event_name: str, info: dict[str, Any]):
+        if event_name == "connection.connect_tcp.complete":
+            self._new_connection_count += 1
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+    def get_connection_stats(self) -> dict[str, float]:
+        # httpx未公开连接池状态，这里读取其内部的httpcore连接池，读取失败时按0处理
+        pool = getattr(getattr(self.http_client, "_transport", None), "_pool", None)
+        open_connections = len(getattr(pool, "connections", []) or [])
+        return {
+            "open_connections": open_connections,
+            "requests": self._request_count,
+            "new_connections": self._new_connection_count,
+        }
+
     async def get_response(
         self,
         model_info: ModelInfo,
@@ -409,11 +479,11 @@ class OpenaiClient(BaseClient):
         stream_response_handler: Optional[
             Callable[
                 [AsyncStream[ChatCompletionChunk], asyncio.Event | None],
-                Coroutine[Any, Any, tuple[APIResponse, Optional[tuple[int, int, int]]]],
+                Coroutine[Any, Any, tuple[APIResponse, Optional[tuple[int, int, int, int]]]],
             ]
         ] = None,
         async_response_parser: Optional[
-            Callable[[ChatCompletion], tuple[APIResponse, Optional[tuple[int, int, int]]]]
+            Callable[[ChatCompletion], tuple[APIResponse, Optional[tuple[int, int, int, int]]]]
         ] = None,
         interrupt_flag: asyncio.Event | None = None,
         extra_params: dict[str, Any] | None = None,
@@ -444,53 +514,37 @@ class OpenaiClient(BaseClient):
         # 将tool_options转换为OpenAI API所需的格式
         tools: Iterable[ChatCompletionToolParam] = _convert_tool_options(tool_options) if tool_options else NOT_GIVEN  # type: ignore
 
-        try:
-            if model_info.force_stream_mode:
-                req_task = asyncio.create_task(
-                    self.client.chat.completions.create(
-                        model=model_info.model_identifier,
-                        messages=messages,
-                        tools=tools,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        stream=True,
-                        response_format=NOT_GIVEN,
-                        extra_body=extra_params,
-                    )
-                )
-                while not req_task.done():
-                    if interrupt_flag and interrupt_flag.is_set():
-                        # 如果中断量存在且被设置，则取消任务并抛出异常
-                        req_task.cancel()
-                        raise ReqAbortException("请求被外部信号中断")
-                    await asyncio.sleep(0.1)  # 等待0.1秒后再次检查任务&中断信号量状态
-
-                resp, usage_record = await stream_response_handler(req_task.result(), interrupt_flag)
-            else:
-                # 发送请求并获取响应
-                # start_time = time.time()
-                req_task = asyncio.create_task(
-                    self.client.chat.completions.create(
-                        model=model_info.model_identifier,
-                        messages=messages,
-                        tools=tools,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        stream=False,
-                        response_format=NOT_GIVEN,
-                        extra_body=extra_params,
-                    )
-                )
-                while not req_task.done():
-                    if interrupt_flag and interrupt_flag.is_set():
-                        # 如果中断量存在且被设置，则取消任务并抛出异常
-                        req_task.cancel()
-                        raise ReqAbortException("请求被外部信号中断")
-                    await asyncio.sleep(0.1)  # 等待0.5秒后再次检查任务&中断信号量状态
+        async def _stream_request() -> tuple[APIResponse, Optional[tuple[int, int, int, int]]]:
+            resp_stream = await self.client.chat.completions.create(
+                model=model_info.model_identifier,
+                messages=messages,
+                tools=tools,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                response_format=NOT_GIVEN,
+                extra_body=extra_params,
+            )
+            return await stream_response_handler(resp_stream, interrupt_flag)
 
-                # logger.info(f"OpenAI请求时间: {model_info.model_identifier}  {time.time() - start_time} \n{messages}")
+        async def _normal_request() -> tuple[APIResponse, Optional[tuple[int, int, int, int]]]:
+            resp = await self.client.chat.completions.create(
+                model=model_info.model_identifier,
+                messages=messages,
+                tools=tools,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=False,
+                response_format=NOT_GIVEN,
+                extra_body=extra_params,
+            )
+            return async_response_parser(resp)
 
-                resp, usage_record = async_response_parser(req_task.result())
+        try:
+            # 中断信号量被设置时立即取消请求任务，而不是轮询检查
+            resp, usage_record = await await_interruptible(
+                _stream_request() if model_info.force_stream_mode else _normal_request(), interrupt_flag
+            )
         except APIConnectionError as e:
             # 重封装APIConnectionError为NetworkConnectionError
             raise NetworkConnectionError() from e
@@ -505,10 +559,101 @@ class OpenaiClient(BaseClient):
                 prompt_tokens=usage_record[0],
                 completion_tokens=usage_record[1],
                 total_tokens=usage_record[2],
+                cached_tokens=usage_record[3],
             )
 
         return resp
 
+    async def get_response_stream(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        extra_params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[StreamDelta]:
+        """
+        以流式方式获取对话响应
+        Args:
+            model_info: 模型信息
+            message_list: 对话体
+            tool_options: 工具选项（可选，默认为None）
+            max_tokens: 最大token数（可选，默认为1024）
+            temperature: 温度（可选，默认为0.7）
+        Returns:
+            流式响应增量的异步迭代器
+        """
+        messages: Iterable[ChatCompletionMessageParam] = _convert_messages(message_list)
+        tools: Iterable[ChatCompletionToolParam] = _convert_tool_options(tool_options) if tool_options else NOT_GIVEN  # type: ignore
+
+        resp_stream: AsyncStream[ChatCompletionChunk] | None = None
+        in_rc_flag = False  # 标记是否在<think>推理内容块中
+        has_content = False  # 标记是否已输出正式内容
+        try:
+            resp_stream = await self.client.chat.completions.create(
+                model=model_info.model_identifier,
+                messages=messages,
+                tools=tools,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                response_format=NOT_GIVEN,
+                extra_body=extra_params,
+            )
+            async for event in resp_stream:
+                if event.usage:
+                    yield StreamDelta(
+                        usage=UsageRecord(
+                            model_name=model_info.name,
+                            provider_name=model_info.api_provider,
+                            prompt_tokens=event.usage.prompt_tokens or 0,
+                            completion_tokens=event.usage.completion_tokens or 0,
+                            total_tokens=event.usage.total_tokens or 0,
+                            cached_tokens=_get_cached_tokens(event.usage),
+                        )
+                    )
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta
+
+                if hasattr(delta, "reasoning_content") and delta.reasoning_content:  # type: ignore
+                    yield StreamDelta(reasoning_content=delta.reasoning_content)  # type: ignore
+                elif delta.content:
+                    if in_rc_flag:
+                        if delta.content == "</think>":
+                            in_rc_flag = False
+                        else:
+                            yield StreamDelta(reasoning_content=delta.content)
+                    elif delta.content == "<think>" and not has_content:
+                        # <think>为输出的首个token，进入推理内容块
+                        in_rc_flag = True
+                    else:
+                        has_content = True
+                        yield StreamDelta(content=delta.content)
+
+                for tool_call_delta in delta.tool_calls or []:
+                    function = tool_call_delta.function
+                    yield StreamDelta(
+                        tool_call_fragment=(
+                            tool_call_delta.index,
+                            tool_call_delta.id,
+                            function.name if function else None,
+                            (function.arguments if function else None) or "",
+                        )
+                    )
+        except APIConnectionError as e:
+            # 重封装APIConnectionError为NetworkConnectionError
+            raise NetworkConnectionError() from e
+        except APIStatusError as e:
+            # 重封装APIError为RespNotOkException
+            raise RespNotOkException(e.status_code, e.message) from e
+        finally:
+            if resp_stream is not None:
+                # 及时关闭HTTP流，释放连接
+                await resp_stream.close()
+
     async def get_embedding(
         self,
         model_info: ModelInfo,
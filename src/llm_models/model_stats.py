@@ -0,0 +1,179 @@
+import random
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.common.logger import get_logger
+
+logger = get_logger("model_stats")
+
+EWMA_ALPHA = 0.2
+"""指数加权移动平均的平滑系数（越大越偏重最近的样本）"""
+
+LATENCY_WINDOW_SIZE = 100
+"""每个模型保留的最近延迟样本数（用于计算分位数）"""
+
+
+@dataclass
+class ModelStats:
+    """单个模型的运行统计"""
+
+    ewma_ttft: Optional[float] = None
+    """首token延迟的EWMA（单位：秒）"""
+
+    ewma_latency: Optional[float] = None
+    """总延迟的EWMA（单位：秒）"""
+
+    ewma_error_rate: float = 0.0
+    """错误率的EWMA"""
+
+    in_flight: int = 0
+    """正在进行的请求数"""
+
+    total_requests: int = 0
+    """请求总数"""
+
+    total_errors: int = 0
+    """失败总数"""
+
+    recent_latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW_SIZE))
+    """最近的总延迟样本"""
+
+    recent_ttfts: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW_SIZE))
+    """最近的首token延迟样本"""
+
+    last_update: float = 0.0
+    """最后更新时间"""
+
+
+def _ewma(old: Optional[float], sample: float) -> float:
+    return sample if old is None else old + EWMA_ALPHA * (sample - old)
+
+
+def _percentile(samples: deque, percentile: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(percentile / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class ModelStatsTracker:
+    """
+    模型运行统计
+
+    记录每个模型的延迟与错误率（所有LLMRequest实例共享），供模型选择策略使用
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, ModelStats] = {}
+
+    def get(self, model_name: str) -> ModelStats:
+        if model_name not in self._stats:
+            self._stats[model_name] = ModelStats()
+        return self._stats[model_name]
+
+    def on_request_start(self, model_name: str):
+        """记录请求开始"""
+        self.get(model_name).in_flight += 1
+
+    def on_request_success(self, model_name: str, latency: float, ttft: Optional[float] = None):
+        """
+        记录请求成功
+        :param model_name: 模型名称
+        :param latency: 总延迟（单位：秒）
+        :param ttft: 首token延迟（单位：秒，非流式请求可不提供，此时以总延迟代替）
+        """
+        stats = self.get(model_name)
+        stats.in_flight = max(0, stats.in_flight - 1)
+        stats.total_requests += 1
+        stats.ewma_latency = _ewma(stats.ewma_latency, latency)
+        stats.ewma_ttft = _ewma(stats.ewma_ttft, latency if ttft is None else ttft)
+        stats.ewma_error_rate = _ewma(stats.ewma_error_rate, 0.0)
+        stats.recent_latencies.append(latency)
+        stats.recent_ttfts.append(latency if ttft is None else ttft)
+        stats.last_update = time.time()
+
+    def on_request_cancelled(self, model_name: str):
+        """记录请求被取消（不计入成功或失败）"""
+        stats = self.get(model_name)
+        stats.in_flight = max(0, stats.in_flight - 1)
+
+    def on_request_failure(self, model_name: str, latency: Optional[float] = None):
+        """
+        记录请求失败
+        :param model_name: 模型名称
+        :param latency: 失败前经过的时间（单位：秒，可选）
+        """
+        stats = self.get(model_name)
+        stats.in_flight = max(0, stats.in_flight - 1)
+        stats.total_requests += 1
+        stats.total_errors += 1
+        stats.ewma_error_rate = _ewma(stats.ewma_error_rate, 1.0)
+        if latency is not None and stats.ewma_latency is not None:
+            # 失败的请求只会拉高延迟估计，不会拉低
+            stats.ewma_latency = max(stats.ewma_latency, _ewma(stats.ewma_latency, latency))
+        stats.last_update = time.time()
+
+    def get_latency_percentile(self, model_name: str, percentile: float, first_token: bool = False) -> Optional[float]:
+        """
+        获取模型最近延迟的分位数
+        :param model_name: 模型名称
+        :param percentile: 分位数（0-100）
+        :param first_token: 是否使用首token延迟
+        :return: 分位延迟（单位：秒），无样本时为None
+        """
+        stats = self.get(model_name)
+        return _percentile(stats.recent_ttfts if first_token else stats.recent_latencies, percentile)
+
+    def score(self, model_name: str) -> float:
+        """
+        计算模型的预期代价（越小越好）：EWMA延迟按排队请求数放大，并按错误率惩罚；无样本的模型代价为0，优先探测
+        """
+        stats = self.get(model_name)
+        if stats.ewma_latency is None:
+            return 0.0
+        return stats.ewma_latency * (1 + stats.in_flight) / max(0.05, 1.0 - stats.ewma_error_rate)
+
+    def choose(self, model_names: List[str], policy: str) -> str:
+        """
+        按策略从候选模型中选择一个
+        :param model_names: 候选模型名称列表
+        :param policy: 选择策略（least_latency/p2c/weighted）
+        :return: 选中的模型名称
+        """
+        if len(model_names) == 1:
+            return model_names[0]
+        if policy == "least_latency":
+            return min(model_names, key=self.score)
+        if policy == "p2c":
+            # Power of two choices：随机取两个，选择代价较小者
+            first, second = random.sample(model_names, 2)
+            return first if self.score(first) <= self.score(second) else second
+        if policy == "weighted":
+            scores = [self.score(name) for name in model_names]
+            if any(score == 0.0 for score in scores):
+                # 存在尚未探测的模型，优先探测
+                return random.choice([name for name, score in zip(model_names, scores, strict=True) if score == 0.0])
+            return random.choices(model_names, weights=[1.0 / score for score in scores])[0]
+        raise ValueError(f"未知的模型选择策略: {policy}")
+
+    def get_summary(self) -> Dict[str, Dict[str, float]]:
+        """获取所有模型的统计摘要"""
+        return {
+            name: {
+                "ewma_ttft": stats.ewma_ttft or 0.0,
+                "ewma_latency": stats.ewma_latency or 0.0,
+                "ewma_error_rate": stats.ewma_error_rate,
+                "in_flight": stats.in_flight,
+                "total_requests": stats.total_requests,
+                "total_errors": stats.total_errors,
+            }
+            for name, stats in self._stats.items()
+        }
+
+
+model_stats = ModelStatsTracker()
+"""全局模型运行统计，所有LLMRequest实例共享"""
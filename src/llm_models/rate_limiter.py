@@ -0,0 +1,180 @@
+import asyncio
+import time
+import weakref
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from src.common.logger import get_logger
+from src.config.api_ada_configs import APIProvider
+
+logger = get_logger("rate_limiter")
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    以每分钟容量为上限、按时间匀速补充令牌；允许余额为负（按实际用量事后扣减），欠下的额度会让后续请求等待
+    """
+
+    def __init__(self, capacity_per_minute: int):
+        self.capacity: float = float(capacity_per_minute)
+        """桶容量（每分钟额度）"""
+
+        self.refill_rate: float = capacity_per_minute / 60.0
+        """每秒补充的令牌数"""
+
+        self.tokens: float = self.capacity
+        """当前令牌余额"""
+
+        self._last_refill: float = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.refill_rate)
+        self._last_refill = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        获取令牌足够前需要等待的时间
+        :param amount: 需要的令牌数（超过桶容量时按桶容量计算，避免永远无法满足）
+        :return: 需要等待的秒数（0表示无需等待）
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def consume(self, amount: float):
+        """扣减令牌（允许余额为负）"""
+        self._refill()
+        self.tokens -= amount
+
+
+class ProviderAdmissionController:
+    """
+    API提供商准入控制器
+
+    限制单个API提供商的最大并发请求数，并以RPM/TPM令牌桶平滑请求速率；超出限制的请求按到达顺序排队等待，而不是直接失败
+    """
+
+    def __init__(self, api_provider: APIProvider):
+        self.provider_name: str = api_provider.name
+
+        self._semaphore: Optional[asyncio.Semaphore] = (
+            asyncio.Semaphore(api_provider.max_concurrency) if api_provider.max_concurrency > 0 else None
+        )
+        """并发限制信号量"""
+
+        self._rpm_bucket: Optional[TokenBucket] = TokenBucket(api_provider.rpm) if api_provider.rpm > 0 else None
+        """每分钟请求数令牌桶"""
+
+        self._tpm_bucket: Optional[TokenBucket] = TokenBucket(api_provider.tpm) if api_provider.tpm > 0 else None
+        """每分钟token数令牌桶"""
+
+        self._rate_lock = asyncio.Lock()
+        """速率等待锁，保证排队请求按到达顺序获得额度"""
+
+        self.waiting: int = 0
+        """正在排队等待的请求数"""
+
+        self.running: int = 0
+        """正在执行的请求数"""
+
+    @property
+    def enabled(self) -> bool:
+        return self._semaphore is not None or self._rpm_bucket is not None or self._tpm_bucket is not None
+
+    @asynccontextmanager
+    async def acquire(self, estimated_tokens: int = 0) -> AsyncIterator["ProviderAdmissionController"]:
+        """
+        获取一次请求的准入许可
+        :param estimated_tokens: 估算的请求token数（用于TPM限制）
+        """
+        if not self.enabled:
+            yield self
+            return
+
+        self.waiting += 1
+        wait_start = time.monotonic()
+        acquired = False
+        try:
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+                acquired = True
+            if self._rpm_bucket is not None or self._tpm_bucket is not None:
+                async with self._rate_lock:
+                    await self._wait_for_rate(estimated_tokens)
+        except BaseException:
+            if acquired:
+                self._semaphore.release()  # type: ignore
+            raise
+        finally:
+            self.waiting -= 1
+
+        if (waited := time.monotonic() - wait_start) > 1:
+            logger.info(f"API提供商 '{self.provider_name}' 请求排队 {waited:.2f} 秒")
+
+        self.running += 1
+        try:
+            yield self
+        finally:
+            self.running -= 1
+            if acquired:
+                self._semaphore.release()  # type: ignore
+
+    async def _wait_for_rate(self, estimated_tokens: int):
+        """等待RPM/TPM额度充足后扣减额度"""
+        while True:
+            wait_time = max(
+                self._rpm_bucket.wait_time(1) if self._rpm_bucket else 0.0,
+                self._tpm_bucket.wait_time(estimated_tokens) if self._tpm_bucket else 0.0,
+            )
+            if wait_time <= 0:
+                break
+            await asyncio.sleep(wait_time)
+        if self._rpm_bucket:
+            self._rpm_bucket.consume(1)
+        if self._tpm_bucket:
+            self._tpm_bucket.consume(estimated_tokens)
+
+    def adjust_tokens(self, actual_tokens: int, estimated_tokens: int):
+        """
+        根据实际用量修正TPM额度（实际用量大于估算时追加扣减，小于时返还）
+        :param actual_tokens: 实际使用的token数
+        :param estimated_tokens: 请求前估算的token数
+        """
+        if self._tpm_bucket:
+            self._tpm_bucket.consume(actual_tokens - estimated_tokens)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取当前排队与执行中的请求数"""
+        return {"waiting": self.waiting, "running": self.running}
+
+
+class AdmissionRegistry:
+    """准入控制器注册表，每个API提供商（在每个事件循环中）共享一个控制器"""
+
+    def __init__(self):
+        # 事件循环关闭并被回收后，其控制器随之移除
+        self._controllers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, ProviderAdmissionController]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get_controller(self, api_provider: APIProvider) -> ProviderAdmissionController:
+        """
+        获取API提供商对应的准入控制器
+        :param api_provider: API提供商
+        :return: 准入控制器
+        """
+        # asyncio原语绑定事件循环，不同事件循环（如嵌入任务使用的线程内事件循环）需要各自的控制器
+        controllers = self._controllers.setdefault(asyncio.get_running_loop(), {})
+        if api_provider.name not in controllers:
+            controllers[api_provider.name] = ProviderAdmissionController(api_provider)
+        return controllers[api_provider.name]
+
+
+admission_registry = AdmissionRegistry()
+"""全局准入控制器注册表"""
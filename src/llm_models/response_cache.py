@@ -0,0 +1,216 @@
+import json
+import time
+
+from typing import Optional, Dict, List
+
+from src.common.logger import get_logger
+from src.common.database.database_model import LLMResponseCache
+from src.common.database.db_executor import db_executor
+from .model_client.base_client import APIResponse, UsageRecord
+from .payload_content.tool_option import ToolCall
+
+logger = get_logger("response_cache")
+
+CLEANUP_INTERVAL_WRITES = 100
+"""每写入多少条缓存执行一次过期清理与容量检查"""
+
+
+class ResponseCacheManager:
+    """
+    LLM响应持久化缓存
+
+    以(模型标识符, 请求指纹)为键，将确定性任务的响应结果缓存到SQLite中
+    """
+
+    def __init__(self):
+        self.hits: int = 0
+        """缓存命中次数"""
+
+        self.misses: int = 0
+        """缓存未命中次数"""
+
+        self.saved_tokens: int = 0
+        """命中缓存节省的token数"""
+
+        self._writes_since_cleanup: int = 0
+
+    @staticmethod
+    def _find(model_identifiers: List[str], prompt_hash: str) -> Optional[LLMResponseCache]:
+        """查找未过期的缓存条目（同步，查询失败时视为未命中）"""
+        try:
+            return (
+                LLMResponseCache.select()
+                .where(
+                    (LLMResponseCache.prompt_hash == prompt_hash)
+                    & (LLMResponseCache.model_identifier.in_(model_identifiers))
+                    & (LLMResponseCache.expire_time > time.time())
+                )
+                .order_by(LLMResponseCache.created_time.desc())
+                .first()
+            )
+        except Exception as e:
+            logger.error(f"查询LLM响应缓存失败: {e}")
+            return None
+
+    @staticmethod
+    def _record_hit(record_id: int) -> None:
+        """增加缓存条目的命中次数（同步）"""
+        try:
+            LLMResponseCache.update(hit_count=LLMResponseCache.hit_count + 1).where(
+                LLMResponseCache.id == record_id
+            ).execute()
+        except Exception as e:
+            logger.warning(f"更新LLM响应缓存命中次数失败: {e}")
+
+    def _to_response(self, record: LLMResponseCache, prompt_hash: str) -> tuple[APIResponse, str]:
+        """将命中的缓存条目转换为响应，并记录命中统计"""
+        tool_calls = None
+        if record.tool_calls:
+            tool_calls = [
+                ToolCall(call["call_id"], call["func_name"], call["args"]) for call in json.loads(record.tool_calls)
+            ]
+
+        self.hits += 1
+        self.saved_tokens += (record.prompt_tokens or 0) + (record.completion_tokens or 0)
+        logger.debug(f"LLM响应缓存命中: {record.model_identifier} {prompt_hash[:8]}")
+        return (
+            APIResponse(
+                content=record.content,
+                reasoning_content=record.reasoning_content,
+                tool_calls=tool_calls,
+            ),
+            record.model_identifier,
+        )
+
+    def get(self, model_identifiers: List[str], prompt_hash: str) -> Optional[tuple[APIResponse, str]]:
+        """
+        查询缓存（同步，会阻塞当前线程；在事件循环中请使用 get_async）
+        Args:
+            model_identifiers (List[str]): 可接受的模型标识符列表
+            prompt_hash (str): 请求指纹
+        Returns:
+            (Optional[tuple[APIResponse, str]]): (缓存的响应, 产生该响应的模型标识符)，未命中时为None
+        """
+        if (record := self._find(model_identifiers, prompt_hash)) is None:
+            self.misses += 1
+            return None
+        self._record_hit(record.id)
+        return self._to_response(record, prompt_hash)
+
+    async def get_async(self, model_identifiers: List[str], prompt_hash: str) -> Optional[tuple[APIResponse, str]]:
+        """
+        查询缓存（查询在数据库读线程、命中次数更新在写线程中执行，不阻塞事件循环），参数与返回值同 get
+        """
+        if (record := await db_executor.run_read(self._find, model_identifiers, prompt_hash)) is None:
+            self.misses += 1
+            return None
+        await db_executor.run_write(self._record_hit, record.id)
+        return self._to_response(record, prompt_hash)
+
+    def put(
+        self,
+        model_identifier: str,
+        prompt_hash: str,
+        request_type: str,
+        response: APIResponse,
+        ttl: int,
+        max_entries: int,
+    ) -> None:
+        """
+        写入缓存（同步，会阻塞当前线程；在事件循环中请使用 put_async）
+        Args:
+            model_identifier (str): 模型标识符
+            prompt_hash (str): 请求指纹
+            request_type (str): 请求类型
+            response (APIResponse): 响应
+            ttl (int): 缓存有效期（单位：秒）
+            max_entries (int): 同一请求类型的最大缓存条数
+        """
+        if not response.content and not response.tool_calls:
+            # 不缓存空响应
+            return
+
+        usage: UsageRecord | None = response.usage
+        tool_calls = None
+        if response.tool_calls:
+            tool_calls = json.dumps(
+                [
+                    {"call_id": call.call_id, "func_name": call.func_name, "args": call.args}
+                    for call in response.tool_calls
+                ],
+                ensure_ascii=False,
+            )
+        now = time.time()
+        try:
+            LLMResponseCache.replace(
+                model_identifier=model_identifier,
+                prompt_hash=prompt_hash,
+                request_type=request_type,
+                content=response.content or "",
+                reasoning_content=response.reasoning_content,
+                tool_calls=tool_calls,
+                prompt_tokens=usage.prompt_tokens if usage else 0,
+                completion_tokens=usage.completion_tokens if usage else 0,
+                hit_count=0,
+                created_time=now,
+                expire_time=now + ttl,
+            ).execute()
+        except Exception as e:
+            logger.error(f"写入LLM响应缓存失败: {e}")
+            return
+
+        self._writes_since_cleanup += 1
+        if self._writes_since_cleanup >= CLEANUP_INTERVAL_WRITES:
+            self._writes_since_cleanup = 0
+            self.cleanup(request_type, max_entries)
+
+    async def put_async(
+        self,
+        model_identifier: str,
+        prompt_hash: str,
+        request_type: str,
+        response: APIResponse,
+        ttl: int,
+        max_entries: int,
+    ) -> None:
+        """写入缓存（写入与定期清理在数据库写线程中执行，不阻塞事件循环），参数同 put"""
+        await db_executor.run_write(
+            self.put, model_identifier, prompt_hash, request_type, response, ttl, max_entries
+        )
+
+    def cleanup(self, request_type: str, max_entries: int) -> None:
+        """
+        清理过期缓存，并将指定请求类型的缓存条数限制在上限以内（优先淘汰最早创建的条目）
+        Args:
+            request_type (str): 请求类型
+            max_entries (int): 最大缓存条数（小于等于0表示不限制）
+        """
+        try:
+            expired = LLMResponseCache.delete().where(LLMResponseCache.expire_time <= time.time()).execute()
+            overflow = 0
+            if max_entries > 0:
+                count = LLMResponseCache.select().where(LLMResponseCache.request_type == request_type).count()
+                if count > max_entries:
+                    oldest_ids = (
+                        LLMResponseCache.select(LLMResponseCache.id)
+                        .where(LLMResponseCache.request_type == request_type)
+                        .order_by(LLMResponseCache.created_time.asc())
+                        .limit(count - max_entries)
+                    )
+                    overflow = LLMResponseCache.delete().where(LLMResponseCache.id.in_(oldest_ids)).execute()
+            if expired or overflow:
+                logger.debug(f"清理LLM响应缓存: 过期 {expired} 条，超出容量 {overflow} 条")
+        except Exception as e:
+            logger.error(f"清理LLM响应缓存失败: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存统计信息"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_tokens": self.saved_tokens,
+        }
+
+
+response_cache = ResponseCacheManager()
+"""全局LLM响应缓存"""
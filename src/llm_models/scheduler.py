@@ -0,0 +1,277 @@
+import asyncio
+import time
+import weakref
+
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from src.common.logger import get_logger
+from src.config.config import model_config
+from src.config.api_ada_configs import SchedulerConfig
+from src.manager.async_task_manager import AsyncTask
+
+logger = get_logger("llm_scheduler")
+
+PRIORITY_INTERACTIVE = "interactive"
+"""交互类请求：直接产生回复或处于回复关键路径上的请求"""
+
+PRIORITY_PLANNING = "planning"
+"""规划类请求：决定是否回复、执行什么动作的请求"""
+
+PRIORITY_BACKGROUND = "background"
+"""后台类请求：记忆构建、表达学习、情绪、关系等不影响回复时延的请求"""
+
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_PLANNING, PRIORITY_BACKGROUND)
+
+DEFAULT_REQUEST_PRIORITIES: Dict[str, str] = {
+    "replyer": PRIORITY_INTERACTIVE,
+    "s4u_replyer": PRIORITY_INTERACTIVE,
+    "generator_api": PRIORITY_INTERACTIVE,
+    "tool_executor": PRIORITY_INTERACTIVE,
+    "memory.activator": PRIORITY_INTERACTIVE,
+    "memory.selection": PRIORITY_INTERACTIVE,
+    "expression.selector": PRIORITY_INTERACTIVE,
+    "lpmm.qa": PRIORITY_INTERACTIVE,
+    "planner": PRIORITY_PLANNING,
+    "planner_small": PRIORITY_PLANNING,
+    "action.judge": PRIORITY_PLANNING,
+    "embedding": PRIORITY_PLANNING,
+    "image": PRIORITY_PLANNING,
+    "emoji": PRIORITY_PLANNING,
+    "audio": PRIORITY_PLANNING,
+    "plugin.generate": PRIORITY_PLANNING,
+}
+"""请求类型的默认优先级（未列出的请求类型均视为后台请求）"""
+
+QUEUE_DELAY_WINDOW_SIZE = 200
+"""每个优先级保留的最近排队延迟样本数"""
+
+SCHEDULER_STATS_INTERVAL = 300
+"""调度统计输出间隔（单位：秒）"""
+
+
+def resolve_priority(configured: str, request_type: str) -> str:
+    """
+    确定请求的优先级
+    :param configured: 任务配置中指定的优先级（为空时按请求类型推断）
+    :param request_type: 请求类型
+    :return: 优先级
+    """
+    if configured:
+        return configured
+    if request_type in DEFAULT_REQUEST_PRIORITIES:
+        return DEFAULT_REQUEST_PRIORITIES[request_type]
+    # 形如"replyer.xxx"的请求类型按前缀推断
+    return DEFAULT_REQUEST_PRIORITIES.get(request_type.split(".")[0], PRIORITY_BACKGROUND)
+
+
+@dataclass
+class PriorityClassState:
+    """单个优先级的调度状态"""
+
+    weight: int
+    """调度权重"""
+
+    max_concurrency: int
+    """最大并发数（0表示不单独限制）"""
+
+    waiters: Deque[asyncio.Future] = field(default_factory=deque)
+    """排队中的请求"""
+
+    running: int = 0
+    """正在执行的请求数"""
+
+    virtual_time: float = 0.0
+    """加权公平队列的虚拟时间（每调度一个请求增加1/权重）"""
+
+    dispatched: int = 0
+    """累计调度的请求数"""
+
+    total_wait: float = 0.0
+    """累计排队时间（单位：秒）"""
+
+    max_wait: float = 0.0
+    """最长排队时间（单位：秒）"""
+
+    recent_waits: Deque[float] = field(default_factory=lambda: deque(maxlen=QUEUE_DELAY_WINDOW_SIZE))
+    """最近的排队时间样本"""
+
+
+class RequestScheduler:
+    """
+    LLM请求调度器
+
+    所有LLM请求在发出前按优先级排队：总并发与各优先级的并发达到上限时，请求进入对应优先级的队列，
+    有空位时按加权公平队列（虚拟时间最小者优先）选择下一个优先级出队，保证后台请求不会饿死交互请求，也不会被完全饿死
+    """
+
+    def __init__(self, config: SchedulerConfig):
+        self.max_concurrency: int = config.max_concurrency
+        """总并发上限（0表示不限制）"""
+
+        self._classes: Dict[str, PriorityClassState] = {
+            PRIORITY_INTERACTIVE: PriorityClassState(
+                weight=max(1, config.interactive_weight), max_concurrency=config.interactive_max_concurrency
+            ),
+            PRIORITY_PLANNING: PriorityClassState(
+                weight=max(1, config.planning_weight), max_concurrency=config.planning_max_concurrency
+            ),
+            PRIORITY_BACKGROUND: PriorityClassState(
+                weight=max(1, config.background_weight), max_concurrency=config.background_max_concurrency
+            ),
+        }
+        self._running: int = 0
+
+    def _has_capacity(self, state: PriorityClassState) -> bool:
+        if self.max_concurrency > 0 and self._running >= self.max_concurrency:
+            return False
+        return state.max_concurrency <= 0 or state.running < state.max_concurrency
+
+    def _dispatch(self):
+        """在有空位时按虚拟时间从小到大唤醒排队的请求"""
+        while True:
+            candidates = [state for state in self._classes.values() if state.waiters and self._has_capacity(state)]
+            if not candidates:
+                return
+            state = min(candidates, key=lambda s: s.virtual_time)
+            waiter = state.waiters.popleft()
+            if waiter.done():
+                # 排队期间已被取消
+                continue
+            self._grant(state)
+            waiter.set_result(None)
+
+    def _grant(self, state: PriorityClassState):
+        self._running += 1
+        state.running += 1
+        state.virtual_time += 1.0 / state.weight
+
+    def _release(self, state: PriorityClassState):
+        self._running -= 1
+        state.running -= 1
+        self._dispatch()
+
+    def _record_wait(self, state: PriorityClassState, waited: float):
+        state.dispatched += 1
+        state.total_wait += waited
+        state.max_wait = max(state.max_wait, waited)
+        state.recent_waits.append(waited)
+
+    @asynccontextmanager
+    async def slot(self, priority: str) -> AsyncIterator[None]:
+        """
+        获取一个请求执行位
+        :param priority: 请求优先级（interactive/planning/background）
+        """
+        state = self._classes.get(priority) or self._classes[PRIORITY_BACKGROUND]
+        wait_start = time.monotonic()
+
+        if not state.waiters and self._has_capacity(state):
+            self._grant(state)
+        else:
+            if not state.waiters:
+                # 队列由空转为非空时，虚拟时间追上其他排队中的优先级，避免空闲期间积累的额度造成突发
+                backlogged = [s.virtual_time for s in self._classes.values() if s.waiters]
+                if backlogged:
+                    state.virtual_time = max(state.virtual_time, min(backlogged))
+            waiter = asyncio.get_running_loop().create_future()
+            state.waiters.append(waiter)
+            self._dispatch()
+            try:
+                await waiter
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    # 已获得执行位但在唤醒前被取消，归还执行位
+                    self._release(state)
+                else:
+                    waiter.cancel()
+                raise
+
+        waited = time.monotonic() - wait_start
+        self._record_wait(state, waited)
+        if waited > 1:
+            logger.debug(f"{priority}请求排队 {waited:.2f} 秒")
+
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """获取各优先级的排队与执行统计"""
+        stats = {}
+        for priority, state in self._classes.items():
+            recent = sorted(state.recent_waits)
+            stats[priority] = {
+                "waiting": len(state.waiters),
+                "running": state.running,
+                "dispatched": state.dispatched,
+                "avg_wait": state.total_wait / state.dispatched if state.dispatched else 0.0,
+                "p95_wait": recent[int(0.95 * (len(recent) - 1))] if recent else 0.0,
+                "max_wait": state.max_wait,
+            }
+        return stats
+
+
+class SchedulerRegistry:
+    """调度器注册表，每个事件循环共享一个调度器（asyncio原语绑定事件循环）"""
+
+    def __init__(self):
+        self._schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, RequestScheduler]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get_scheduler(self) -> RequestScheduler:
+        """获取当前事件循环的调度器"""
+        loop = asyncio.get_running_loop()
+        if loop not in self._schedulers:
+            self._schedulers[loop] = RequestScheduler(model_config.scheduler)
+        return self._schedulers[loop]
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """获取所有调度器按优先级合并后的统计"""
+        merged: Dict[str, Dict[str, float]] = {}
+        for scheduler in list(self._schedulers.values()):
+            for priority, stats in scheduler.get_stats().items():
+                if priority not in merged:
+                    merged[priority] = dict(stats)
+                    continue
+                target = merged[priority]
+                total = target["dispatched"] + stats["dispatched"]
+                if total:
+                    target["avg_wait"] = (
+                        target["avg_wait"] * target["dispatched"] + stats["avg_wait"] * stats["dispatched"]
+                    ) / total
+                for key in ("waiting", "running", "dispatched"):
+                    target[key] += stats[key]
+                for key in ("p95_wait", "max_wait"):
+                    target[key] = max(target[key], stats[key])
+        return merged
+
+
+scheduler_registry = SchedulerRegistry()
+"""全局LLM请求调度器注册表"""
+
+
+def format_scheduler_stats(stats: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+    """将调度统计格式化为单行文本"""
+    stats = stats if stats is not None else scheduler_registry.get_stats()
+    return "; ".join(
+        f"{priority}: 排队 {int(s['waiting'])} 执行 {int(s['running'])} 已调度 {int(s['dispatched'])} "
+        f"平均等待 {s['avg_wait']:.2f}s P95 {s['p95_wait']:.2f}s 最长 {s['max_wait']:.2f}s"
+        for priority, s in stats.items()
+    )
+
+
+class SchedulerStatsTask(AsyncTask):
+    """调度统计定时输出任务"""
+
+    def __init__(self):
+        super().__init__(task_name="LLM Scheduler Stats Task", run_interval=SCHEDULER_STATS_INTERVAL)
+
+    async def run(self):
+        stats = scheduler_registry.get_stats()
+        if any(s["dispatched"] for s in stats.values()):
+            logger.info(f"LLM请求调度状态: {format_scheduler_stats(stats)}")
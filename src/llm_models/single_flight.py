@@ -0,0 +1,89 @@
+import asyncio
+
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from src.common.logger import get_logger
+from .model_client.base_client import APIResponse
+
+logger = get_logger("single_flight")
+
+
+class SingleFlight:
+    """
+    相同请求合并器
+
+    并发发出的、内容完全相同的请求只会真正向上游发送一次，其余请求等待并共享该请求的结果
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Tuple[int, str], asyncio.Future] = {}
+        """(事件循环ID, 请求指纹) -> 正在进行的请求"""
+
+        self.total_calls: int = 0
+        """经过合并器的请求总数"""
+
+        self.saved_calls: int = 0
+        """被合并（未实际发出）的请求数"""
+
+        self.saved_tokens: int = 0
+        """被合并的请求节省的token数"""
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行请求，若存在相同的进行中请求则直接共享其结果
+        Args:
+            key (str): 请求指纹
+            func (Callable[[], Awaitable[Any]]): 实际发出请求的协程函数
+        Returns:
+            (Tuple[Any, bool]): (请求结果, 是否为共享的结果)
+        """
+        self.total_calls += 1
+        flight_key = (id(asyncio.get_running_loop()), key)
+
+        while leader := self._in_flight.get(flight_key):
+            try:
+                result = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    # 是当前协程自身被取消
+                    raise
+                # 发起请求的协程被取消，重新合并：最先恢复的等待者成为新的发起者，其余等待者继续共享它的结果
+                logger.debug("合并的请求已被取消，重新发起请求")
+                continue
+
+            self.saved_calls += 1
+            if isinstance(result, tuple) and result and isinstance(result[0], APIResponse) and result[0].usage:
+                self.saved_tokens += result[0].usage.total_tokens
+            logger.debug(f"合并相同请求，已累计节省 {self.saved_calls} 次请求，{self.saved_tokens} tokens")
+            return result, True
+
+        future = asyncio.get_running_loop().create_future()
+        # 避免无等待者时出现 "Future exception was never retrieved" 警告
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[flight_key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._in_flight.pop(flight_key, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取合并统计信息"""
+        return {
+            "total_calls": self.total_calls,
+            "saved_calls": self.saved_calls,
+            "saved_tokens": self.saved_tokens,
+            "in_flight": len(self._in_flight),
+        }
+
+
+single_flight = SingleFlight()
+"""全局相同请求合并器，所有LLMRequest实例共享"""
@@ -1,149 +1,365 @@
+import asyncio
 import base64
+import concurrent.futures
+import hashlib
 import io
+import json
+import threading
 
 from PIL import Image
+from collections import OrderedDict, deque
 from datetime import datetime
 
 from src.common.logger import get_logger
 from src.common.database.database import db  # 确保 db 被导入用于 create_tables
 from src.common.database.database_model import LLMUsage
+from src.common.database.db_executor import db_executor
 from src.config.api_ada_configs import ModelInfo
+from src.manager.async_task_manager import AsyncTask
 from .payload_content.message import Message, MessageBuilder
+from .payload_content.tool_option import ToolOption
 from .model_client.base_client import UsageRecord
 
 logger = get_logger("消息压缩工具")
 
+USAGE_FLUSH_BATCH_SIZE = 100
+"""使用记录批量写入的批次大小（队列达到该长度时立即触发写入）"""
 
-def compress_messages(messages: list[Message], img_target_size: int = 1 * 1024 * 1024) -> list[Message]:
+USAGE_FLUSH_INTERVAL = 5
+"""使用记录定时写入的间隔（单位：秒）"""
+
+USAGE_QUEUE_MAX_SIZE = 10000
+"""使用记录队列的最大长度，超出时丢弃最早的记录"""
+
+IMAGE_TOKEN_ESTIMATE = 1000
+"""估算token数时每张图片计入的token数"""
+
+IMAGE_COMPRESS_WORKERS = 2
+"""图片压缩线程数"""
+
+COMPRESSED_IMAGE_CACHE_SIZE = 64
+"""压缩后图片的最大缓存数量"""
+
+
+def _reformat_static_image(image_data: bytes) -> bytes:
     """
-    压缩消息列表中的图片
-    :param messages: 消息列表
-    :param img_target_size: 图片目标大小，默认1MB
-    :return: 压缩后的消息列表
+    将静态图片转换为JPEG格式
+    :param image_data: 图片数据
+    :return: 转换后的图片数据
     """
+    try:
+        image = Image.open(io.BytesIO(image_data))
 
-    def reformat_static_image(image_data: bytes) -> bytes:
-        """
-        将静态图片转换为JPEG格式
-        :param image_data: 图片数据
-        :return: 转换后的图片数据
-        """
-        try:
-            image = Image.open(image_data)
+        if image.format and (image.format.upper() in ["JPEG", "JPG", "PNG", "WEBP"]):
+            # 静态图像，转换为JPEG格式
+            reformated_image_data = io.BytesIO()
+            image.convert("RGB").save(reformated_image_data, format="JPEG", quality=95, optimize=True)
+            image_data = reformated_image_data.getvalue()
 
-            if image.format and (image.format.upper() in ["JPEG", "JPG", "PNG", "WEBP"]):
-                # 静态图像，转换为JPEG格式
-                reformated_image_data = io.BytesIO()
-                image.save(reformated_image_data, format="JPEG", quality=95, optimize=True)
-                image_data = reformated_image_data.getvalue()
+        return image_data
+    except Exception as e:
+        logger.error(f"图片转换格式失败: {str(e)}")
+        return image_data
 
-            return image_data
-        except Exception as e:
-            logger.error(f"图片转换格式失败: {str(e)}")
-            return image_data
 
-    def rescale_image(image_data: bytes, scale: float) -> tuple[bytes, tuple[int, int] | None, tuple[int, int] | None]:
+def _rescale_image(image_data: bytes, scale: float) -> tuple[bytes, tuple[int, int] | None, tuple[int, int] | None]:
+    """
+    缩放图片
+    :param image_data: 图片数据
+    :param scale: 缩放比例
+    :return: 缩放后的图片数据
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+
+        # 原始尺寸
+        original_size = (image.width, image.height)
+
+        # 计算新的尺寸
+        new_size = (int(original_size[0] * scale), int(original_size[1] * scale))
+
+        output_buffer = io.BytesIO()
+
+        if getattr(image, "is_animated", False):
+            # 动态图片，处理所有帧
+            frames = []
+            new_size = (new_size[0] // 2, new_size[1] // 2)  # 动图，缩放尺寸再打折
+            for frame_idx in range(getattr(image, "n_frames", 1)):
+                image.seek(frame_idx)
+                new_frame = image.copy()
+                new_frame = new_frame.resize(new_size, Image.Resampling.LANCZOS)
+                frames.append(new_frame)
+
+            # 保存到缓冲区
+            frames[0].save(
+                output_buffer,
+                format="GIF",
+                save_all=True,
+                append_images=frames[1:],
+                optimize=True,
+                duration=image.info.get("duration", 100),
+                loop=image.info.get("loop", 0),
+            )
+        else:
+            # 静态图片，直接缩放保存
+            resized_image = image.convert("RGB").resize(new_size, Image.Resampling.LANCZOS)
+            resized_image.save(output_buffer, format="JPEG", quality=95, optimize=True)
+
+        return output_buffer.getvalue(), original_size, new_size
+
+    except Exception as e:
+        logger.error(f"图片缩放失败: {str(e)}")
+        import traceback
+
+        logger.error(traceback.format_exc())
+        return image_data, None, None
+
+
+def _compress_base64_image(base64_data: str, target_size: int = 1 * 1024 * 1024) -> str:
+    """
+    压缩单张base64编码的图片（CPU密集，应在工作线程中执行）
+    :param base64_data: 图片的base64编码
+    :param target_size: 编码后的目标大小
+    :return: 压缩后图片的base64编码
+    """
+    original_b64_data_size = len(base64_data)  # 计算原始数据大小
+
+    image_data = base64.b64decode(base64_data)
+
+    # 先尝试转换格式为JPEG
+    image_data = _reformat_static_image(image_data)
+    base64_data = base64.b64encode(image_data).decode("utf-8")
+    if len(base64_data) <= target_size:
+        # 如果转换后小于目标大小，直接返回
+        logger.info(f"成功将图片转为JPEG格式，编码后大小: {len(base64_data) / 1024:.1f}KB")
+        return base64_data
+
+    # 如果转换后仍然大于目标大小，进行尺寸压缩
+    scale = min(1.0, target_size / len(base64_data))
+    image_data, original_size, new_size = _rescale_image(image_data, scale)
+    base64_data = base64.b64encode(image_data).decode("utf-8")
+
+    if original_size and new_size:
+        logger.info(
+            f"压缩图片: {original_size[0]}x{original_size[1]} -> {new_size[0]}x{new_size[1]}\n"
+            f"压缩前大小: {original_b64_data_size / 1024:.1f}KB, 压缩后大小: {len(base64_data) / 1024:.1f}KB"
+        )
+
+    return base64_data
+
+
+class CompressedImageCache:
+    """
+    图片压缩缓存
+
+    在独立的线程池中压缩图片，避免解码与缩放大图（尤其是多帧GIF）阻塞事件循环；
+    压缩结果以(原图哈希, 目标大小)为键缓存，重试与不同任务重复使用同一张图片时不再重复压缩，同一图片的并发压缩请求只执行一次
+    """
+
+    def __init__(self, max_entries: int = COMPRESSED_IMAGE_CACHE_SIZE, max_workers: int = IMAGE_COMPRESS_WORKERS):
+        self._max_entries = max_entries
+        self._max_workers = max_workers
+        self._entries: OrderedDict[tuple[str, int], str] = OrderedDict()
+        self._pending: dict[tuple[str, int], concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+
+        self.hits: int = 0
+        """缓存命中（含合并到进行中的压缩）次数"""
+
+        self.misses: int = 0
+        """实际执行压缩的次数"""
+
+    def submit(self, base64_data: str, target_size: int) -> concurrent.futures.Future:
         """
-        缩放图片
-        :param image_data: 图片数据
-        :param scale: 缩放比例
-        :return: 缩放后的图片数据
+        提交一张图片的压缩任务
+        :param base64_data: 图片的base64编码
+        :param target_size: 编码后的目标大小
+        :return: 结果为压缩后base64编码的Future（命中缓存时已完成）
         """
-        try:
-            image = Image.open(image_data)
-
-            # 原始尺寸
-            original_size = (image.width, image.height)
-
-            # 计算新的尺寸
-            new_size = (int(original_size[0] * scale), int(original_size[1] * scale))
-
-            output_buffer = io.BytesIO()
-
-            if getattr(image, "is_animated", False):
-                # 动态图片，处理所有帧
-                frames = []
-                new_size = (new_size[0] // 2, new_size[1] // 2)  # 动图，缩放尺寸再打折
-                for frame_idx in range(getattr(image, "n_frames", 1)):
-                    image.seek(frame_idx)
-                    new_frame = image.copy()
-                    new_frame = new_frame.resize(new_size, Image.Resampling.LANCZOS)
-                    frames.append(new_frame)
-
-                # 保存到缓冲区
-                frames[0].save(
-                    output_buffer,
-                    format="GIF",
-                    save_all=True,
-                    append_images=frames[1:],
-                    optimize=True,
-                    duration=image.info.get("duration", 100),
-                    loop=image.info.get("loop", 0),
+        key = (hashlib.sha256(base64_data.encode("utf-8")).hexdigest(), target_size)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                future: concurrent.futures.Future = concurrent.futures.Future()
+                future.set_result(self._entries[key])
+                return future
+            if key in self._pending:
+                self.hits += 1
+                return self._pending[key]
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="image_compress"
                 )
-            else:
-                # 静态图片，直接缩放保存
-                resized_image = image.resize(new_size, Image.Resampling.LANCZOS)
-                resized_image.save(output_buffer, format="JPEG", quality=95, optimize=True)
+            self.misses += 1
+            future = self._executor.submit(_compress_base64_image, base64_data, target_size)
+            self._pending[key] = future
+        future.add_done_callback(lambda f: self._on_done(key, f))
+        return future
 
-            return output_buffer.getvalue(), original_size, new_size
+    def _on_done(self, key: tuple[str, int], future: concurrent.futures.Future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._entries[key] = future.result()
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
 
-        except Exception as e:
-            logger.error(f"图片缩放失败: {str(e)}")
-            import traceback
-
-            logger.error(traceback.format_exc())
-            return image_data, None, None
-
-    def compress_base64_image(base64_data: str, target_size: int = 1 * 1024 * 1024) -> str:
-        original_b64_data_size = len(base64_data)  # 计算原始数据大小
-
-        image_data = base64.b64decode(base64_data)
-
-        # 先尝试转换格式为JPEG
-        image_data = reformat_static_image(image_data)
-        base64_data = base64.b64encode(image_data).decode("utf-8")
-        if len(base64_data) <= target_size:
-            # 如果转换后小于目标大小，直接返回
-            logger.info(f"成功将图片转为JPEG格式，编码后大小: {len(base64_data) / 1024:.1f}KB")
-            return base64_data
-
-        # 如果转换后仍然大于目标大小，进行尺寸压缩
-        scale = min(1.0, target_size / len(base64_data))
-        image_data, original_size, new_size = rescale_image(image_data, scale)
-        base64_data = base64.b64encode(image_data).decode("utf-8")
-
-        if original_size and new_size:
-            logger.info(
-                f"压缩图片: {original_size[0]}x{original_size[1]} -> {new_size[0]}x{new_size[1]}\n"
-                f"压缩前大小: {original_b64_data_size / 1024:.1f}KB, 压缩后大小: {len(base64_data) / 1024:.1f}KB"
-            )
+    def get_stats(self) -> dict[str, int]:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
 
-        return base64_data
 
+compressed_image_cache = CompressedImageCache()
+"""全局图片压缩缓存"""
+
+
+def _rebuild_messages(messages: list[Message], compressed_images: list[str]) -> list[Message]:
+    """按顺序将压缩后的图片替换回消息列表"""
+    images = iter(compressed_images)
     compressed_messages = []
     for message in messages:
         if isinstance(message.content, list):
-            # 检查content，如有图片则压缩
             message_builder = MessageBuilder()
             for content_item in message.content:
                 if isinstance(content_item, tuple):
-                    # 图片，进行压缩
-                    message_builder.add_image_content(
-                        content_item[0],
-                        compress_base64_image(content_item[1], target_size=img_target_size),
-                    )
+                    message_builder.add_image_content(content_item[0], next(images))
                 else:
                     message_builder.add_text_content(content_item)
             compressed_messages.append(message_builder.build())
         else:
             compressed_messages.append(message)
-
     return compressed_messages
 
 
+def _submit_images(messages: list[Message], img_target_size: int) -> list[concurrent.futures.Future]:
+    return [
+        compressed_image_cache.submit(content_item[1], img_target_size)
+        for message in messages
+        if isinstance(message.content, list)
+        for content_item in message.content
+        if isinstance(content_item, tuple)
+    ]
+
+
+def compress_messages(messages: list[Message], img_target_size: int = 1 * 1024 * 1024) -> list[Message]:
+    """
+    压缩消息列表中的图片（同步版本，会阻塞调用线程直至压缩完成；在事件循环中请使用compress_messages_async）
+    :param messages: 消息列表
+    :param img_target_size: 图片目标大小，默认1MB
+    :return: 压缩后的消息列表
+    """
+    futures = _submit_images(messages, img_target_size)
+    return _rebuild_messages(messages, [future.result() for future in futures])
+
+
+async def compress_messages_async(messages: list[Message], img_target_size: int = 1 * 1024 * 1024) -> list[Message]:
+    """
+    压缩消息列表中的图片（在线程池中执行，不阻塞事件循环）
+    :param messages: 消息列表
+    :param img_target_size: 图片目标大小，默认1MB
+    :return: 压缩后的消息列表
+    """
+    futures = _submit_images(messages, img_target_size)
+    compressed_images = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+    return _rebuild_messages(messages, list(compressed_images))
+
+
+def estimate_text_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数（中日韩字符按每字1个token计，其余字符按每4个字符1个token计）
+    :param text: 文本
+    :return: 估算的token数
+    """
+    cjk_count = sum(1 for char in text if "\u2e80" <= char <= "\u9fff" or "\uac00" <= char <= "\ud7af")
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+def estimate_message_tokens(messages: list[Message]) -> int:
+    """
+    粗略估算消息列表的输入token数
+    :param messages: 消息列表
+    :return: 估算的token数
+    """
+    total = 0
+    for message in messages:
+        total += 4  # 每条消息的角色等格式开销
+        if isinstance(message.content, str):
+            total += estimate_text_tokens(message.content)
+            continue
+        for item in message.content:
+            if isinstance(item, tuple):
+                total += IMAGE_TOKEN_ESTIMATE
+            else:
+                total += estimate_text_tokens(item)
+    return total
+
+
+def build_request_fingerprint(
+    model_names: list[str],
+    messages: list[Message],
+    temperature: float | None,
+    max_tokens: int | None,
+    tool_options: list[ToolOption] | None = None,
+) -> str:
+    """
+    计算请求指纹，用于识别内容完全相同的请求
+    :param model_names: 模型名称列表
+    :param messages: 消息列表
+    :param temperature: 温度
+    :param max_tokens: 最大token数
+    :param tool_options: 工具选项列表
+    :return: 请求指纹（sha256十六进制字符串）
+    """
+
+    def _normalize_content(content: str | list[tuple[str, str] | str]) -> list[str]:
+        if isinstance(content, str):
+            return [content.strip()]
+        normalized = []
+        for item in content:
+            if isinstance(item, tuple):
+                # 图片只记录格式和数据摘要，避免指纹数据过大
+                normalized.append(f"image:{item[0].lower()}:{hashlib.sha256(item[1].encode('utf-8')).hexdigest()}")
+            else:
+                normalized.append(item.strip())
+        return normalized
+
+    payload = {
+        "models": model_names,
+        "messages": [
+            {
+                "role": message.role.value,
+                "content": _normalize_content(message.content),
+                "tool_call_id": message.tool_call_id,
+            }
+            for message in messages
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "tools": [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "params": [
+                    (param.name, param.param_type.value, param.description, param.required, param.enum_values)
+                    for param in (tool.params or [])
+                ],
+            }
+            for tool in (tool_options or [])
+        ],
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
 class LLMUsageRecorder:
     """
     LLM使用情况记录器
+
+    使用记录先进入内存队列，由后台任务按批次（数量/时间触发）写入数据库，避免每次模型调用都在事件循环上同步写库
     """
 
     def __init__(self):
@@ -154,36 +370,134 @@ class LLMUsageRecorder:
         except Exception as e:
             logger.error(f"创建 LLMUsage 表失败: {str(e)}")
 
+        self._queue: deque[dict] = deque()
+        """待写入的使用记录队列"""
+
+        self._queue_lock = threading.Lock()
+        """队列锁（嵌入任务可能在其他线程的事件循环中记录使用情况）"""
+
+        self._flush_lock = threading.Lock()
+        """写库锁，保证同一时间只有一个批次在写入"""
+
+        self._flush_scheduled: bool = False
+        """是否已经调度了一次按数量触发的写入"""
+
+        self._flush_tasks: set[asyncio.Task] = set()
+        """按数量触发的写入任务（保留引用，避免任务在完成前被回收）"""
+
+        self.flushed_rows: int = 0
+        """已写入数据库的记录数"""
+
+        self.dropped_rows: int = 0
+        """因队列溢出而丢弃的记录数"""
+
     def record_usage_to_database(
         self, model_info: ModelInfo, model_usage: UsageRecord, user_id: str, request_type: str, endpoint: str, time_cost: float = 0.0
     ):
         input_cost = (model_usage.prompt_tokens / 1000000) * model_info.price_in
         output_cost = (model_usage.completion_tokens / 1000000) * model_info.price_out
         total_cost = round(input_cost + output_cost, 6)
+        row = {
+            "model_name": model_info.model_identifier,
+            "model_assign_name": model_info.name,
+            "model_api_provider": model_info.api_provider,
+            "user_id": user_id,
+            "request_type": request_type,
+            "endpoint": endpoint,
+            "prompt_tokens": model_usage.prompt_tokens or 0,
+            "completion_tokens": model_usage.completion_tokens or 0,
+            "total_tokens": model_usage.total_tokens or 0,
+            "cached_tokens": model_usage.cached_tokens or 0,
+            "cost": total_cost or 0.0,
+            "time_cost": round(time_cost or 0.0, 3),
+            "status": "success",
+            "timestamp": datetime.now(),
+        }
+        with self._queue_lock:
+            if len(self._queue) >= USAGE_QUEUE_MAX_SIZE:
+                # 队列已满，丢弃最早的记录
+                self._queue.popleft()
+                self.dropped_rows += 1
+                logger.warning(f"使用记录队列已满，丢弃最早的记录（累计丢弃 {self.dropped_rows} 条）")
+            self._queue.append(row)
+            queue_depth = len(self._queue)
+        logger.debug(
+            f"Token使用情况 - 模型: {model_usage.model_name}, "
+            f"用户: {user_id}, 类型: {request_type}, "
+            f"提示词: {model_usage.prompt_tokens}, 完成: {model_usage.completion_tokens}, "
+            f"总计: {model_usage.total_tokens}, 缓存命中: {model_usage.cached_tokens}"
+        )
+
+        if queue_depth >= USAGE_FLUSH_BATCH_SIZE and not self._flush_scheduled:
+            # 达到批次大小，立即调度一次写入
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return  # 不在事件循环中，交给定时任务写入
+            self._flush_scheduled = True
+            task = loop.create_task(self.flush_async())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    def flush(self) -> int:
+        """
+        将队列中的使用记录批量写入数据库（同步，会阻塞当前线程）
+        写入失败时将该批记录放回队列头部，下次写入时重试
+        Returns:
+            int: 本次写入的记录数
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._queue_lock:
+                    batch = [self._queue.popleft() for _ in range(min(len(self._queue), USAGE_FLUSH_BATCH_SIZE))]
+                if not batch:
+                    break
+                try:
+                    with db.atomic():
+                        LLMUsage.insert_many(batch).execute()
+                    written += len(batch)
+                except Exception as e:
+                    # 写入失败（例如数据库被锁）时放回队列头部，下次写入时重试；只有队列超出上限时才丢弃最早的记录
+                    logger.warning(f"批量记录token使用情况失败，{len(batch)} 条记录将在下次写入时重试: {str(e)}")
+                    with self._queue_lock:
+                        self._queue.extendleft(reversed(batch))
+                        while len(self._queue) > USAGE_QUEUE_MAX_SIZE:
+                            self._queue.popleft()
+                            self.dropped_rows += 1
+                    break
+        self.flushed_rows += written
+        return written
+
+    async def flush_async(self) -> int:
+        """
+        在数据库写线程中批量写入使用记录，不阻塞事件循环
+        Returns:
+            int: 本次写入的记录数
+        """
         try:
-            # 使用 Peewee 模型创建记录
-            LLMUsage.create(
-                model_name=model_info.model_identifier,
-                model_assign_name=model_info.name,
-                model_api_provider=model_info.api_provider,
-                user_id=user_id,
-                request_type=request_type,
-                endpoint=endpoint,
-                prompt_tokens=model_usage.prompt_tokens or 0,
-                completion_tokens=model_usage.completion_tokens or 0,
-                total_tokens=model_usage.total_tokens or 0,
-                cost=total_cost or 0.0,
-                time_cost = round(time_cost or 0.0, 3),
-                status="success",
-                timestamp=datetime.now(),  # Peewee 会处理 DateTimeField
-            )
-            logger.debug(
-                f"Token使用情况 - 模型: {model_usage.model_name}, "
-                f"用户: {user_id}, 类型: {request_type}, "
-                f"提示词: {model_usage.prompt_tokens}, 完成: {model_usage.completion_tokens}, "
-                f"总计: {model_usage.total_tokens}"
-            )
-        except Exception as e:
-            logger.error(f"记录token使用情况失败: {str(e)}")
+            return await db_executor.run_write(self.flush)
+        finally:
+            self._flush_scheduled = False
+
+    def get_stats(self) -> dict[str, int]:
+        """获取记录器状态：队列深度、已写入和已丢弃的记录数"""
+        return {
+            "queue_depth": len(self._queue),
+            "flushed_rows": self.flushed_rows,
+            "dropped_rows": self.dropped_rows,
+        }
+
+
+class LLMUsageFlushTask(AsyncTask):
+    """使用记录定时写入任务"""
+
+    def __init__(self):
+        super().__init__(task_name="LLM Usage Flush Task", run_interval=USAGE_FLUSH_INTERVAL)
+
+    async def run(self):
+        if written := await llm_usage_recorder.flush_async():
+            logger.debug(f"已批量写入 {written} 条使用记录，当前状态: {llm_usage_recorder.get_stats()}")
+
 
-llm_usage_recorder = LLMUsageRecorder()
\ No newline at end of file
+llm_usage_recorder = LLMUsageRecorder()
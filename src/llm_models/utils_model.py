@@ -4,7 +4,8 @@ import time
 
 from enum import Enum
 from rich.traceback import install
-from typing import Tuple, List, Dict, Optional, Callable, Any
+from functools import partial
+from typing import Tuple, List, Dict, Optional, Callable, Any, Awaitable, AsyncIterator, Set, TypeVar
 
 from src.common.logger import get_logger
 from src.config.config import model_config
@@ -12,9 +13,23 @@ from src.config.api_ada_configs import APIProvider, ModelInfo, TaskConfig
 from .payload_content.message import MessageBuilder, Message
 from .payload_content.resp_format import RespFormat
 from .payload_content.tool_option import ToolOption, ToolCall, ToolOptionBuilder, ToolParamType
-from .model_client.base_client import BaseClient, APIResponse, client_registry
-from .utils import compress_messages, llm_usage_recorder
+from .model_client.base_client import BaseClient, APIResponse, StreamDelta, UsageRecord, client_registry
+from .utils import (
+    compress_messages_async,
+    llm_usage_recorder,
+    build_request_fingerprint,
+    estimate_message_tokens,
+    estimate_text_tokens,
+)
+from .single_flight import single_flight
+from .response_cache import response_cache
+from .rate_limiter import admission_registry
+from .model_stats import model_stats
+from .hedging import hedge_budget, HEDGE_MIN_SAMPLES
+from .circuit_breaker import circuit_breaker, is_circuit_failure
+from .scheduler import scheduler_registry, resolve_priority
 from .exceptions import (
+    ModelCircuitOpenException,
     NetworkConnectionError,
     ReqAbortException,
     RespNotOkException,
@@ -26,6 +41,8 @@ install(extra_lines=3)
 
 logger = get_logger("model_utils")
 
+T = TypeVar("T")
+
 # 常见Error Code Mapping
 error_code_mapping = {
     400: "参数不正确",
@@ -59,6 +76,9 @@ class LLMRequest:
         }
         """模型使用量记录，用于进行负载均衡，对应为(total_tokens, penalty, usage_penalty)，惩罚值是为了能在某个模型请求不给力或正在被使用的时候进行调整"""
 
+        self.priority: str = resolve_priority(model_set.priority, request_type)
+        """请求调度优先级（interactive/planning/background）"""
+
     async def generate_response_for_image(
         self,
         prompt: str,
@@ -66,6 +86,7 @@ class LLMRequest:
         image_format: str,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        use_cache: bool = True,
     ) -> Tuple[str, Tuple[str, str, Optional[List[ToolCall]]]]:
         """
         为图像生成响应
@@ -73,31 +94,57 @@ class LLMRequest:
             prompt (str): 提示词
             image_base64 (str): 图像的Base64编码字符串
             image_format (str): 图像格式（如 'png', 'jpeg' 等）
+            use_cache (bool): 是否允许使用响应缓存（仅在任务配置启用响应缓存时生效）
         Returns:
             (Tuple[str, str, str, Optional[List[ToolCall]]]): 响应内容、推理内容、模型名称、工具调用列表
         """
-        # 模型选择
         start_time = time.time()
-        model_info, api_provider, client = self._select_model()
 
-        # 请求体构建
-        message_builder = MessageBuilder()
-        message_builder.add_text_content(prompt)
-        message_builder.add_image_content(
-            image_base64=image_base64, image_format=image_format, support_formats=client.get_support_image_formats()
-        )
-        messages = [message_builder.build()]
+        def _build_messages(client: BaseClient) -> List[Message]:
+            message_builder = MessageBuilder()
+            message_builder.add_text_content(prompt)
+            message_builder.add_image_content(
+                image_base64=image_base64, image_format=image_format, support_formats=client.get_support_image_formats()
+            )
+            return [message_builder.build()]
+
+        async def _request(
+            model_info: ModelInfo, api_provider: APIProvider, client: BaseClient
+        ) -> Tuple[APIResponse, str]:
+            # 请求体构建（图片格式取决于所选模型的客户端）
+            messages = _build_messages(client)
+
+            cache_key = self._build_cache_key(messages, temperature, max_tokens) if use_cache else None
+            if cache_key and (cached := await self._get_cached_response(cache_key)):
+                self._release_model_usage(model_info.name)
+                return cached
+
+            # 请求并处理返回值
+            response = await self._execute_request(
+                api_provider=api_provider,
+                client=client,
+                request_type=RequestType.RESPONSE,
+                model_info=model_info,
+                message_list=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            if usage := response.usage:
+                llm_usage_recorder.record_usage_to_database(
+                    model_info=model_info,
+                    model_usage=usage,
+                    user_id="system",
+                    request_type=self.request_type,
+                    endpoint="/chat/completions",
+                    time_cost=time.time() - start_time,
+                )
+            if cache_key:
+                await self._put_cached_response(model_info, cache_key, response)
+            return response, model_info.name
+
+        # 模型选择（模型熔断时自动切换）
+        response, model_name = await self._request_with_failover(_request)
 
-        # 请求并处理返回值
-        response = await self._execute_request(
-            api_provider=api_provider,
-            client=client,
-            request_type=RequestType.RESPONSE,
-            model_info=model_info,
-            message_list=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
         content = response.content or ""
         reasoning_content = response.reasoning_content or ""
         tool_calls = response.tool_calls
@@ -105,16 +152,7 @@ class LLMRequest:
         if not reasoning_content and content:
             content, extracted_reasoning = self._extract_reasoning(content)
             reasoning_content = extracted_reasoning
-        if usage := response.usage:
-            llm_usage_recorder.record_usage_to_database(
-                model_info=model_info,
-                model_usage=usage,
-                user_id="system",
-                request_type=self.request_type,
-                endpoint="/chat/completions",
-                time_cost=time.time() - start_time,
-            )
-        return content, (reasoning_content, model_info.name, tool_calls)
+        return content, (reasoning_content, model_name, tool_calls)
 
     async def generate_response_for_voice(self, voice_base64: str) -> Optional[str]:
         """
@@ -124,16 +162,15 @@ class LLMRequest:
         Returns:
             (Optional[str]): 生成的文本描述或None
         """
-        # 模型选择
-        model_info, api_provider, client = self._select_model()
-
-        # 请求并处理返回值
-        response = await self._execute_request(
-            api_provider=api_provider,
-            client=client,
-            request_type=RequestType.AUDIO,
-            model_info=model_info,
-            audio_base64=voice_base64,
+        # 模型选择（模型熔断时自动切换）并请求
+        response = await self._request_with_failover(
+            lambda model_info, api_provider, client: self._execute_request(
+                api_provider=api_provider,
+                client=client,
+                request_type=RequestType.AUDIO,
+                model_info=model_info,
+                audio_base64=voice_base64,
+            )
         )
         return response.content or None
 
@@ -144,6 +181,7 @@ class LLMRequest:
         max_tokens: Optional[int] = None,
         tools: Optional[List[Dict[str, Any]]] = None,
         raise_when_empty: bool = True,
+        use_cache: bool = True,
     ) -> Tuple[str, Tuple[str, str, Optional[List[ToolCall]]]]:
         """
         异步生成响应
@@ -151,6 +189,7 @@ class LLMRequest:
             prompt (str): 提示词
             temperature (float, optional): 温度参数
             max_tokens (int, optional): 最大token数
+            use_cache (bool): 是否允许使用响应缓存（仅在任务配置启用响应缓存时生效）
         Returns:
             (Tuple[str, str, str, Optional[List[ToolCall]]]): 响应内容、推理内容、模型名称、工具调用列表
         """
@@ -163,32 +202,192 @@ class LLMRequest:
 
         tool_built = self._build_tool_options(tools)
 
-        # 模型选择
-        model_info, api_provider, client = self._select_model()
+        cache_key = self._build_cache_key(messages, temperature, max_tokens, tool_built) if use_cache else None
+        if cache_key and (cached := await self._get_cached_response(cache_key)):
+            response, model_name = cached
+            return self._unpack_response(response, model_name)
 
-        # 请求并处理返回值
-        logger.debug(f"LLM选择耗时: {model_info.name} {time.time() - start_time}")
+        async def _request_model(
+            model_info: ModelInfo, api_provider: APIProvider, client: BaseClient
+        ) -> Tuple[APIResponse, ModelInfo]:
+            # 请求并处理返回值
+            logger.debug(f"LLM选择耗时: {model_info.name} {time.time() - start_time}")
 
-        response = await self._execute_request(
-            api_provider=api_provider,
-            client=client,
-            request_type=RequestType.RESPONSE,
-            model_info=model_info,
-            message_list=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            tool_options=tool_built,
-        )
+            response, model_info = await self._execute_hedged_request(
+                model_info=model_info,
+                api_provider=api_provider,
+                client=client,
+                message_list=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                tool_options=tool_built,
+            )
 
-        content = response.content
-        reasoning_content = response.reasoning_content or ""
-        tool_calls = response.tool_calls
-        # 从内容中提取<think>标签的推理内容（向后兼容）
-        if not reasoning_content and content:
-            content, extracted_reasoning = self._extract_reasoning(content)
-            reasoning_content = extracted_reasoning
+            if usage := response.usage:
+                hedge_budget.record_tokens(self.request_type, usage.total_tokens)
+                llm_usage_recorder.record_usage_to_database(
+                    model_info=model_info,
+                    model_usage=usage,
+                    user_id="system",
+                    request_type=self.request_type,
+                    endpoint="/chat/completions",
+                    time_cost=time.time() - start_time,
+                )
+            if cache_key:
+                await self._put_cached_response(model_info, cache_key, response)
+            return response, model_info
+
+        async def _request() -> Tuple[APIResponse, ModelInfo]:
+            # 模型选择（模型熔断时自动切换）
+            return await self._request_with_failover(_request_model)
+
+        if self.model_for_task.single_flight:
+            # 合并并发的相同请求，共享同一个上游请求的结果
+            request_key = build_request_fingerprint(
+                model_names=self.model_for_task.model_list,
+                messages=messages,
+                temperature=self.model_for_task.temperature if temperature is None else temperature,
+                max_tokens=self.model_for_task.max_tokens if max_tokens is None else max_tokens,
+                tool_options=tool_built,
+            )
+            (response, model_info), _ = await single_flight.do(request_key, _request)
+        else:
+            response, model_info = await _request()
 
-        if usage := response.usage:
+        return self._unpack_response(response, model_info.name)
+
+    async def generate_response_stream(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> AsyncIterator[StreamDelta]:
+        """
+        以流式方式生成响应
+
+        在输出首个增量前失败时按常规逻辑重试；一旦开始输出，失败将直接抛出（已输出的内容无法撤回）
+        Args:
+            prompt (str): 提示词
+            temperature (float, optional): 温度参数
+            max_tokens (int, optional): 最大token数
+            tools (List[Dict[str, Any]], optional): 工具列表
+        Returns:
+            (AsyncIterator[StreamDelta]): 响应增量的异步迭代器，每个增量的model_name均已填充
+        """
+        start_time = time.time()
+
+        message_builder = MessageBuilder()
+        message_builder.add_text_content(prompt)
+        messages = [message_builder.build()]
+        tool_built = self._build_tool_options(tools)
+
+        model_info, api_provider, client = self._select_model()
+        admission = admission_registry.get_controller(api_provider)
+        estimated_tokens = estimate_message_tokens(messages)
+        retry_remain = api_provider.max_retry
+        compressed_messages: Optional[List[Message]] = None
+        usage = None
+        partial_content = ""
+        tried_models: Set[str] = set()
+
+        while retry_remain > 0:
+            emitted = False
+            attempt_start = time.time()
+            ttft: Optional[float] = None
+            try:
+                scheduler = scheduler_registry.get_scheduler()
+                async with scheduler.slot(self.priority), admission.acquire(estimated_tokens):
+                    model_stats.on_request_start(model_info.name)
+                    circuit_breaker.on_request_start(model_info.name)
+                    resp_stream = client.get_response_stream(
+                        model_info=model_info,
+                        message_list=(compressed_messages or messages),
+                        tool_options=tool_built,
+                        max_tokens=self.model_for_task.max_tokens if max_tokens is None else max_tokens,
+                        temperature=self.model_for_task.temperature if temperature is None else temperature,
+                        extra_params=model_info.extra_params,
+                    )
+                    try:
+                        async for delta in resp_stream:
+                            if delta.usage:
+                                usage = delta.usage
+                            partial_content += (delta.content or "") + (delta.reasoning_content or "")
+                            if ttft is None and (delta.content or delta.reasoning_content or delta.tool_call_fragment):
+                                ttft = time.time() - attempt_start
+                            delta.model_name = model_info.name
+                            emitted = True
+                            yield delta
+                    except (asyncio.CancelledError, GeneratorExit):
+                        # 调用方取消或提前关闭迭代器时，流式响应随客户端生成器一同关闭，按已输出内容记录消耗
+                        model_stats.on_request_cancelled(model_info.name)
+                        circuit_breaker.on_request_cancelled(model_info.name)
+                        if emitted:
+                            usage_tuple = (
+                                (usage.prompt_tokens, usage.completion_tokens, usage.total_tokens, usage.cached_tokens)
+                                if usage
+                                else None
+                            )
+                            self._record_partial_usage(
+                                model_info,
+                                compressed_messages or messages,
+                                ReqAbortException(partial_content=partial_content, usage=usage_tuple),
+                                time.time() - start_time,
+                            )
+                        raise
+                    except Exception as e:
+                        model_stats.on_request_failure(model_info.name, time.time() - attempt_start)
+                        circuit_breaker.on_request_failure(model_info.name, e)
+                        raise
+                    finally:
+                        # 立即关闭客户端的流式生成器（进而关闭HTTP流），而不是等待垃圾回收
+                        await resp_stream.aclose()  # type: ignore
+                    model_stats.on_request_success(model_info.name, time.time() - attempt_start, ttft)
+                    circuit_breaker.on_request_success(model_info.name)
+                if usage:
+                    admission.adjust_tokens(usage.total_tokens, estimated_tokens)
+                break
+            except Exception as e:
+                if emitted:
+                    # 已经输出了部分内容，无法透明地重试
+                    logger.error(f"任务-'{self.task_name}' 模型-'{model_info.name}': 流式输出中断，错误信息-{str(e)}")
+                    raise
+                logger.debug(f"流式请求失败: {str(e)}")
+                total_tokens, penalty, usage_penalty = self.model_usage[model_info.name]
+                self.model_usage[model_info.name] = (total_tokens, penalty + 1, usage_penalty)
+
+                wait_interval, compressed_messages = await self._default_exception_handler(
+                    e,
+                    self.task_name,
+                    model_name=model_info.name,
+                    remain_try=retry_remain,
+                    retry_interval=api_provider.retry_interval,
+                    messages=(messages, compressed_messages is not None),
+                )
+                if is_circuit_failure(e) and not circuit_breaker.is_available(model_info.name):
+                    # 本次失败触发了熔断，尚未输出任何内容，直接切换到下一个可用模型
+                    tried_models.add(model_info.name)
+                    self._release_model_usage(model_info.name)
+                    logger.warning(f"任务-'{self.task_name}' 模型-'{model_info.name}' 已熔断，切换到其他模型")
+                    model_info, api_provider, client = self._select_model(exclude=tried_models)
+                    admission = admission_registry.get_controller(api_provider)
+                    retry_remain = api_provider.max_retry + 1  # finally中会减一
+                    compressed_messages = None
+                    continue
+                if wait_interval == -1:
+                    retry_remain = 0  # 不再重试
+                elif wait_interval > 0:
+                    logger.info(f"等待 {wait_interval} 秒后重试...")
+                    await asyncio.sleep(wait_interval)
+            finally:
+                retry_remain -= 1
+        else:
+            self._release_model_usage(model_info.name)
+            logger.error(f"模型 '{model_info.name}' 流式请求失败，达到最大重试次数 {api_provider.max_retry} 次")
+            raise RuntimeError("请求失败，已达到最大重试次数")
+
+        if usage:
+            hedge_budget.record_tokens(self.request_type, usage.total_tokens)
             llm_usage_recorder.record_usage_to_database(
                 model_info=model_info,
                 model_usage=usage,
@@ -198,8 +397,6 @@ class LLMRequest:
                 time_cost=time.time() - start_time,
             )
 
-        return content or "", (reasoning_content, model_info.name, tool_calls)
-
     async def get_embedding(self, embedding_input: str) -> Tuple[List[float], str]:
         """获取嵌入向量
         Args:
@@ -209,16 +406,21 @@ class LLMRequest:
         """
         # 无需构建消息体，直接使用输入文本
         start_time = time.time()
-        model_info, api_provider, client = self._select_model()
 
-        # 请求并处理返回值
-        response = await self._execute_request(
-            api_provider=api_provider,
-            client=client,
-            request_type=RequestType.EMBEDDING,
-            model_info=model_info,
-            embedding_input=embedding_input,
-        )
+        async def _request(
+            model_info: ModelInfo, api_provider: APIProvider, client: BaseClient
+        ) -> Tuple[APIResponse, ModelInfo]:
+            response = await self._execute_request(
+                api_provider=api_provider,
+                client=client,
+                request_type=RequestType.EMBEDDING,
+                model_info=model_info,
+                embedding_input=embedding_input,
+            )
+            return response, model_info
+
+        # 模型选择（模型熔断时自动切换）并请求
+        response, model_info = await self._request_with_failover(_request)
 
         embedding = response.embedding
 
@@ -237,26 +439,252 @@ class LLMRequest:
 
         return embedding, model_info.name
 
-    def _select_model(self) -> Tuple[ModelInfo, APIProvider, BaseClient]:
+    def _unpack_response(
+        self, response: APIResponse, model_name: str
+    ) -> Tuple[str, Tuple[str, str, Optional[List[ToolCall]]]]:
+        """将响应拆解为(响应内容, (推理内容, 模型名称, 工具调用列表))"""
+        content = response.content
+        reasoning_content = response.reasoning_content or ""
+        tool_calls = response.tool_calls
+        # 从内容中提取<think>标签的推理内容（向后兼容）
+        if not reasoning_content and content:
+            content, extracted_reasoning = self._extract_reasoning(content)
+            reasoning_content = extracted_reasoning
+
+        return content or "", (reasoning_content, model_name, tool_calls)
+
+    def _build_cache_key(
+        self,
+        messages: List[Message],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        tool_options: Optional[List[ToolOption]] = None,
+    ) -> Optional[str]:
+        """构建响应缓存的请求指纹，任务未启用响应缓存时返回None"""
+        if not self.model_for_task.response_cache:
+            return None
+        return build_request_fingerprint(
+            model_names=[],
+            messages=messages,
+            temperature=self.model_for_task.temperature if temperature is None else temperature,
+            max_tokens=self.model_for_task.max_tokens if max_tokens is None else max_tokens,
+            tool_options=tool_options,
+        )
+
+    async def _get_cached_response(self, cache_key: str) -> Optional[Tuple[APIResponse, str]]:
         """
-        根据总tokens和惩罚值选择的模型
+        从响应缓存中查找任务模型列表中任一模型的缓存结果
+        Returns:
+            (Optional[Tuple[APIResponse, str]]): (缓存的响应, 模型名称)，未命中时为None
         """
-        least_used_model_name = min(
-            self.model_usage,
-            key=lambda k: self.model_usage[k][0] + self.model_usage[k][1] * 300 + self.model_usage[k][2] * 1000,
+        identifier_to_name: Dict[str, str] = {}
+        for model_name in self.model_for_task.model_list:
+            identifier_to_name.setdefault(model_config.get_model_info(model_name).model_identifier, model_name)
+        if cached := await response_cache.get_async(list(identifier_to_name.keys()), cache_key):
+            response, model_identifier = cached
+            return response, identifier_to_name[model_identifier]
+        return None
+
+    async def _put_cached_response(self, model_info: ModelInfo, cache_key: str, response: APIResponse) -> None:
+        """将响应写入响应缓存"""
+        await response_cache.put_async(
+            model_identifier=model_info.model_identifier,
+            prompt_hash=cache_key,
+            request_type=self.request_type,
+            response=response,
+            ttl=self.model_for_task.response_cache_ttl,
+            max_entries=self.model_for_task.response_cache_max_entries,
         )
-        model_info = model_config.get_model_info(least_used_model_name)
+
+    def _release_model_usage(self, model_name: str) -> None:
+        """选择模型后未实际发出请求时，撤销该次选择增加的使用惩罚值"""
+        total_tokens, penalty, usage_penalty = self.model_usage[model_name]
+        self.model_usage[model_name] = (total_tokens, penalty, usage_penalty - 1)
+
+    def _record_partial_usage(
+        self,
+        model_info: ModelInfo,
+        message_list: List[Message],
+        e: ReqAbortException,
+        time_cost: float = 0.0,
+    ) -> None:
+        """记录被中断请求已消耗的token（上游未返回使用情况时按提示词与已生成内容估算）"""
+        if e.usage:
+            prompt_tokens, completion_tokens, total_tokens, cached_tokens = e.usage
+        else:
+            prompt_tokens = estimate_message_tokens(message_list)
+            completion_tokens = estimate_text_tokens(e.partial_content)
+            total_tokens = prompt_tokens + completion_tokens
+            cached_tokens = 0
+        llm_usage_recorder.record_usage_to_database(
+            model_info=model_info,
+            model_usage=UsageRecord(
+                model_name=model_info.name,
+                provider_name=model_info.api_provider,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=total_tokens,
+                cached_tokens=cached_tokens,
+            ),
+            user_id="system",
+            request_type=self.request_type,
+            endpoint="/chat/completions",
+            time_cost=time_cost,
+        )
+
+    def _select_model(self, exclude: Optional[Set[str]] = None) -> Tuple[ModelInfo, APIProvider, BaseClient]:
+        """
+        根据任务配置的选择策略选择模型（默认根据总tokens和惩罚值选择），已熔断的模型与exclude中的模型会被跳过
+        """
+        candidates = [
+            name for name in self.model_usage if name not in (exclude or ()) and circuit_breaker.is_available(name)
+        ]
+        if not candidates:
+            raise RuntimeError(f"任务-'{self.task_name}' 没有可用的模型（均已熔断或请求失败）")
+        if self.model_for_task.selection_policy == "balance":
+            least_used_model_name = min(
+                candidates,
+                key=lambda k: self.model_usage[k][0] + self.model_usage[k][1] * 300 + self.model_usage[k][2] * 1000,
+            )
+        else:
+            # 按各模型的实时延迟与错误率选择
+            least_used_model_name = model_stats.choose(candidates, self.model_for_task.selection_policy)
+        return self._use_model(least_used_model_name)
+
+    async def _request_with_failover(
+        self, request: Callable[[ModelInfo, APIProvider, BaseClient], Awaitable[T]]
+    ) -> T:
+        """
+        选择模型并执行请求；请求期间模型被熔断时立即切换到下一个可用模型，而不是继续等待重试
+        Args:
+            request: 接收(模型信息, API提供商, 客户端)的请求函数
+        """
+        tried: Set[str] = set()
+        while True:
+            model_info, api_provider, client = self._select_model(exclude=tried)
+            try:
+                return await request(model_info, api_provider, client)
+            except ModelCircuitOpenException as e:
+                tried.add(e.model_name)
+                logger.warning(f"任务-'{self.task_name}' 模型-'{e.model_name}' 已熔断，切换到其他模型")
+
+    def _use_model(self, model_name: str) -> Tuple[ModelInfo, APIProvider, BaseClient]:
+        """获取指定模型的模型信息、API提供商和客户端，并增加其使用惩罚值"""
+        model_info = model_config.get_model_info(model_name)
         api_provider = model_config.get_provider(model_info.api_provider)
 
-        # 对于嵌入任务，强制创建新的客户端实例以避免事件循环问题
-        force_new_client = self.request_type == "embedding"
-        client = client_registry.get_client_class_instance(api_provider, force_new=force_new_client)
+        # 客户端按事件循环缓存，不同事件循环（如嵌入任务的后台事件循环）各自复用自己的连接池
+        client = client_registry.get_client_class_instance(api_provider)
 
         logger.debug(f"选择请求模型: {model_info.name}")
         total_tokens, penalty, usage_penalty = self.model_usage[model_info.name]
         self.model_usage[model_info.name] = (total_tokens, penalty, usage_penalty + 1)  # 增加使用惩罚值防止连续使用
         return model_info, api_provider, client
 
+    def _get_hedge_delay(self, model_info: ModelInfo) -> Optional[float]:
+        """
+        获取对冲请求的触发延迟（模型近期延迟的指定分位数）
+        Returns:
+            (Optional[float]): 触发延迟（单位：秒），不满足对冲条件时为None
+        """
+        if not self.model_for_task.hedge_enabled or len(self.model_for_task.model_list) < 2:
+            return None
+        stats = model_stats.get(model_info.name)
+        if len(stats.recent_latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return model_stats.get_latency_percentile(model_info.name, self.model_for_task.hedge_percentile)
+
+    async def _execute_hedged_request(
+        self,
+        model_info: ModelInfo,
+        api_provider: APIProvider,
+        client: BaseClient,
+        message_list: List[Message],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        tool_options: Optional[List[ToolOption]] = None,
+    ) -> Tuple[APIResponse, ModelInfo]:
+        """
+        执行对话请求，任务启用对冲时，若首个模型在其近期延迟的指定分位数内仍未返回，则向模型列表中的下一个模型再发出一次请求，先返回者胜出，另一个请求被取消（其已消耗的token按估算值记录）
+        Returns:
+            (Tuple[APIResponse, ModelInfo]): (响应, 实际产生响应的模型信息)
+        """
+
+        def _start(info: ModelInfo, provider: APIProvider, model_client: BaseClient) -> asyncio.Task:
+            return asyncio.create_task(
+                self._execute_request(
+                    api_provider=provider,
+                    client=model_client,
+                    request_type=RequestType.RESPONSE,
+                    model_info=info,
+                    message_list=message_list,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    tool_options=tool_options,
+                )
+            )
+
+        hedge_delay = self._get_hedge_delay(model_info)
+        if hedge_delay is None:
+            response = await self._execute_request(
+                api_provider=api_provider,
+                client=client,
+                request_type=RequestType.RESPONSE,
+                model_info=model_info,
+                message_list=message_list,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                tool_options=tool_options,
+            )
+            return response, model_info
+
+        tasks: Dict[asyncio.Task, ModelInfo] = {}
+        primary_task = _start(model_info, api_provider, client)
+        tasks[primary_task] = model_info
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=hedge_delay)
+            # 按模型列表顺序选择下一个未熔断的模型作为对冲目标
+            model_list = self.model_for_task.model_list
+            index = model_list.index(model_info.name)
+            hedge_model_name = next(
+                (
+                    name
+                    for name in (model_list[(index + offset) % len(model_list)] for offset in range(1, len(model_list)))
+                    if circuit_breaker.is_available(name)
+                ),
+                None,
+            )
+            if (
+                not done
+                and hedge_model_name is not None
+                and hedge_budget.try_spend(
+                    self.request_type, estimate_message_tokens(message_list), self.model_for_task.hedge_budget_ratio
+                )
+            ):
+                hedge_info, hedge_provider, hedge_client = self._use_model(hedge_model_name)
+                logger.info(
+                    f"任务-'{self.task_name}' 模型-'{model_info.name}' 超过 {hedge_delay:.2f} 秒未返回，"
+                    f"向模型-'{hedge_info.name}' 发出对冲请求"
+                )
+                tasks[_start(hedge_info, hedge_provider, hedge_client)] = hedge_info
+
+            pending = set(tasks.keys())
+            last_exception: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary_task:
+                            hedge_budget.hedge_wins += 1
+                        return task.result(), tasks[task]
+                    last_exception = task.exception()
+            assert last_exception is not None
+            raise last_exception
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
     async def _execute_request(
         self,
         api_provider: APIProvider,
@@ -276,15 +704,22 @@ class LLMRequest:
         """
         实际执行请求的方法
 
-        包含了重试和异常处理逻辑
+        包含了重试和异常处理逻辑；请求被取消（任务取消）时已消耗的token按估算值记录
         """
         retry_remain = api_provider.max_retry
         compressed_messages: Optional[List[Message]] = None
+        admission = admission_registry.get_controller(api_provider)
         while retry_remain > 0:
+            if not circuit_breaker.is_available(model_info.name):
+                # 模型已被熔断（可能由其他并发请求触发），不再等待重试，交给调用方切换模型
+                self._release_model_usage(model_info.name)
+                raise ModelCircuitOpenException(model_info.name)
             try:
                 if request_type == RequestType.RESPONSE:
                     assert message_list is not None, "message_list cannot be None for response requests"
-                    return await client.get_response(
+                    estimated_tokens = estimate_message_tokens(compressed_messages or message_list)
+                    request_func = partial(
+                        client.get_response,
                         model_info=model_info,
                         message_list=(compressed_messages or message_list),
                         tool_options=tool_options,
@@ -297,25 +732,48 @@ class LLMRequest:
                     )
                 elif request_type == RequestType.EMBEDDING:
                     assert embedding_input, "embedding_input cannot be empty for embedding requests"
-                    return await client.get_embedding(
+                    estimated_tokens = estimate_text_tokens(embedding_input)
+                    request_func = partial(
+                        client.get_embedding,
                         model_info=model_info,
                         embedding_input=embedding_input,
                         extra_params=model_info.extra_params,
                     )
-                elif request_type == RequestType.AUDIO:
+                else:
                     assert audio_base64 is not None, "audio_base64 cannot be None for audio requests"
-                    return await client.get_audio_transcriptions(
+                    estimated_tokens = 0
+                    request_func = partial(
+                        client.get_audio_transcriptions,
                         model_info=model_info,
                         audio_base64=audio_base64,
                         extra_params=model_info.extra_params,
                     )
+
+                scheduler = scheduler_registry.get_scheduler()
+                async with scheduler.slot(self.priority), admission.acquire(estimated_tokens):
+                    call_start = time.time()
+                    try:
+                        response = await self._timed_call(model_info, request_func)
+                    except asyncio.CancelledError:
+                        # 请求发出后被取消（例如对冲请求中落败的一方），上游已处理提示词，按估算值记录已消耗的token
+                        if message_list:
+                            self._record_partial_usage(
+                                model_info,
+                                compressed_messages or message_list,
+                                ReqAbortException("请求已取消"),
+                                time.time() - call_start,
+                            )
+                        raise
+                if response.usage:
+                    admission.adjust_tokens(response.usage.total_tokens, estimated_tokens)
+                return response
             except Exception as e:
                 logger.debug(f"请求失败: {str(e)}")
                 # 处理异常
                 total_tokens, penalty, usage_penalty = self.model_usage[model_info.name]
                 self.model_usage[model_info.name] = (total_tokens, penalty + 1, usage_penalty)
 
-                wait_interval, compressed_messages = self._default_exception_handler(
+                wait_interval, compressed_messages = await self._default_exception_handler(
                     e,
                     self.task_name,
                     model_name=model_info.name,
@@ -324,6 +782,10 @@ class LLMRequest:
                     messages=(message_list, compressed_messages is not None) if message_list else None,
                 )
 
+                if is_circuit_failure(e) and not circuit_breaker.is_available(model_info.name):
+                    # 本次失败触发了熔断，跳过重试等待，直接交给调用方切换模型
+                    self._release_model_usage(model_info.name)
+                    raise ModelCircuitOpenException(model_info.name) from e
                 if wait_interval == -1:
                     retry_remain = 0  # 不再重试
                 elif wait_interval > 0:
@@ -337,7 +799,27 @@ class LLMRequest:
         logger.error(f"模型 '{model_info.name}' 请求失败，达到最大重试次数 {api_provider.max_retry} 次")
         raise RuntimeError("请求失败，已达到最大重试次数")
 
-    def _default_exception_handler(
+    @staticmethod
+    async def _timed_call(model_info: ModelInfo, request_func: Callable[[], Awaitable[APIResponse]]) -> APIResponse:
+        """执行单次请求，并将延迟与成败记录到模型运行统计中"""
+        attempt_start = time.time()
+        model_stats.on_request_start(model_info.name)
+        circuit_breaker.on_request_start(model_info.name)
+        try:
+            response = await request_func()
+        except asyncio.CancelledError:
+            model_stats.on_request_cancelled(model_info.name)
+            circuit_breaker.on_request_cancelled(model_info.name)
+            raise
+        except Exception as e:
+            model_stats.on_request_failure(model_info.name, time.time() - attempt_start)
+            circuit_breaker.on_request_failure(model_info.name, e)
+            raise
+        model_stats.on_request_success(model_info.name, time.time() - attempt_start)
+        circuit_breaker.on_request_success(model_info.name)
+        return response
+
+    async def _default_exception_handler(
         self,
         e: Exception,
         task_name: str,
@@ -360,14 +842,14 @@ class LLMRequest:
         """
 
         if isinstance(e, NetworkConnectionError):  # 网络连接错误
-            return self._check_retry(
+            return await self._check_retry(
                 remain_try,
                 retry_interval,
                 can_retry_msg=f"任务-'{task_name}' 模型-'{model_name}': 连接异常，将于{retry_interval}秒后重试",
                 cannot_retry_msg=f"任务-'{task_name}' 模型-'{model_name}': 连接异常，超过最大重试次数，请检查网络连接状态或URL是否正确",
             )
         elif isinstance(e, EmptyResponseException):  # 空响应错误
-            return self._check_retry(
+            return await self._check_retry(
                 remain_try,
                 retry_interval,
                 can_retry_msg=f"任务-'{task_name}' 模型-'{model_name}': 收到空响应，将于{retry_interval}秒后重试。原因: {e}",
@@ -377,7 +859,7 @@ class LLMRequest:
             logger.warning(f"任务-'{task_name}' 模型-'{model_name}': 请求被中断，详细信息-{str(e.message)}")
             return -1, None  # 不再重试请求该模型
         elif isinstance(e, RespNotOkException):
-            return self._handle_resp_not_ok(
+            return await self._handle_resp_not_ok(
                 e,
                 task_name,
                 model_name,
@@ -394,7 +876,7 @@ class LLMRequest:
             logger.error(f"任务-'{task_name}' 模型-'{model_name}': 未知异常，错误信息-{str(e)}")
             return -1, None  # 不再重试请求该模型
 
-    def _check_retry(
+    async def _check_retry(
         self,
         remain_try: int,
         retry_interval: int,
@@ -409,7 +891,7 @@ class LLMRequest:
             retry_interval (int): 重试间隔
             can_retry_msg (str): 可以重试时的提示信息
             cannot_retry_msg (str): 不可以重试时的提示信息
-            can_retry_callable (Callable | None): 可以重试时调用的函数（如果有）
+            can_retry_callable (Callable | None): 可以重试时调用的异步函数（如果有）
             **kwargs: 其他参数
 
         Returns:
@@ -419,7 +901,7 @@ class LLMRequest:
             # 还有重试机会
             logger.warning(f"{can_retry_msg}")
             if can_retry_callable is not None:
-                return retry_interval, can_retry_callable(**kwargs)
+                return retry_interval, await can_retry_callable(**kwargs)
             else:
                 return retry_interval, None
         else:
@@ -427,7 +909,7 @@ class LLMRequest:
             logger.warning(f"{cannot_retry_msg}")
             return -1, None  # 不再重试请求该模型
 
-    def _handle_resp_not_ok(
+    async def _handle_resp_not_ok(
         self,
         e: RespNotOkException,
         task_name: str,
@@ -458,12 +940,12 @@ class LLMRequest:
         elif e.status_code == 413:
             if messages and not messages[1]:
                 # 消息列表不为空且未压缩，尝试压缩消息
-                return self._check_retry(
+                return await self._check_retry(
                     remain_try,
                     0,
                     can_retry_msg=f"任务-'{task_name}' 模型-'{model_name}': 请求体过大，尝试压缩消息后重试",
                     cannot_retry_msg=f"任务-'{task_name}' 模型-'{model_name}': 请求体过大，压缩消息后仍然过大，放弃请求",
-                    can_retry_callable=compress_messages,
+                    can_retry_callable=compress_messages_async,
                     messages=messages[0],
                 )
             # 没有消息可压缩
@@ -471,7 +953,7 @@ class LLMRequest:
             return -1, None
         elif e.status_code == 429:
             # 请求过于频繁
-            return self._check_retry(
+            return await self._check_retry(
                 remain_try,
                 retry_interval,
                 can_retry_msg=f"任务-'{task_name}' 模型-'{model_name}': 请求过于频繁，将于{retry_interval}秒后重试",
@@ -479,7 +961,7 @@ class LLMRequest:
             )
         elif e.status_code >= 500:
             # 服务器错误
-            return self._check_retry(
+            return await self._check_retry(
                 remain_try,
                 retry_interval,
                 can_retry_msg=f"任务-'{task_name}' 模型-'{model_name}': 服务器错误，将于{retry_interval}秒后重试",
@@ -5,6 +5,13 @@ from maim_message import MessageServer
 from src.common.remote import TelemetryHeartBeatTask
 from src.manager.async_task_manager import async_task_manager
 from src.chat.utils.statistic import OnlineTimeRecordTask, StatisticOutputTask
+from src.llm_models.utils import LLMUsageFlushTask
+from src.common.message_write_buffer import MessageFlushTask
+from src.common.message_archive import MessageArchiveTask
+from src.common.database.message_search import MessageSearchBackfillTask
+from src.common.database.message_info import MessageInfoBackfillTask
+from src.common.database.db_executor import EventLoopLagMonitor
+from src.llm_models.scheduler import SchedulerStatsTask
 from src.chat.emoji_system.emoji_manager import get_emoji_manager
 from src.chat.message_receive.chat_stream import get_chat_manager
 from src.config.config import global_config
@@ -74,6 +81,28 @@ class MainSystem:
         # 添加统计信息输出任务
         await async_task_manager.add_task(StatisticOutputTask())
 
+        # 添加消息批量写入任务
+        await async_task_manager.add_task(MessageFlushTask())
+
+        # 添加消息归档任务
+        if global_config.database.message_archive_enable:
+            await async_task_manager.add_task(MessageArchiveTask())
+
+        # 添加消息全文索引补建任务
+        await async_task_manager.add_task(MessageSearchBackfillTask())
+
+        # 添加已有消息的聊天信息与发送者信息补全任务（数据库规范化迁移的后台部分）
+        await async_task_manager.add_task(MessageInfoBackfillTask())
+
+        # 添加模型使用记录批量写入任务
+        await async_task_manager.add_task(LLMUsageFlushTask())
+
+        # 添加LLM请求调度统计输出任务
+        await async_task_manager.add_task(SchedulerStatsTask())
+
+        # 添加事件循环延迟与数据库耗时监控任务
+        await async_task_manager.add_task(EventLoopLagMonitor())
+
         # 添加遥测心跳任务
         await async_task_manager.add_task(TelemetryHeartBeatTask())
 
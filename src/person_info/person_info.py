@@ -11,6 +11,7 @@ from typing import Union, Optional
 from src.common.logger import get_logger
 from src.common.database.database import db
 from src.common.database.database_model import PersonInfo
+from src.common.database.db_executor import db_executor
 from src.llm_models.utils_model import LLMRequest
 from src.config.config import global_config, model_config
 
@@ -197,6 +198,20 @@ class Person:
 
         return person
 
+    @classmethod
+    async def register_person_async(cls, platform: str, user_id: str, nickname: str):
+        """register_person 的异步版本，在数据库写线程中查询并注册用户"""
+        return await db_executor.run_write(cls.register_person, platform, user_id, nickname)
+
+    @classmethod
+    async def load_async(
+        cls, platform: str = "", user_id: str = "", person_id: str = "", person_name: str = ""
+    ) -> "Person":
+        """在数据库读线程中创建Person实例并加载用户信息，不阻塞事件循环（参数同构造函数）"""
+        return await db_executor.run_read(
+            cls, platform=platform, user_id=user_id, person_id=person_id, person_name=person_name
+        )
+
     def __init__(self, platform: str = "", user_id: str = "", person_id: str = "", person_name: str = ""):
         if platform == global_config.bot.platform and user_id == global_config.bot.qq_account:
             self.is_known = True
@@ -424,6 +439,10 @@ class Person:
         except Exception as e:
             logger.error(f"同步用户 {self.person_id} 信息到数据库时出错: {e}")
 
+    async def sync_to_database_async(self):
+        """sync_to_database 的异步版本，在数据库写线程中执行"""
+        await db_executor.run_write(self.sync_to_database)
+
     def build_relationship(self):
         if not self.is_known:
             return ""
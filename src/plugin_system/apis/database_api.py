@@ -1,6 +1,7 @@
 """数据库API模块
 
 提供数据库操作相关功能，采用标准Python包设计模式
+所有数据库操作都在数据库线程中执行，不阻塞事件循环
 使用方式：
     from src.plugin_system.apis import database_api
     records = await database_api.db_query(ActionRecords, query_type="get")
@@ -10,17 +11,260 @@
 import traceback
 import time
 import json
-from typing import Dict, List, Any, Union, Type, Optional
+from typing import Dict, List, Any, Union, Type, Optional, Tuple
 from src.common.logger import get_logger
-from peewee import Model, DoesNotExist
+from src.common.database.database_model import Messages
+from src.common.database.db_executor import db_executor
+from src.common.database.message_info import (
+    MESSAGE_INFO_FIELDS,
+    get_message_field,
+    join_message_info,
+    message_info_resolver,
+    select_messages_with_info,
+)
+from src.common.database.message_search import (
+    get_max_message_id,
+    index_messages,
+    index_messages_after,
+    reindex_messages,
+)
+from src.common.message_window import recent_message_window
+from src.common.message_write_buffer import message_write_buffer
+from peewee import SQL, Model, DoesNotExist, chunked, fn, Tuple as RowValue
 
 logger = get_logger("database_api")
 
+DB_API_MAX_ROWS = 10000
+"""未指定limit时查询最多返回的记录数（避免插件意外加载整张表）"""
+
+DB_API_BULK_BATCH_SIZE = 200
+"""批量写入时每条SQL语句包含的记录数（SQLite单条语句的参数数量有限）"""
+
+_FILTER_OPERATORS = {
+    "$gt": lambda field, value: field > value,
+    "$gte": lambda field, value: field >= value,
+    "$lt": lambda field, value: field < value,
+    "$lte": lambda field, value: field <= value,
+    "$ne": lambda field, value: field != value,
+    "$in": lambda field, value: field.in_(value),
+    "$nin": lambda field, value: field.not_in(value),
+}
+"""过滤条件中支持的操作符（与message_repository的过滤器一致）"""
+
+_AGGREGATE_FUNCTIONS = {"count": fn.COUNT, "sum": fn.SUM, "avg": fn.AVG, "min": fn.MIN, "max": fn.MAX}
+"""聚合查询支持的聚合函数"""
+
+
+def _get_field(model_class: Type[Model], field_name: str):
+    """获取模型字段；Messages的聊天信息与发送者信息字段（如user_nickname、chat_info_group_id）由连接的信息表提供"""
+    if model_class is not Messages:
+        return getattr(model_class, field_name)
+    if (field := get_message_field(field_name)) is None:
+        raise AttributeError(f"Messages 没有字段 '{field_name}'")
+    return field
+
+
+def _select(model_class: Type[Model], *columns):
+    """构建查询；Messages连接聊天信息与发送者信息，未指定列时结果字段与规范化之前的messages表相同"""
+    if model_class is not Messages:
+        return model_class.select(*columns)
+    return join_message_info(Messages.select(*columns)) if columns else select_messages_with_info()
+
+
+def _write_conditions(model_class: Type[Model], conditions: list) -> list:
+    """更新与删除语句不能连接其他表，Messages按聊天信息/发送者信息筛选时改为按消息id筛选"""
+    if model_class is not Messages or not conditions:
+        return conditions
+    return [Messages.id.in_(join_message_info(Messages.select(Messages.id)).where(*conditions))]
+
+
+def _storage_data(model_class: Type[Model], data: Dict[str, Any], create: bool) -> Dict[str, Any]:
+    """
+    将写入的数据转换为表中的字段：新建Messages记录时，聊天信息与发送者信息字段转换为对应信息行的引用；
+    已有消息的聊天信息与发送者信息由多条消息共享，不能通过更新修改
+    """
+    if model_class is not Messages:
+        return data
+    if create:
+        return message_info_resolver.to_storage_row(data)
+    if info_fields := [name for name in data if name in MESSAGE_INFO_FIELDS]:
+        raise ValueError(f"Messages 的聊天信息与发送者信息字段不能更新: {info_fields}")
+    return data
+
+
+async def _flush_pending_messages(model_class: Type[Model]):
+    """操作Messages之前先写入写缓冲区中的消息，保证插件能查询、修改与删除刚存储的消息"""
+    if model_class is Messages:
+        await message_write_buffer.flush_async()
+
+
+def _affected_chat_ids(model_class: Type[Model], conditions: list) -> Optional[List[str]]:
+    """获取修改或删除前满足条件的消息所属的聊天（无条件时为None，表示所有聊天）"""
+    if model_class is not Messages or not conditions:
+        return None
+    query = join_message_info(Messages.select(Messages.chat_id).distinct()).where(*conditions)
+    return [row.chat_id for row in query]
+
+
+def _index_created_message(model_class: Type[Model], record: Model):
+    """新建的Messages记录同时建立全文索引（应与新建在同一事务中执行）"""
+    if model_class is Messages:
+        index_messages([(record.id, record.processed_plain_text)])  # type: ignore
+
+
+def _text_updated_ids(model_class: Type[Model], conditions: list, data: Dict[str, Any]) -> List[int]:
+    """修改消息文本前获取将被修改的消息id，修改后按新文本重建这些消息的全文索引"""
+    if model_class is not Messages or "processed_plain_text" not in data:
+        return []
+    query = join_message_info(Messages.select(Messages.id))
+    return [row.id for row in (query.where(*conditions) if conditions else query)]
+
+
+def _evict_message_windows(model_class: Type[Model], chat_ids: Optional[List[str]]):
+    """Messages在存储流程之外被写入、修改或删除后，移除相关聊天的最近消息窗口"""
+    if model_class is Messages:
+        recent_message_window.evict(chat_ids)
+
+
+def _build_conditions(model_class: Type[Model], filters: Optional[Dict[str, Any]]) -> list:
+    """
+    将过滤条件字典转换为peewee查询条件
+    值为字典时按操作符比较（例如 {"time": {"$gt": 1700000000}}、{"id": {"$in": [1, 2, 3]}}），否则按相等比较
+    """
+    conditions = []
+    for field_name, value in (filters or {}).items():
+        field = _get_field(model_class, field_name)
+        if isinstance(value, dict):
+            for op, op_value in value.items():
+                if op not in _FILTER_OPERATORS:
+                    raise ValueError(f"不支持的过滤操作符 '{op}' (字段: '{field_name}')")
+                conditions.append(_FILTER_OPERATORS[op](field, op_value))
+        else:
+            conditions.append(field == value)
+    return conditions
+
+
+def _apply_row_limit(query, limit: Optional[int], single_result: Optional[bool] = False):
+    """应用结果数量限制：未指定limit时最多返回DB_API_MAX_ROWS条"""
+    if single_result:
+        return query.limit(1)
+    return query.limit(limit or DB_API_MAX_ROWS)
+
+
+def _warn_if_truncated(model_class: Type[Model], results: list, limit: Optional[int]):
+    if not limit and len(results) >= DB_API_MAX_ROWS:
+        logger.warning(
+            f"[DatabaseAPI] 查询 {model_class.__name__} 的结果达到 {DB_API_MAX_ROWS} 条上限，其余记录未返回；"
+            f"如确需更多记录请显式指定limit，或改用聚合查询"
+        )
+
 # =============================================================================
 # 通用数据库查询API函数
 # =============================================================================
 
 
+def _db_query_sync(
+    model_class: Type[Model],
+    data: Optional[Dict[str, Any]],
+    query_type: Optional[str],
+    filters: Optional[Dict[str, Any]],
+    limit: Optional[int],
+    order_by: Optional[List[str]],
+    single_result: Optional[bool],
+) -> Union[List[Dict[str, Any]], Dict[str, Any], None]:
+    """db_query 的同步实现（在数据库线程中执行）"""
+    try:
+        if query_type not in ["get", "create", "update", "delete", "count"]:
+            raise ValueError("query_type must be 'get' or 'create' or 'update' or 'delete' or 'count'")
+        # 构建过滤条件
+        conditions = _build_conditions(model_class, filters)
+        query = _select(model_class)
+        if conditions:
+            query = query.where(*conditions)
+
+        # 执行查询
+        if query_type == "get":
+            # 应用排序
+            if order_by:
+                query = query.order_by(
+                    *(
+                        _get_field(model_class, field[1:]).desc()
+                        if field.startswith("-")
+                        else _get_field(model_class, field)
+                        for field in order_by
+                    )
+                )
+
+            # 应用限制
+            query = _apply_row_limit(query, limit, single_result)
+
+            # 执行查询
+            results = list(query.dicts())
+
+            # 返回结果
+            if single_result:
+                return results[0] if results else None
+            _warn_if_truncated(model_class, results, limit)
+            return results
+
+        elif query_type == "create":
+            if not data:
+                raise ValueError("创建记录需要提供data参数")
+
+            # 创建记录
+            with model_class._meta.database.atomic():  # type: ignore
+                record = model_class.create(**_storage_data(model_class, data, create=True))
+                _index_created_message(model_class, record)
+            _evict_message_windows(model_class, [data.get("chat_id")])
+            # 返回创建的记录
+            return _select(model_class).where(model_class.id == record.id).dicts().get()  # type: ignore
+
+        elif query_type == "update":
+            if not data:
+                raise ValueError("更新记录需要提供data参数")
+
+            # 更新记录
+            update_query = model_class.update(**_storage_data(model_class, data, create=False))
+            chat_ids = _affected_chat_ids(model_class, conditions)
+            with model_class._meta.database.atomic():  # type: ignore
+                text_updated_ids = _text_updated_ids(model_class, conditions, data)
+                conditions = _write_conditions(model_class, conditions)
+                updated = (update_query.where(*conditions) if conditions else update_query).execute()
+                reindex_messages(text_updated_ids)
+            _evict_message_windows(model_class, chat_ids)
+            return updated
+
+        elif query_type == "delete":
+            # 删除记录
+            delete_query = model_class.delete()
+            chat_ids = _affected_chat_ids(model_class, conditions)
+            conditions = _write_conditions(model_class, conditions)
+            deleted = (delete_query.where(*conditions) if conditions else delete_query).execute()
+            _evict_message_windows(model_class, chat_ids)
+            return deleted
+
+        elif query_type == "count":
+            # 计数
+            return query.count()
+
+        else:
+            raise ValueError(f"不支持的查询类型: {query_type}")
+
+    except DoesNotExist:
+        # 记录不存在
+        return None if query_type == "get" and single_result else []
+    except Exception as e:
+        logger.error(f"[DatabaseAPI] 数据库操作出错: {e}")
+        traceback.print_exc()
+
+        # 根据查询类型返回合适的默认值
+        if query_type == "get":
+            return None if single_result else []
+        elif query_type in ["create", "update", "delete", "count"]:
+            return None
+        return None
+
+
 async def db_query(
     model_class: Type[Model],
     data: Optional[Dict[str, Any]] = None,
@@ -38,8 +282,9 @@ async def db_query(
         model_class: Peewee 模型类，例如 ActionRecords, Messages 等
         data: 用于创建或更新的数据字典
         query_type: 查询类型，可选值: "get", "create", "update", "delete", "count"
-        filters: 过滤条件字典，键为字段名，值为要匹配的值
-        limit: 限制结果数量
+        filters: 过滤条件字典，键为字段名，值为要匹配的值，或操作符字典（例如 {"time": {"$gt": 1700000000}}，
+            支持 $gt, $gte, $lt, $lte, $ne, $in, $nin）
+        limit: 限制结果数量，未指定时最多返回 DB_API_MAX_ROWS 条
         order_by: 排序字段，前缀'-'表示降序，例如'-time'表示按时间字段（即time字段）降序
         single_result: 是否只返回单个结果
 
@@ -91,79 +336,49 @@ async def db_query(
             filters={"chat_id": chat_stream.stream_id}
         )
     """
-    try:
-        if query_type not in ["get", "create", "update", "delete", "count"]:
-            raise ValueError("query_type must be 'get' or 'create' or 'update' or 'delete' or 'count'")
-        # 构建基本查询
-        if query_type in ["get", "update", "delete", "count"]:
-            query = model_class.select()
-
-            # 应用过滤条件
-            if filters:
-                for field, value in filters.items():
-                    query = query.where(getattr(model_class, field) == value)
-
-        # 执行查询
-        if query_type == "get":
-            # 应用排序
-            if order_by:
-                for field in order_by:
-                    if field.startswith("-"):
-                        query = query.order_by(getattr(model_class, field[1:]).desc())
-                    else:
-                        query = query.order_by(getattr(model_class, field))
+    await _flush_pending_messages(model_class)
+    # 查询与计数在读线程中执行，写操作在写线程中执行，均不阻塞事件循环
+    run = db_executor.run_read if query_type in ("get", "count") else db_executor.run_write
+    return await run(_db_query_sync, model_class, data, query_type, filters, limit, order_by, single_result)
 
-            # 应用限制
-            if limit:
-                query = query.limit(limit)
 
-            # 执行查询
-            results = list(query.dicts())
-
-            # 返回结果
-            if single_result:
-                return results[0] if results else None
-            return results
-
-        elif query_type == "create":
-            if not data:
-                raise ValueError("创建记录需要提供data参数")
-
-            # 创建记录
-            record = model_class.create(**data)
-            # 返回创建的记录
-            return model_class.select().where(model_class.id == record.id).dicts().get()  # type: ignore
-
-        elif query_type == "update":
-            if not data:
-                raise ValueError("更新记录需要提供data参数")
-
-            # 更新记录
-            return query.update(**data).execute()
+def _db_save_sync(
+    model_class: Type[Model], data: Dict[str, Any], key_field: Optional[str], key_value: Optional[Any]
+) -> Optional[Dict[str, Any]]:
+    """db_save 的同步实现（在数据库线程中执行）"""
+    try:
+        # 如果提供了key_field和key_value，尝试更新现有记录
+        if key_field and key_value is not None:
+            if existing_records := list(
+                _select(model_class, model_class).where(_get_field(model_class, key_field) == key_value).limit(1)
+            ):
+                # 更新现有记录
+                existing_record = existing_records[0]
+                for field, value in _storage_data(model_class, data, create=False).items():
+                    setattr(existing_record, field, value)
+                with model_class._meta.database.atomic():  # type: ignore
+                    existing_record.save()
+                    if model_class is Messages and "processed_plain_text" in data:
+                        reindex_messages([existing_record.id])  # type: ignore
+                _evict_message_windows(model_class, [getattr(existing_record, "chat_id", None)])
 
-        elif query_type == "delete":
-            # 删除记录
-            return query.delete().execute()
+                # 返回更新后的记录
+                updated_record = _select(model_class).where(model_class.id == existing_record.id).dicts().get()  # type: ignore
+                return updated_record
 
-        elif query_type == "count":
-            # 计数
-            return query.count()
+        # 如果没有找到现有记录或未提供key_field和key_value，创建新记录
+        with model_class._meta.database.atomic():  # type: ignore
+            new_record = model_class.create(**_storage_data(model_class, data, create=True))
+            _index_created_message(model_class, new_record)
+        _evict_message_windows(model_class, [data.get("chat_id")])
 
-        else:
-            raise ValueError(f"不支持的查询类型: {query_type}")
+        # 返回创建的记录
+        created_record = _select(model_class).where(model_class.id == new_record.id).dicts().get()  # type: ignore
+        return created_record
 
-    except DoesNotExist:
-        # 记录不存在
-        return None if query_type == "get" and single_result else []
     except Exception as e:
-        logger.error(f"[DatabaseAPI] 数据库操作出错: {e}")
+        logger.error(f"[DatabaseAPI] 保存数据库记录出错: {e}")
         traceback.print_exc()
-
-        # 根据查询类型返回合适的默认值
-        if query_type == "get":
-            return None if single_result else []
-        elif query_type in ["create", "update", "delete", "count"]:
-            return None
         return None
 
 
@@ -200,33 +415,49 @@ async def db_save(
             key_value="123"
         )
     """
+    await _flush_pending_messages(model_class)
+    return await db_executor.run_write(_db_save_sync, model_class, data, key_field, key_value)
+
+
+def _db_get_sync(
+    model_class: Type[Model],
+    filters: Optional[Dict[str, Any]],
+    limit: Optional[int],
+    order_by: Optional[str],
+    single_result: Optional[bool],
+) -> Union[List[Dict[str, Any]], Dict[str, Any], None]:
+    """db_get 的同步实现（在数据库线程中执行）"""
     try:
-        # 如果提供了key_field和key_value，尝试更新现有记录
-        if key_field and key_value is not None:
-            if existing_records := list(
-                model_class.select().where(getattr(model_class, key_field) == key_value).limit(1)
-            ):
-                # 更新现有记录
-                existing_record = existing_records[0]
-                for field, value in data.items():
-                    setattr(existing_record, field, value)
-                existing_record.save()
+        # 构建查询
+        query = _select(model_class)
 
-                # 返回更新后的记录
-                updated_record = model_class.select().where(model_class.id == existing_record.id).dicts().get()  # type: ignore
-                return updated_record
+        # 应用过滤条件
+        if conditions := _build_conditions(model_class, filters):
+            query = query.where(*conditions)
 
-        # 如果没有找到现有记录或未提供key_field和key_value，创建新记录
-        new_record = model_class.create(**data)
+        # 应用排序
+        if order_by:
+            if order_by.startswith("-"):
+                query = query.order_by(_get_field(model_class, order_by[1:]).desc())
+            else:
+                query = query.order_by(_get_field(model_class, order_by))
 
-        # 返回创建的记录
-        created_record = model_class.select().where(model_class.id == new_record.id).dicts().get()  # type: ignore
-        return created_record
+        # 应用限制
+        query = _apply_row_limit(query, limit, single_result)
+
+        # 执行查询
+        results = list(query.dicts())
+
+        # 返回结果
+        if single_result:
+            return results[0] if results else None
+        _warn_if_truncated(model_class, results, limit)
+        return results
 
     except Exception as e:
-        logger.error(f"[DatabaseAPI] 保存数据库记录出错: {e}")
+        logger.error(f"[DatabaseAPI] 获取数据库记录出错: {e}")
         traceback.print_exc()
-        return None
+        return None if single_result else []
 
 
 async def db_get(
@@ -242,8 +473,8 @@ async def db_get(
 
     Args:
         model_class: Peewee模型类
-        filters: 过滤条件，字段名和值的字典
-        limit: 结果数量限制
+        filters: 过滤条件，字段名和值（或操作符字典，同db_query）的字典
+        limit: 结果数量限制，未指定时最多返回 DB_API_MAX_ROWS 条
         order_by: 排序字段，前缀'-'表示降序，例如'-time'表示按时间字段（即time字段）降序
         single_result: 是否只返回单个结果，如果为True，则返回单个记录字典或None；否则返回记录字典列表或空列表
 
@@ -267,38 +498,282 @@ async def db_get(
             order_by="-time",
         )
     """
+    await _flush_pending_messages(model_class)
+    return await db_executor.run_read(_db_get_sync, model_class, filters, limit, order_by, single_result)
+
+
+# =============================================================================
+# 批量操作与聚合查询API函数
+# =============================================================================
+
+
+def _db_bulk_insert_sync(model_class: Type[Model], records: List[Dict[str, Any]], batch_size: int) -> Optional[int]:
+    """db_bulk_insert 的同步实现（在数据库线程中执行）"""
     try:
-        # 构建查询
-        query = model_class.select()
+        with model_class._meta.database.atomic():  # type: ignore
+            last_id = get_max_message_id() if model_class is Messages else 0
+            for batch in chunked(records, batch_size):
+                model_class.insert_many([_storage_data(model_class, record, create=True) for record in batch]).execute()
+            if model_class is Messages:
+                index_messages_after(last_id)
+        _evict_message_windows(model_class, list({record.get("chat_id") for record in records}))
+        return len(records)
+    except Exception as e:
+        if model_class is Messages:
+            # 事务回滚后新建的聊天信息/发送者信息也被撤销，缓存的id不再有效
+            message_info_resolver.clear_cache()
+        logger.error(f"[DatabaseAPI] 批量插入记录出错: {e}")
+        traceback.print_exc()
+        return None
 
-        # 应用过滤条件
-        if filters:
-            for field, value in filters.items():
-                query = query.where(getattr(model_class, field) == value)
 
-        # 应用排序
-        if order_by:
-            if order_by.startswith("-"):
-                query = query.order_by(getattr(model_class, order_by[1:]).desc())
-            else:
-                query = query.order_by(getattr(model_class, order_by))
+async def db_bulk_insert(
+    model_class: Type[Model], records: List[Dict[str, Any]], batch_size: int = DB_API_BULK_BATCH_SIZE
+) -> Optional[int]:
+    """批量插入记录
 
-        # 应用限制
-        if limit:
-            query = query.limit(limit)
+    所有记录在同一个事务中分批插入（每条SQL语句插入batch_size条），任一批失败时全部回滚。
 
-        # 执行查询
-        results = list(query.dicts())
+    Args:
+        model_class: Peewee模型类
+        records: 要插入的记录字典列表（各记录应包含相同的字段）
+        batch_size: 每条SQL语句插入的记录数
 
-        # 返回结果
-        if single_result:
-            return results[0] if results else None
-        return results
+    Returns:
+        int: 插入的记录数
+        None: 如果插入失败
 
+    示例:
+        count = await database_api.db_bulk_insert(
+            ActionRecords,
+            [{"action_id": f"batch_{i}", "time": time.time(), "action_name": "TestAction"} for i in range(100)],
+        )
+    """
+    if not records:
+        return 0
+    await _flush_pending_messages(model_class)
+    return await db_executor.run_write(_db_bulk_insert_sync, model_class, records, batch_size)
+
+
+def _db_bulk_upsert_sync(
+    model_class: Type[Model],
+    records: List[Dict[str, Any]],
+    conflict_fields: List[str],
+    update_fields: Optional[List[str]],
+    batch_size: int,
+) -> Optional[int]:
+    """db_bulk_upsert 的同步实现（在数据库线程中执行）"""
+    try:
+        with model_class._meta.database.atomic():  # type: ignore
+            rows = [_storage_data(model_class, record, create=True) for record in records]
+            if update_fields is None:
+                update_fields = [name for name in rows[0] if name not in conflict_fields]
+            conflict_target = [getattr(model_class, name) for name in conflict_fields]
+            preserve = [getattr(model_class, name) for name in update_fields]
+            is_messages = model_class is Messages
+            last_id = get_max_message_id() if is_messages else 0
+            for batch in chunked(rows, batch_size):
+                if is_messages and "processed_plain_text" in update_fields:
+                    # 冲突的已有消息的文本会被覆盖，写入后重建它们的全文索引（本次新写入的消息最后统一建立索引）
+                    conflict_keys = [tuple(row.get(name) for name in conflict_fields) for row in batch]
+                    text_updated_ids = [
+                        row.id
+                        for row in Messages.select(Messages.id).where(
+                            RowValue(*conflict_target).in_(conflict_keys), Messages.id <= last_id
+                        )
+                    ]
+                else:
+                    text_updated_ids = []
+                query = model_class.insert_many(batch)
+                if preserve:
+                    query = query.on_conflict(conflict_target=conflict_target, preserve=preserve)
+                else:
+                    query = query.on_conflict_ignore()
+                query.execute()
+                reindex_messages(text_updated_ids)
+            if is_messages:
+                index_messages_after(last_id)
+        _evict_message_windows(model_class, list({record.get("chat_id") for record in records}))
+        return len(records)
     except Exception as e:
-        logger.error(f"[DatabaseAPI] 获取数据库记录出错: {e}")
+        if model_class is Messages:
+            message_info_resolver.clear_cache()
+        logger.error(f"[DatabaseAPI] 批量插入或更新记录出错: {e}")
         traceback.print_exc()
-        return None if single_result else []
+        return None
+
+
+async def db_bulk_upsert(
+    model_class: Type[Model],
+    records: List[Dict[str, Any]],
+    conflict_fields: List[str],
+    update_fields: Optional[List[str]] = None,
+    batch_size: int = DB_API_BULK_BATCH_SIZE,
+) -> Optional[int]:
+    """批量插入或更新记录
+
+    按conflict_fields判断记录是否已存在：不存在时插入，已存在时用新记录中的值更新update_fields。
+    conflict_fields必须对应表上的唯一索引（或主键）。所有记录在同一个事务中写入。
+
+    Args:
+        model_class: Peewee模型类
+        records: 要写入的记录字典列表（各记录应包含相同的字段）
+        conflict_fields: 用于判断记录是否已存在的字段名列表，例如["person_id"]
+        update_fields: 记录已存在时需要更新的字段名列表，默认为记录中除conflict_fields以外的所有字段；
+            为空列表时已存在的记录保持不变
+        batch_size: 每条SQL语句写入的记录数
+
+    Returns:
+        int: 写入（插入或更新）的记录数
+        None: 如果写入失败
+
+    示例:
+        # 新用户插入，已有用户只更新昵称
+        count = await database_api.db_bulk_upsert(
+            PersonInfo,
+            [
+                {"person_id": p["person_id"], "platform": "qq", "user_id": p["user_id"], "nickname": p["nickname"]}
+                for p in people
+            ],
+            conflict_fields=["person_id"],
+            update_fields=["nickname"],
+        )
+    """
+    if not records:
+        return 0
+    await _flush_pending_messages(model_class)
+    return await db_executor.run_write(
+        _db_bulk_upsert_sync, model_class, records, conflict_fields, update_fields, batch_size
+    )
+
+
+def _db_bulk_delete_sync(model_class: Type[Model], filters: Dict[str, Any]) -> Optional[int]:
+    """db_bulk_delete 的同步实现（在数据库线程中执行）"""
+    try:
+        conditions = _build_conditions(model_class, filters)
+        if not conditions:
+            raise ValueError("批量删除需要提供过滤条件")
+        chat_ids = _affected_chat_ids(model_class, conditions)
+        deleted = model_class.delete().where(*_write_conditions(model_class, conditions)).execute()
+        _evict_message_windows(model_class, chat_ids)
+        return deleted
+    except Exception as e:
+        logger.error(f"[DatabaseAPI] 批量删除记录出错: {e}")
+        traceback.print_exc()
+        return None
+
+
+async def db_bulk_delete(model_class: Type[Model], filters: Dict[str, Any]) -> Optional[int]:
+    """批量删除满足条件的记录
+
+    为避免误删整张表，必须提供过滤条件。
+
+    Args:
+        model_class: Peewee模型类
+        filters: 过滤条件，字段名和值（或操作符字典，同db_query）的字典
+
+    Returns:
+        int: 删除的记录数
+        None: 如果删除失败
+
+    示例:
+        # 删除一批记录
+        count = await database_api.db_bulk_delete(ActionRecords, {"action_id": {"$in": ["1", "2", "3"]}})
+
+        # 删除一周前的记录
+        count = await database_api.db_bulk_delete(ActionRecords, {"time": {"$lt": time.time() - 7 * 86400}})
+    """
+    await _flush_pending_messages(model_class)
+    return await db_executor.run_write(_db_bulk_delete_sync, model_class, filters)
+
+
+def _db_aggregate_sync(
+    model_class: Type[Model],
+    aggregates: Dict[str, Tuple[str, Optional[str]]],
+    filters: Optional[Dict[str, Any]],
+    group_by: Optional[List[str]],
+    order_by: Optional[List[str]],
+    limit: Optional[int],
+) -> List[Dict[str, Any]]:
+    """db_aggregate 的同步实现（在数据库线程中执行）"""
+    try:
+        group_fields = [_get_field(model_class, name) for name in group_by or []]
+        # 按请求的字段名返回分组字段（Messages的兼容字段在信息表中的列名不同）
+        columns = [field.alias(name) for name, field in zip(group_by or [], group_fields)]
+        for alias, (func_name, field_name) in aggregates.items():
+            if func_name not in _AGGREGATE_FUNCTIONS:
+                raise ValueError(f"不支持的聚合函数 '{func_name}'")
+            target = SQL("*") if field_name in (None, "*") else _get_field(model_class, field_name)
+            columns.append(_AGGREGATE_FUNCTIONS[func_name](target).alias(alias))
+
+        query = _select(model_class, *columns)
+        if conditions := _build_conditions(model_class, filters):
+            query = query.where(*conditions)
+        if group_fields:
+            query = query.group_by(*group_fields)
+        if order_by:
+            # 可以按分组字段或聚合结果的别名排序
+            order_terms = []
+            for name in order_by:
+                key = name.lstrip("-")
+                column = SQL(f'"{key}"') if key in aggregates else _get_field(model_class, key)
+                order_terms.append(column.desc() if name.startswith("-") else column.asc())
+            query = query.order_by(*order_terms)
+
+        results = list(_apply_row_limit(query, limit).dicts())
+        _warn_if_truncated(model_class, results, limit)
+        return results
+    except Exception as e:
+        logger.error(f"[DatabaseAPI] 聚合查询出错: {e}")
+        traceback.print_exc()
+        return []
+
+
+async def db_aggregate(
+    model_class: Type[Model],
+    aggregates: Dict[str, Tuple[str, Optional[str]]],
+    filters: Optional[Dict[str, Any]] = None,
+    group_by: Optional[List[str]] = None,
+    order_by: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """聚合查询
+
+    在数据库中完成计数、求和、分组等统计，只返回统计结果，不需要把记录逐条加载到插件中。
+
+    Args:
+        model_class: Peewee模型类
+        aggregates: 聚合结果的别名 -> (聚合函数, 字段名)，聚合函数可选 "count", "sum", "avg", "min", "max"；
+            count的字段名为None或"*"时统计记录数
+        filters: 过滤条件，字段名和值（或操作符字典，同db_query）的字典
+        group_by: 分组字段名列表，为None时对所有满足条件的记录做一次聚合
+        order_by: 排序字段（分组字段或聚合结果的别名），前缀'-'表示降序
+        limit: 限制返回的分组数量，未指定时最多返回 DB_API_MAX_ROWS 条
+
+    Returns:
+        List[Dict[str, Any]]: 每个分组一个字典（包含分组字段与聚合结果），未分组时只有一个字典；失败时返回空列表
+
+    示例:
+        # 统计当前聊天中发言最多的10个用户
+        top_users = await database_api.db_aggregate(
+            Messages,
+            {"message_count": ("count", None)},
+            filters={"chat_id": chat_stream.stream_id},
+            group_by=["user_id"],
+            order_by=["-message_count"],
+            limit=10,
+        )
+
+        # 统计最近一天各模型的请求数与花费
+        usage = await database_api.db_aggregate(
+            LLMUsage,
+            {"requests": ("count", None), "total_cost": ("sum", "cost")},
+            filters={"timestamp": {"$gte": datetime.now() - timedelta(days=1)}},
+            group_by=["model_name"],
+        )
+    """
+    await _flush_pending_messages(model_class)
+    return await db_executor.run_read(_db_aggregate_sync, model_class, aggregates, filters, group_by, order_by, limit)
 
 
 async def store_action_info(
@@ -387,3 +862,45 @@ async def store_action_info(
         logger.error(f"[DatabaseAPI] 存储动作信息时发生错误: {e}")
         traceback.print_exc()
         return None
+
+
+async def db_search_messages(
+    query: str,
+    chat_id: Optional[str] = None,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    limit: int = 20,
+    order: str = "latest",
+) -> List[Dict[str, Any]]:
+    """按文本全文搜索消息
+
+    使用消息全文索引查找包含搜索文本中所有词（按jieba分词）的消息，不需要扫描消息表；已归档的消息不会被搜索到。
+
+    Args:
+        query: 搜索文本
+        chat_id: 只搜索该聊天的消息，为None时搜索所有聊天
+        start_time: 开始时间戳（包含），为None时不限制
+        end_time: 结束时间戳（包含），为None时不限制
+        limit: 最多返回的消息数
+        order: 排序方式，"latest"按时间从新到旧，"rank"按相关度从高到低
+
+    Returns:
+        List[Dict[str, Any]]: 消息记录字典列表（字段与Messages相同），失败时返回空列表
+
+    示例:
+        # 搜索当前聊天中提到"周末爬山"的最近5条消息
+        messages = await database_api.db_search_messages(
+            "周末爬山",
+            chat_id=chat_stream.stream_id,
+            limit=5,
+        )
+    """
+    from src.common.message_repository import search_messages_async
+
+    try:
+        messages = await search_messages_async(query, chat_id, start_time, end_time, limit, order)
+        return [message.flatten() for message in messages]
+    except Exception as e:
+        logger.error(f"[DatabaseAPI] 全文搜索消息出错: {e}")
+        traceback.print_exc()
+        return []
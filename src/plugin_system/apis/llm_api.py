@@ -5,11 +5,14 @@
     from src.plugin_system.apis import llm_api
     models = llm_api.get_available_models()
     success, response, reasoning, model_name = await llm_api.generate_with_model(prompt, model_config)
+    async for delta in llm_api.generate_stream_with_model(prompt, model_config):
+        print(delta.content)
 """
 
-from typing import Tuple, Dict, List, Any, Optional
+from typing import Tuple, Dict, List, Any, Optional, AsyncIterator
 from src.common.logger import get_logger
 from src.llm_models.payload_content.tool_option import ToolCall
+from src.llm_models.model_client.base_client import StreamDelta
 from src.llm_models.utils_model import LLMRequest
 from src.config.config import model_config
 from src.config.api_ada_configs import TaskConfig
@@ -120,3 +123,37 @@ async def generate_with_model_with_tools(
         error_msg = f"生成内容时出错: {str(e)}"
         logger.error(f"[LLMAPI] {error_msg}")
         return False, error_msg, "", "", None
+
+
+async def generate_stream_with_model(
+    prompt: str,
+    model_config: TaskConfig,
+    request_type: str = "plugin.generate",
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    tool_options: List[Dict[str, Any]] | None = None,
+) -> AsyncIterator[StreamDelta]:
+    """使用指定模型以流式方式生成内容
+
+    Args:
+        prompt: 提示词
+        model_config: 模型配置（从 get_available_models 获取的模型配置）
+        request_type: 请求类型标识
+        temperature: 温度参数
+        max_tokens: 最大token数
+        tool_options: 工具选项列表
+
+    Returns:
+        AsyncIterator[StreamDelta]: 响应增量（content为正式内容，reasoning_content为推理内容，tool_call_fragment为工具调用片段）
+
+    Raises:
+        Exception: 请求失败时直接抛出（与其他函数不同，流式接口无法以返回值表示失败）
+    """
+    logger.info(f"[LLMAPI] 使用模型集合 {model_config.model_list} 流式生成内容")
+    logger.debug(f"[LLMAPI] 完整提示词: {prompt}")
+
+    llm_request = LLMRequest(model_set=model_config, request_type=request_type)
+    async for delta in llm_request.generate_response_stream(
+        prompt, temperature=temperature, max_tokens=max_tokens, tools=tool_options
+    ):
+        yield delta
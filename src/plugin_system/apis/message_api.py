@@ -37,7 +37,12 @@ from src.chat.utils.chat_message_builder import (
 
 
 def get_messages_by_time(
-    start_time: float, end_time: float, limit: int = 0, limit_mode: str = "latest", filter_mai: bool = False
+    start_time: float,
+    end_time: float,
+    limit: int = 0,
+    limit_mode: str = "latest",
+    filter_mai: bool = False,
+    include_archive: bool = False,
 ) -> List[DatabaseMessages]:
     """
     获取指定时间范围内的消息
@@ -48,6 +53,7 @@ def get_messages_by_time(
         limit: 限制返回的消息数量，0为不限制
         limit_mode: 当limit>0时生效，'earliest'表示获取最早的记录，'latest'表示获取最新的记录
         filter_mai: 是否过滤麦麦自身的消息，默认为False
+        include_archive: 是否同时查询已归档的较早消息，默认为False
 
     Returns:
         List[Dict[str, Any]]: 消息列表
@@ -59,9 +65,10 @@ def get_messages_by_time(
         raise ValueError("start_time 和 end_time 必须是数字类型")
     if limit < 0:
         raise ValueError("limit 不能为负数")
+    messages = get_raw_msg_by_timestamp(start_time, end_time, limit, limit_mode, include_archive=include_archive)
     if filter_mai:
-        return filter_mai_messages(get_raw_msg_by_timestamp(start_time, end_time, limit, limit_mode))
-    return get_raw_msg_by_timestamp(start_time, end_time, limit, limit_mode)
+        return filter_mai_messages(messages)
+    return messages
 
 
 def get_messages_by_time_in_chat(
@@ -72,6 +79,7 @@ def get_messages_by_time_in_chat(
     limit_mode: str = "latest",
     filter_mai: bool = False,
     filter_command: bool = False,
+    include_archive: bool = False,
 ) -> List[DatabaseMessages]:
     """
     获取指定聊天中指定时间范围内的消息
@@ -84,6 +92,7 @@ def get_messages_by_time_in_chat(
         limit_mode: 当limit>0时生效，'earliest'表示获取最早的记录，'latest'表示获取最新的记录
         filter_mai: 是否过滤麦麦自身的消息，默认为False
         filter_command: 是否过滤命令消息，默认为False
+        include_archive: 是否同时查询已归档的较早消息，默认为False
     Returns:
         List[Dict[str, Any]]: 消息列表
 
@@ -98,11 +107,12 @@ def get_messages_by_time_in_chat(
         raise ValueError("chat_id 不能为空")
     if not isinstance(chat_id, str):
         raise ValueError("chat_id 必须是字符串类型")
+    messages = get_raw_msg_by_timestamp_with_chat(
+        chat_id, start_time, end_time, limit, limit_mode, filter_command=filter_command, include_archive=include_archive
+    )
     if filter_mai:
-        return filter_mai_messages(
-            get_raw_msg_by_timestamp_with_chat(chat_id, start_time, end_time, limit, limit_mode, filter_command)
-        )
-    return get_raw_msg_by_timestamp_with_chat(chat_id, start_time, end_time, limit, limit_mode, filter_command)
+        return filter_mai_messages(messages)
+    return messages
 
 
 def get_messages_by_time_in_chat_inclusive(
@@ -103,14 +103,14 @@ class BuildRelationAction(BaseAction):
             logger.info(f"{self.log_prefix} 添加关系印象原因: {self.reasoning}")
             person_name = self.action_data.get("person_name", "")
             # 2. 获取目标用户信息
-            person = Person(person_name=person_name)
+            person = await Person.load_async(person_name=person_name)
             if not person.is_known:
                 logger.warning(f"{self.log_prefix} 用户 {person_name} 不存在，跳过添加记忆")
                 return False, f"用户 {person_name} 不存在，跳过添加记忆"
             
             person.last_know = time.time()
             person.know_times += 1
-            person.sync_to_database()
+            await person.sync_to_database_async()
 
             category_list = person.get_all_category()
             if not category_list:
@@ -153,7 +153,7 @@ class BuildRelationAction(BaseAction):
             if not memory_list:
                 logger.info(f"{self.log_prefix} {person.person_name} 的  {category}  的记忆为空，进行创建")
                 person.memory_points.append(f"{category}:{impression}:1.0")
-                person.sync_to_database()
+                await person.sync_to_database_async()
 
                 return True, f"未找到分类为{category}的记忆点，进行添加"
 
@@ -189,7 +189,7 @@ class BuildRelationAction(BaseAction):
             if new_memory:
                 # 新记忆
                 person.memory_points.append(f"{category}:{new_memory}:1.0")
-                person.sync_to_database()
+                await person.sync_to_database_async()
                 
                 logger.info(f"{self.log_prefix} 为{person.person_name}新增记忆点: {new_memory}")
 
@@ -205,7 +205,7 @@ class BuildRelationAction(BaseAction):
 
                     memory_weight = get_weight_from_memory(memory)
                     person.memory_points.append(f"{category}:{integrate_memory}:{memory_weight + 1.0}")
-                    person.sync_to_database()
+                    await person.sync_to_database_async()
 
                     logger.info(f"{self.log_prefix} 更新{person.person_name}的记忆点: {memory_content} -> {integrate_memory}")
 